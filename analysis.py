@@ -1,5 +1,3 @@
-import os
-import pandas as pd
 import numpy as np
 
 import matplotlib.pyplot as plt
@@ -10,15 +8,15 @@ from sklearn.decomposition import PCA
 
 from scipy.stats import pearsonr
 
+from src.results import read_results, results_path
+
 def main():
     environments = ["volcano", "lake", "random", "river",]
     results_directory = r"./results"
 
     for env in environments:
 
-        df = pd.read_csv(os.path.join(results_directory, "output_"+env+".csv"))
-
-        df_last_gen = df[df.Gen == 50]
+        df_last_gen = read_results(results_path(results_directory, env), columns=['Obs', 'Alignment', 'Cohesion', 'Separation', 'GoToWater', 'GoToFire', 'fitness'], generations=[50])
 
         idx = df_last_gen.groupby("Obs")['fitness'].transform(max) == df_last_gen['fitness']
 
@@ -67,7 +65,7 @@ def conv_plots():
     fig, axs = plt.subplots(6, 4,sharex='col',sharey='row',figsize=(12,18))
     for e,env in enumerate(environments):
 
-        df = pd.read_csv(os.path.join(results_directory, "output_"+env+".csv"))
+        df = read_results(results_path(results_directory, env), columns=['Gen', 'Alignment', 'Cohesion', 'Separation', 'GoToWater', 'GoToFire', 'fitness'])
         
         for v,val in enumerate(['Alignment', 'Cohesion', 'Separation', 'GoToWater', 'GoToFire', 'fitness']):
             if v==0:
@@ -80,4 +78,4 @@ def conv_plots():
     plt.show()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""Benchmarks of the simulation hot paths.
+
+Times Swarm.update, every Rule.apply, Environment.update, Environment.copy (with its first, copying update), Environment.from_file, Swarm.simulate and one Evolution.evolve generation,
+sweeping over the grid size, the number of boids and the population size, and the import time of the package in a fresh interpreter.
+The results are written as JSON and can be compared against a baseline run, slower cases are flagged as regressions,
+as is an import of the simulation core that loads a plotting or other heavy library.
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --quick --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import gridio, jit, rule
+from src.environment import Environment
+from src.evolution import Evolution, SteadyStateEvolution
+from src.spatial import WaterField
+from src.state import State
+from src.swarm import Swarm
+
+GRID_SIZES = [20, 200, 2000]
+BOID_COUNTS = [20, 200, 2000, 10000]
+POPULATION_SIZES = [10, 40]
+# Modules that the simulation core must import without, and the heavy libraries they must not load (scipy.ndimage is allowed, see tests/test_imports.py)
+IMPORTS = ["src", "src.campaign"]
+HEAVY_MODULES = ["matplotlib", "seaborn", "sklearn", "pandas", "scipy.signal", "numba"]
+QUICK = {"grid_sizes": [20, 200], "boid_counts": [20, 200], "population_sizes": [10], "repeat": 3}
+
+
+def random_grid(size: int, seed: int = 0) -> np.ndarray:
+    """A forest of ```size``` x ```size``` tiles with lakes, barren patches and a few fires.
+    """
+    rng = np.random.default_rng(seed)
+    grid = np.where(rng.random((size, size)) < 0.8, State.TREE.value, State.BARREN.value).astype(np.int8)
+    for _ in range(max(1, size // 10)):
+        x, y = rng.integers(0, size, 2)
+        r = rng.integers(1, max(2, size // 20))
+        grid[max(0, x - r):x + r, max(0, y - r):y + r] = State.WATER.value
+    fires = rng.integers(0, size, (max(1, size // 20), 2))
+    grid[fires[:, 0], fires[:, 1]] = State.FIRE.value
+    return grid
+
+
+def environment(size: int, spread: str = "dense") -> Environment:
+    grid = random_grid(size)
+    return Environment(grid.size, int(np.count_nonzero(grid == State.FIRE.value)), grid, spread=spread)
+
+
+def swarm(size: int, nboids: int, seed: int = 0) -> Swarm:
+    np.random.seed(seed)
+    rules = [r(weight=w) for r, w in zip(rule.RULES, np.random.uniform(-1, 1, len(rule.RULES)))]
+    return Swarm(environment(size), 4, 4, nboids, rules, seed=seed)
+
+
+def measure(function: Callable[[], None], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """Time ```function``` ```repeat``` times, after one untimed warm-up call.
+    """
+    if setup is not None:
+        setup()
+    function()
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"median": float(np.median(times)), "min": float(np.min(times)), "mean": float(np.mean(times)), "repeat": repeat}
+
+
+def import_time(module: str, repeat: int) -> Dict:
+    """Time ```import module``` in fresh interpreters and list the heavy modules it loads.
+    """
+    code = ("import sys, time, json; start = time.perf_counter(); import " + module + "; elapsed = time.perf_counter() - start; "
+            f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times, heavy = [], []
+    for _ in range(repeat + 1):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=root, check=True).stdout
+        elapsed, heavy = json.loads(output)
+        times.append(elapsed)
+    times = times[1:]  # the first run warms the file system and bytecode caches
+    return {"median": float(np.median(times)), "min": float(np.min(times)), "mean": float(np.mean(times)), "repeat": repeat, "heavy_modules": heavy}
+
+
+def clear_caches() -> None:
+    gridio._cache.clear()
+    WaterField._cache.clear()
+
+
+def run(grid_sizes: List[int], boid_counts: List[int], population_sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+
+    def record(name: str, params: Dict, timing: Dict[str, float]) -> None:
+        if any(result["name"] == name and result["params"] == params for result in results):
+            return
+        results.append({"name": name, "params": params, **timing})
+        print(f"{name:<24} {json.dumps(params):<44} {timing['median']*1e3:>10.3f} ms", flush=True)
+
+    for module in IMPORTS:
+        record("import", {"module": module}, import_time(module, repeat))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in grid_sizes:
+            grid = random_grid(size)
+            for suffix, write in ((".in", gridio.write_text), (gridio.BINARY_SUFFIX, gridio.write_binary)):
+                file_path = os.path.join(directory, f"grid_{size}{suffix}")
+                write(file_path, grid)
+                record("Environment.from_file", {"grid": size, "format": suffix}, measure(lambda: Environment.from_file(file_path), repeat, clear_caches))
+
+    for size in grid_sizes:
+        for spread in ("dense", "frontier"):
+            env = environment(size, spread)
+            record("Environment.update", {"grid": size, "spread": spread}, measure(env.update, repeat))
+            record("Environment.copy", {"grid": size, "spread": spread}, measure(lambda: env.copy().update(), repeat))
+
+    for size in grid_sizes:
+        s = swarm(size, 20)
+        record("Swarm.update", {"grid": size, "boids": 20}, measure(s.update, repeat))
+    for nboids in boid_counts:
+        s = swarm(200, nboids)
+        record("Swarm.update", {"grid": 200, "boids": nboids}, measure(s.update, repeat))
+        neighbours = s.find_neighbours(s.positions)
+        record("Swarm.find_neighbours", {"grid": 200, "boids": nboids}, measure(lambda: s.find_neighbours(s.positions), repeat))
+        for r in s.rules.values():
+            record(f"{type(r).__name__}.apply", {"grid": 200, "boids": nboids},
+                   measure(lambda: r.apply(s, s.positions, s.velocities, neighbours), repeat))
+
+    for size in grid_sizes[:2]:
+        for nboids in boid_counts[:2]:
+            state = {}
+            setup = lambda: state.update(swarm=swarm(size, nboids))
+            record("Swarm.simulate", {"grid": size, "boids": nboids, "n_iters": 50}, measure(lambda: state["swarm"].simulate(50), repeat, setup))
+            if jit.NUMBA_AVAILABLE:
+                setup = lambda: state.update(swarm=swarm(size, nboids)) or setattr(state["swarm"], "backend", "jit")
+                record("Swarm.simulate", {"grid": size, "boids": nboids, "n_iters": 50, "backend": "jit"}, measure(lambda: state["swarm"].simulate(50), repeat, setup))
+
+    for population_size in population_sizes:
+        np.random.seed(0)
+        evolution = Evolution(environment(20), population_size, 0.05, seed=0)
+        record("Evolution.evolve", {"grid": 20, "population": population_size, "n_iters": 50}, measure(lambda: evolution.evolve(50), repeat))
+        np.random.seed(0)
+        evolution = SteadyStateEvolution(environment(20), population_size, 0.05, seed=0, in_flight=1)
+        record("SteadyStateEvolution.evolve", {"grid": 20, "population": population_size, "n_iters": 50}, measure(lambda: evolution.evolve(50), repeat))
+
+    return results
+
+
+def key(result: Dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[Dict]:
+    """Compare the median times of ```results``` against ```baseline```.
+
+    Returns:
+        List[Dict]: The cases that are more than ```threshold``` (relative) slower than the baseline.
+    """
+    reference = dict((key(result), result) for result in baseline)
+    regressions = []
+    print(f"\n{'case':<70} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for result in results:
+        if key(result) not in reference:
+            continue
+        before = reference[key(result)]["median"]
+        ratio = result["median"] / before if before > 0 else np.inf
+        flag = " REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{result['name'] + ' ' + json.dumps(result['params']):<70} {before*1e3:>8.3f}ms {result['median']*1e3:>8.3f}ms {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append({**result, "baseline": before, "ratio": ratio})
+    return regressions
+
+
+def metadata() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "processor": platform.processor()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    parser.add_argument("--output", default="bench.json", help="Where to write the results (JSON).")
+    parser.add_argument("--baseline", help="A results file of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown that is flagged as a regression (default 0.2).")
+    parser.add_argument("--repeat", type=int, help="The number of timed calls per case (default 5, 3 with --quick).")
+    parser.add_argument("--quick", action="store_true", help="Only sweep the small grids, boid counts and populations.")
+    parser.add_argument("--grid-sizes", type=int, nargs="+")
+    parser.add_argument("--boid-counts", type=int, nargs="+")
+    parser.add_argument("--population-sizes", type=int, nargs="+")
+    args = parser.parse_args()
+
+    settings = dict(QUICK) if args.quick else {"grid_sizes": GRID_SIZES, "boid_counts": BOID_COUNTS, "population_sizes": POPULATION_SIZES, "repeat": 5}
+    for name in ("grid_sizes", "boid_counts", "population_sizes", "repeat"):
+        if getattr(args, name) is not None:
+            settings[name] = getattr(args, name)
+
+    results = run(**settings)
+    regressions = compare(results, json.load(open(args.baseline))["results"], args.threshold) if args.baseline else []
+    for result in results:
+        if result.get("heavy_modules"):
+            print(f"\n{result['name']} {result['params']['module']} loads {', '.join(result['heavy_modules'])}")
+            regressions.append(result)
+    with open(args.output, "w") as file:
+        json.dump({"meta": metadata(), "settings": settings, "results": results, "regressions": regressions}, file, indent=1)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
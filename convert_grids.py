@@ -0,0 +1,27 @@
+import os
+import sys
+from glob import glob
+from src import gridio
+
+def main():
+    """Convert text (.in) grid files to the binary (.grid) format, and back.
+
+    Usage:
+        python convert_grids.py [files...]
+    Without arguments, every .in file in grid_files/ is converted. Text files are written as .grid next to the input, .grid files as .in.
+    """
+    files = sys.argv[1:] or sorted(glob(os.path.join("grid_files", "*.in")))
+    for file_path in files:
+        root, _ = os.path.splitext(file_path)
+        if gridio.is_binary(file_path):
+            grid, _, _ = gridio.load_grid(file_path)
+            target = root + ".in"
+            gridio.write_text(target, grid)
+        else:
+            grid = gridio.read_text(file_path)
+            target = root + gridio.BINARY_SUFFIX
+            gridio.write_binary(target, grid)
+        print(f"{file_path} -> {target}")
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,54 @@
-import numpy as np
-from tqdm import tqdm
 from src import *
+from src import Display
+from src.campaign import Campaign
+from src.results import export_csv
+from src.replay import record
 
 def main():
-    results_file = r"./output.txt"
+    results_file = r"./output"  # A results directory, see src/results.py
+    csv_file = None  # If set, the results are also exported to this file in the CSV layout
+    checkpoint_dir = r"./checkpoints"  # Where the state of the run is saved, a run that was interrupted resumes from it
+    checkpoint_every = 5  # The number of generations between checkpoints
+    cache_file = r"./fitness_cache.sqlite"  # Where the fitness of simulated swarms is stored, so identical swarms are not simulated again
+    grid_file = r'grid_files\presentation.in'
     show_display=True
     n_observations = 1000
+    n_generations = 50
+    population_size = 40
+    mutate_rate = 0.05
+    max_workers = None  # The maximum number of observations that run at the same time, default = the number of processors
     steps=500  # How long the simulation after the evolution should run
     infinite=False
+    replay_dir = r"./replay"  # Where the simulation after the evolution is recorded, see src/replay.py; it is shown from the recording
     n_iters = 200  # How long the simultations during the evolution should run
-    key_order = [rule.Alignment, rule.Cohesion, rule.Separation, rule.GoToFire, rule.GoToWater]
-
-    env = Environment.from_file(r'grid_files\presentation.in')
-
-    with open(results_file, mode='a') as out:
-        out.write("Obs,Gen,Alignment,Cohesion,Separation,GoToFire,GoToWater,fitness\n")
-
-    for obs in tqdm(range(n_observations), position=0):
-        evo = Evolution(env,40,0.05)
-        for g in tqdm(range(50), position=1, leave=None):
-            fitness = evo.evolve(n_iters=n_iters, reps=2)
-            
-            with open(results_file, mode='a') as out:
-                for i,s in enumerate(evo.population):
-                    out.write("{:>3}, {:>3}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>6.2f}\n".format(obs,evo.generation-1,*[s.rules[k].weight for k in key_order],fitness[i]))
-
-        fitness = evo.calculate_fitness(n_iters=n_iters,reps=5)
-        swarm = evo.population[np.argmax(fitness)]
-        swarm = Swarm(env.copy(), swarm.vision_range, swarm.max_speed, swarm.boids.size, swarm.rules.values())
-        with open(results_file, mode='a') as out:
-            for i,s in enumerate(evo.population):
-                out.write("{:>3}, {:>3}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>7.4f}, {:>6.2f}\n".format(obs,evo.generation-1,*[s.rules[k].weight for k in key_order],fitness[i]))
-
-    display = Display(swarm, steps=steps,infinite=infinite)
-
+    reps = 4  # The maximum number of simulations per swarm, racing stops early for swarms that are clearly better or worse
+    steady_state = False  # Evolve without generations: every evaluated swarm is replaced by a new child right away, see SteadyStateEvolution
+
+    campaign = Campaign(grid_file, population_size, mutate_rate, n_iters, n_generations, reps, max_workers=max_workers,
+                        checkpoint_dir=checkpoint_dir, checkpoint_every=checkpoint_every, cache_file=cache_file,
+                        steady_state=steady_state)
+    best = campaign.run(results_file, n_observations)
+    if csv_file is not None:
+        export_csv(results_file, csv_file)
+
+    if not best:
+        print("No observation was run, there is no swarm to show")
+        return
+
+    env = Environment.from_file(grid_file)
+    genome = best[-1]
+    rules = [getattr(rule, name)(weight=weight) for name, weight in genome["rules"]]
+    swarm = Swarm(env, genome["vision_range"], genome["max_speed"], genome["nboids"], rules)
+
+    if infinite:
+        Display(swarm, steps=steps, infinite=True).display()
+        return
+    replay = record(swarm, replay_dir, steps, genome=genome)
     if show_display:
-        display.display()
+        Display(replay.player(), steps=steps, infinite=False).display()
     else:
-        for _ in range(steps):
-            swarm.update()
-        print(env.grid) 
-    
+        print(replay.grid(-1))
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
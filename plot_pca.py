@@ -1,6 +1,4 @@
-import os
 import numpy as np
-import pandas as pd
 
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcol
@@ -10,6 +8,8 @@ from sklearn.decomposition import PCA
 
 from scipy.stats import pearsonr
 
+from src.results import read_results, results_path
+
 
 def main():
     environments = [
@@ -24,9 +24,11 @@ def main():
     im = None
     for i, env in enumerate(environments):
 
-        df = pd.read_csv(os.path.join(results_directory, "output_" + env + ".csv"))
-
-        df_last_gen = df[df.Gen == 50]
+        df_last_gen = read_results(
+            results_path(results_directory, env),
+            columns=["Obs", "Alignment", "Cohesion", "Separation", "GoToWater", "GoToFire", "fitness"],
+            generations=[50],
+        )
 
         idx = df_last_gen.groupby("Obs")["fitness"].transform(max) == df_last_gen["fitness"]
 
@@ -64,4 +66,4 @@ def main():
     cb_ax = fig.add_axes([0.83, 0.2, 0.02, 0.7])
     fig.colorbar(im, cax=cb_ax, label="Normalized fitness")
     plt.show()
-    fig.savefig("./pca_all.pdf", bbox_inches="tight")
\ No newline at end of file
+    fig.savefig("./pca_all.pdf", bbox_inches="tight")
\ No newline at end of file
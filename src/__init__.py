@@ -1,11 +1,22 @@
 from .boid import Boid
-from .display import Display
 from .environment import Environment
 from .rule import Rule
 from .state import State
 from .swarm import Swarm
-from .evolution import Evolution
+from .evolution import Evolution, SteadyStateEvolution
 
-__all__ = ["boid","display","environment","rule","state","swarm","evolution","Boid","Display","Environment","Rule","State","Swarm","Evolution"]
+# The simulation core imports without plotting libraries: Display (matplotlib) is imported on first use, ```from src import Display```.
+# Heavy dependencies of the core itself (scikit-learn, scipy.signal, pandas) are imported inside the functions that need them.
+_LAZY = {"Display": ".display", "display": ".display"}
 
+__all__ = ["boid","environment","rule","state","swarm","evolution","Boid","Environment","Rule","State","Swarm","Evolution","SteadyStateEvolution"]
 
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        import importlib
+        module = importlib.import_module(_LAZY[name], __name__)
+        value = module if name == "display" else getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,193 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Union
+if TYPE_CHECKING:
+    from .environment import Environment
+
+import numpy as np
+from scipy.ndimage import convolve
+
+from . import seeding
+from .state import State
+from .spatial import nearest_cells
+from .spread import FireFront
+
+
+def normalize(vectors: np.ndarray[float]) -> np.ndarray[float]:
+    """Scale every non-zero vector along the last axis to unit length.
+    """
+    norm = np.linalg.norm(vectors, axis=-1)[..., np.newaxis]
+    return np.divide(vectors, norm, where=norm > 0, out=np.zeros(vectors.shape))
+
+
+class BatchSimulation:
+    grids:np.ndarray[np.int8]
+    positions:np.ndarray[float]
+    velocities:np.ndarray[float]
+    carrying_water:np.ndarray[bool]
+    out_of_bounds_timer:np.ndarray[int]
+    weights:np.ndarray[float]
+    n_fires:np.ndarray[int]
+    running:np.ndarray[bool]
+    rngs:List[np.random.Generator]
+    fire_rngs:List[np.random.Generator]
+
+    def __init__(self, env: Environment, weights: np.ndarray[float], vision_range: Union[float, np.ndarray[float]], max_speed: Union[float, np.ndarray[float]], nboids: int,
+                 seeds: Optional[List[seeding.Seed]] = None) -> None:
+        """Simulate a batch of swarms, each on its own copy of ```env```, in lockstep.
+        The state of all simulations is stacked: grids (P, H, W), boids (P, N, 2) and rule weights (P, 5).
+        Every simulation draws from its own generators, derived from its seed as in ```Swarm.reset```: ```rngs``` for the boids and ```fire_rngs``` for the fire spread.
+
+        Arguments:
+            env (Environment): The environment every simulation starts from.
+            weights (np.ndarray[float]): The rule weights of every simulation (P, 5), in the order of ```rule.RULES```.
+            vision_range (Union[float, np.ndarray[float]]): The vision range of the boids, per simulation or shared.
+            max_speed (Union[float, np.ndarray[float]]): The maximum speed of the boids, per simulation or shared.
+            nboids (int): The number of boids in every swarm.
+            seeds (List[Seed]): The seed of every simulation. default = drawn from ```np.random```.
+        """
+        n = weights.shape[0]
+        seeds = [seeding.sequence(seed) for seed in (seeds if seeds is not None else [None] * n)]
+        self.rngs = [np.random.default_rng(seeding.child(seed, 0)) for seed in seeds]
+        self.fire_rngs = [np.random.default_rng(seeding.child(seed, 1)) for seed in seeds]
+        self.weights = weights
+        self.vision_range = np.broadcast_to(np.asarray(vision_range, dtype=float), (n,))
+        self.max_speed = np.broadcast_to(np.asarray(max_speed, dtype=float), (n,))
+        self.pickup_chance = 0.5
+        self.kernel = FireFront.kernel[np.newaxis].astype(np.int8)
+
+        self.grids = np.repeat(env.grid[np.newaxis], n, axis=0)
+        self.n_fires = np.full(n, env.n_fires)
+        self.water_field = env.water_field
+        self.positions = np.empty((n, nboids, 2))
+        self.velocities = np.empty((n, nboids, 2))
+        for i, rng in enumerate(self.rngs):
+            self.positions[i] = rng.uniform(0, env.grid.shape[0]-1.01, (nboids, 2))
+            self.velocities[i] = rng.uniform(-1, 1, (nboids, 2))*self.max_speed[i]
+        self.carrying_water = np.zeros((n, nboids), dtype=bool)
+        self.out_of_bounds_timer = np.zeros((n, nboids), dtype=int)
+        self.running = self.n_fires > 0
+
+    def simulate(self, n_iters: int) -> np.ndarray[float]:
+        """Run all simulations for at most ```n_iters``` steps, simulations stop as soon as their fire is out.
+
+        Arguments:
+            n_iters (int): The maximum number of steps.
+
+        Returns:
+            np.ndarray[float]: The fitness of every simulation, computed as in ```Swarm.simulate```.
+        """
+        fitness = np.zeros(self.running.shape)
+        # As in ```Swarm.simulate```, a simulation that starts without fire gets the full ```n_iters```
+        fitness[~self.running] = n_iters
+        for iter in range(n_iters):
+            if not self.running.any():
+                break
+            self.update(np.flatnonzero(self.running))
+            extinguished = self.running & (self.n_fires <= 0)
+            fitness[extinguished] = n_iters - iter
+            self.running &= ~extinguished
+        fitness[self.running] = -self.n_fires[self.running]
+        return fitness
+
+    def update(self, sims: np.ndarray[int]) -> None:
+        """Advance the simulations ```sims``` by one step.
+
+        Arguments:
+            sims (np.ndarray[int]): The indices of the simulations to update.
+        """
+        grids = self.grids[sims]
+        positions = self.positions[sims]
+        velocities = self.velocities[sims]
+        carrying_water = self.carrying_water[sims]
+        timer = self.out_of_bounds_timer[sims]
+        vision_range = self.vision_range[sims]
+        max_speed = self.max_speed[sims, np.newaxis]
+
+        forces = self.forces(grids, positions, velocities, carrying_water, vision_range, self.n_fires[sims])
+        velocities += np.einsum('pk,pnkd->pnd', self.weights[sims], forces)
+
+        # Clamp speed & move
+        speed = np.linalg.norm(velocities, axis=-1)
+        too_fast = speed > max_speed
+        velocities[too_fast] *= (np.broadcast_to(max_speed, speed.shape)[too_fast] / speed[too_fast])[:, np.newaxis]
+        positions += velocities * 0.1
+
+        # Border handling
+        shape = np.array(grids.shape[1:])
+        out_of_bounds_axis = (positions > shape) | (positions < 0)
+        horizontal, vertical = out_of_bounds_axis[..., 0], out_of_bounds_axis[..., 1]
+        out_of_bounds = horizontal | vertical
+        pull = out_of_bounds & (timer > 5)
+        velocities[pull] = np.where(positions[pull] < shape/2, 1, -1)
+        bounce = out_of_bounds & ~pull
+        velocities[bounce & horizontal, 0] *= -1
+        velocities[bounce & ~horizontal, 1] *= -1
+        timer[bounce] += 1
+        timer[~out_of_bounds] = 0
+        positions[out_of_bounds] += velocities[out_of_bounds] * 0.2
+
+        # Interact with the grid
+        n_fires = self.n_fires[sims]
+        cells = np.clip(positions.astype(int), 0, shape - 1)
+        sim = np.broadcast_to(np.arange(sims.size)[:, np.newaxis], cells.shape[:2])
+        states = grids[sim, cells[..., 0], cells[..., 1]]
+        dropping = ~out_of_bounds & carrying_water & (states == State.FIRE.value)
+        if dropping.any():
+            p, b = np.nonzero(dropping)
+            flat_cells = np.ravel_multi_index((p, cells[p, b, 0], cells[p, b, 1]), grids.shape)
+            _, first = np.unique(flat_cells, return_index=True)
+            p, b = p[first], b[first]
+            grids[p, cells[p, b, 0], cells[p, b, 1]] = State.BARREN.value
+            n_fires -= np.bincount(p, minlength=sims.size)
+            carrying_water[p, b] = False
+        pickup = np.array([self.rngs[s].random(carrying_water.shape[1]) for s in sims]) < self.pickup_chance
+        carrying_water |= ~out_of_bounds & pickup & (states == State.WATER.value)
+
+        # Fire spread
+        pressure = convolve((grids == State.FIRE.value).astype(np.int8), self.kernel, mode='constant')
+        exposed = (grids == State.TREE.value) & (pressure > 0)
+        ignited = np.zeros(grids.shape, dtype=bool)
+        for i, s in enumerate(sims):
+            candidates = np.flatnonzero(exposed[i])
+            p = pressure[i].flat[candidates] * FireFront.scale
+            ignited[i].flat[candidates[p > self.fire_rngs[s].random(candidates.size)]] = True
+        n_fires += ignited.sum(axis=(1, 2))
+        grids[ignited] = State.FIRE.value
+
+        self.grids[sims] = grids
+        self.positions[sims] = positions
+        self.velocities[sims] = velocities
+        self.carrying_water[sims] = carrying_water
+        self.out_of_bounds_timer[sims] = timer
+        self.n_fires[sims] = n_fires
+
+    def forces(self, grids: np.ndarray[np.int8], positions: np.ndarray[float], velocities: np.ndarray[float], carrying_water: np.ndarray[bool], vision_range: np.ndarray[float], n_fires: np.ndarray[int]) -> np.ndarray[float]:
+        """Compute the force of every rule on every boid.
+
+        Returns:
+            np.ndarray[float]: The forces (P, N, 5, 2), in the order of ```rule.RULES```.
+        """
+        n = positions.shape[1]
+        offsets = positions[:, np.newaxis, :, :] - positions[:, :, np.newaxis, :]
+        distance = np.einsum('pijd,pijd->pij', offsets, offsets)
+        neighbours = (distance <= vision_range[:, np.newaxis, np.newaxis]**2) & ~np.eye(n, dtype=bool)
+        counts = neighbours.sum(axis=-1)[..., np.newaxis]
+        has_neighbours = counts > 0
+
+        # Alignment & Cohesion
+        alignment = np.divide(np.einsum('pij,pjd->pid', neighbours, velocities), counts, where=has_neighbours, out=np.zeros(positions.shape))
+        centre = np.divide(np.einsum('pij,pjd->pid', neighbours, positions), counts, where=has_neighbours, out=np.zeros(positions.shape))
+        cohesion = normalize(np.where(has_neighbours, centre - positions, 0))
+
+        # Separation
+        nearest = np.argmin(np.where(neighbours, distance, np.inf), axis=-1)
+        separation = normalize(np.where(has_neighbours, positions - np.take_along_axis(positions, nearest[..., np.newaxis], axis=1), 0))
+
+        # GoToWater & GoToFire
+        water, found_water = self.water_field.nearest(positions, vision_range[:, np.newaxis])
+        go_to_water = normalize(np.where((found_water & ~carrying_water)[..., np.newaxis], water - positions, 0))
+        fire, found_fire = nearest_cells(grids == State.FIRE.value, positions, vision_range[:, np.newaxis])
+        found_fire &= carrying_water & (n_fires > 0)[:, np.newaxis]
+        go_to_fire = normalize(np.where(found_fire[..., np.newaxis], fire - positions, 0))
+
+        return np.stack([alignment, cohesion, separation, go_to_water, go_to_fire], axis=2)
@@ -3,32 +3,66 @@ from typing import TYPE_CHECKING
 import numpy as np
 if TYPE_CHECKING:
     from .evolution import Environment
+    from .swarm import Swarm
 from .state import State
 
 class Boid:
-    position:np.ndarray[float]
-    velocity:np.ndarray[float]
+    swarm:Swarm
+    index:int
     size:float
-    env:Environment
-    carrying_water:bool
 
-    def __init__(self, position: np.ndarray[float], velocity: np.ndarray[float], env:Environment, size: float) -> None:
-        """Boid class representing a single cute boid
+    def __init__(self, swarm:Swarm, index:int, size: float = 1) -> None:
+        """Boid class representing a single cute boid.
+        The state of the boid lives in the arrays of its swarm, the boid is only a view on row ```index``` of those arrays.
 
         Args:
-            position (np.ndarray): the boids starting position on the grid
-            velocity (np.ndarray): the boids starting velocity
-            env (Environment): the environment the swarm lives in 
+            swarm (Swarm): the swarm the boid belongs to
+            index (int): the index of the boid within the swarm
             size (float): the size of the boid
         """
-        self.position = position
-        self.velocity = velocity
+        self.swarm = swarm
+        self.index = index
         self.size = size
-        self.env = env
-        self.pickup_chance = 0.5
 
-        self.carrying_water = False
-        self.out_of_bounds_timer = 0
+    @property
+    def position(self) -> np.ndarray[float]:
+        return self.swarm.positions[self.index]
+
+    @position.setter
+    def position(self, position: np.ndarray[float]) -> None:
+        self.swarm.positions[self.index] = position
+
+    @property
+    def velocity(self) -> np.ndarray[float]:
+        return self.swarm.velocities[self.index]
+
+    @velocity.setter
+    def velocity(self, velocity: np.ndarray[float]) -> None:
+        self.swarm.velocities[self.index] = velocity
+
+    @property
+    def carrying_water(self) -> bool:
+        return bool(self.swarm.carrying_water[self.index])
+
+    @carrying_water.setter
+    def carrying_water(self, carrying_water: bool) -> None:
+        self.swarm.carrying_water[self.index] = carrying_water
+
+    @property
+    def out_of_bounds_timer(self) -> int:
+        return int(self.swarm.out_of_bounds_timer[self.index])
+
+    @out_of_bounds_timer.setter
+    def out_of_bounds_timer(self, timer: int) -> None:
+        self.swarm.out_of_bounds_timer[self.index] = timer
+
+    @property
+    def env(self) -> Environment:
+        return self.swarm.env
+
+    @property
+    def pickup_chance(self) -> float:
+        return self.swarm.pickup_chance
 
     def update(self) -> None:
         """Update the behaviour of the Boid given the environment.
@@ -42,7 +76,7 @@ class Boid:
             if self.on_fire() and self.carrying_water:
                 self.extinguish_fire()
             
-            if not self.carrying_water and np.random.random() < self.pickup_chance:
+            if not self.carrying_water and self.swarm.rng.random() < self.pickup_chance:
                 self.get_water()
         else:
             self.position += self.velocity * 0.2
@@ -58,8 +92,7 @@ class Boid:
     def extinguish_fire(self) -> None:
         """Extinguishes fire by dropping water, changing the grid by reference and setting the attribute ```carrying_water``` to false.
         """        
-        self.env.grid[int(self.position[0]), int(self.position[1])] = State.BARREN.value
-        self.env.n_fires-=1
+        self.env.extinguish(np.array([int(self.position[0])]), np.array([int(self.position[1])]))
         self.carrying_water = False
 
     def get_water(self) -> None:
@@ -114,4 +147,4 @@ class Boid:
         for i in range(position.shape[0]):
             position[i] = max(position[i], 0)
             position[i] = min(position[i], self.env.grid.shape[0])
-        return position
\ No newline at end of file
+        return position
\ No newline at end of file
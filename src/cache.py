@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import sqlite3
+
+
+class FitnessCache:
+    """
+    Fitness memoization:
+        Maps a simulation key to its fitness. The most recently used entries are kept in memory (LRU),
+        and every entry can be backed by an sqlite file so the cache outlives the process.
+
+    """
+    maxsize: int
+    hits: int
+    misses: int
+    entries: OrderedDict
+    connection: Optional[sqlite3.Connection]
+
+    def __init__(self, maxsize: int = 100000, path: Optional[str] = None) -> None:
+        """Create an empty cache, or open the on-disk store at ```path```.
+
+        Arguments:
+            maxsize (int): The maximum number of entries kept in memory. default = 100000.
+            path (str): The path to an sqlite file that stores every entry, it can be shared by many processes. default = in memory only.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, timeout=60)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, value REAL)")
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """Look up the fitness of ```key```, counting a hit or a miss.
+
+        Arguments:
+            key (Hashable): The key, a tuple of numbers and strings.
+
+        Returns:
+            Optional[float]: The fitness, or None if it is not cached.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.connection is not None:
+            row = self.connection.execute("SELECT value FROM fitness WHERE key = ?", (repr(key),)).fetchone()
+            if row is not None:
+                self._remember(key, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: float) -> None:
+        """Store the fitness of ```key```.
+
+        Arguments:
+            key (Hashable): The key, a tuple of numbers and strings.
+            value (float): The fitness.
+        """
+        self.put_many([(key, value)])
+
+    def put_many(self, items: List[Tuple[Hashable, float]]) -> None:
+        """Store many fitness values, with a single write to the on-disk store.
+
+        Arguments:
+            items (List[Tuple[Hashable, float]]): The keys and their fitness.
+        """
+        for key, value in items:
+            self._remember(key, float(value))
+        if self.connection is not None:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO fitness VALUES (?, ?)", [(repr(key), float(value)) for key, value in items])
+
+    def _remember(self, key: Hashable, value: float) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def close(self) -> None:
+        """Close the on-disk store.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __enter__(self) -> FitnessCache:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return f"{len(self)} entries, {self.hits} hits, {self.misses} misses"
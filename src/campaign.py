@@ -0,0 +1,199 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Union
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Manager
+import os
+import numpy as np
+from tqdm import tqdm
+
+from . import checkpoint, profiling, rule
+from .cache import FitnessCache
+from .environment import Environment
+from .evaluation import CachedEvaluator, Evaluator, PoolEvaluator, RacingEvaluator
+from .evolution import Evolution, SteadyStateEvolution
+from .results import COLUMNS, ResultsWriter
+
+# The order of the rule weights in the results
+KEY_ORDER = [rule.Alignment, rule.Cohesion, rule.Separation, rule.GoToFire, rule.GoToWater]
+
+
+def population_rows(obs: int, evolution: Evolution, fitness: np.ndarray[float], evaluator: Evaluator) -> Dict[str, np.ndarray]:
+    """The results rows of a population: the genomes of the swarms and their fitness.
+
+    Arguments:
+        obs (int): The observation.
+        evolution (Evolution): The evolution.
+        fitness (np.ndarray[float]): The fitness of the swarms.
+        evaluator (Evaluator): The evaluator that calculated the fitness, a ```RacingEvaluator``` also gives the reps and variance of every swarm,
+                               as does a ```SteadyStateEvolution``` passed in its place.
+
+    Returns:
+        Dict[str, np.ndarray]: The values of every column of ```results.COLUMNS```.
+    """
+    n = len(evolution.population)
+    weights = np.array([[swarm.rules[k].weight for k in KEY_ORDER] for swarm in evolution.population])
+    rows = dict((k.__name__, weights[:, i]) for i, k in enumerate(KEY_ORDER))
+    rows.update(Obs=np.full(n, obs), Gen=np.full(n, evolution.generation - 1), fitness=np.asarray(fitness, dtype=float),
+                reps=getattr(evaluator, 'reps', np.zeros(n, dtype=int)), variance=getattr(evaluator, 'variance', np.full(n, np.nan)))
+    return dict((name, np.asarray(rows[name], dtype=dtype)) for name, dtype in COLUMNS.items())
+
+
+class Campaign:
+    """
+    Campaign of independent observations:
+        Every observation evolves a population from scratch. Observations run in parallel in a pool of worker processes, each with its own seed,
+        and their results are merged in the order of the observations, so the results do not depend on the number of workers.
+
+    """
+
+    def __init__(self, grid_file: Union[str, List[str]], population_size: int = 40, mutate_rate: float = 0.05, n_iters: int = 200, n_generations: int = 50, reps: int = 4,
+                 vision_range: float = 4, max_speed: float = 4, nboids: int = 20, seed: Optional[int] = None, evaluation_seed: int = 0, max_workers: Optional[int] = None,
+                 checkpoint_dir: Optional[str] = None, checkpoint_every: int = 5, cache_file: Optional[str] = None, steady_state: bool = False) -> None:
+        """Set up a campaign.
+
+        Arguments:
+            grid_file (Union[str, List[str]]): The grid the swarms are evaluated on, or a family of grids (e.g. ```scenario.grid_files```):
+                                               observation ```obs``` is then evaluated on grid ```obs``` modulo the number of grids.
+            population_size (int): The number of swarms in the population. default = 40.
+            mutate_rate (float): The probability that a rule of a child is mutated. default = 0.05.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness. default = 200.
+            n_generations (int): The number of generations of every observation. default = 50.
+            reps (int): The maximum number of simulations per swarm and generation, swarms are raced with a ```RacingEvaluator```. default = 4.
+            vision_range (float): The vision range of the boids. default = 4.
+            max_speed (float): The maximum speed of the boids. default = 4.
+            nboids (int): The number of boids in every swarm. default = 20.
+            seed (int): The base seed, the evolution of observation ```obs``` is seeded with ```(seed, obs)```. default = drawn from ```np.random```.
+            evaluation_seed (int): The seed of the fitness simulations, the same for every observation, see ```evaluator```. default = 0.
+            max_workers (int): The maximum number of observations that run at the same time. default = the number of processors.
+            checkpoint_dir (str): A directory for checkpoints, of the campaign and of every running observation, default = no checkpoints.
+            checkpoint_every (int): The number of generations between checkpoints of an observation. default = 5.
+            cache_file (str): An sqlite file shared by the workers to cache fitness values, see ```FitnessCache```. default = in memory, per observation.
+            steady_state (bool): Evolve every observation with a ```SteadyStateEvolution``` instead of generations, the swarms are then not raced
+                                 but simulated ```reps``` times. A generation of the results is every ```population_size``` evaluations. default = False.
+        """
+        self.grid_file = grid_file
+        self.population_size = population_size
+        self.mutate_rate = mutate_rate
+        self.n_iters = n_iters
+        self.n_generations = n_generations
+        self.reps = reps
+        self.vision_range = vision_range
+        self.max_speed = max_speed
+        self.nboids = nboids
+        self.seed = seed if seed is not None else int(np.random.randint(2**31))
+        self.evaluation_seed = evaluation_seed
+        self.max_workers = max_workers
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.cache_file = cache_file
+        self.steady_state = steady_state
+
+    def _checkpoint_file(self, name: str) -> Optional[str]:
+        return os.path.join(self.checkpoint_dir, name + ".json") if self.checkpoint_dir is not None else None
+
+    def run(self, results_file: str, n_observations: int) -> List[Dict]:
+        """Run the observations that are not done yet and write their results, in order, as soon as they are complete.
+        With a ```checkpoint_dir``` an interrupted campaign resumes where it stopped, the results are rewound to the last complete observation.
+
+        Arguments:
+            results_file (str): The results directory, see ```ResultsWriter```.
+            n_observations (int): The number of observations.
+
+        Returns:
+            List[Dict]: The genome of the best swarm of every observation, also of those that ran before a resume, see ```Evolution.state```.
+        """
+        first, offset, best = 0, None, []
+        campaign_file = self._checkpoint_file("campaign")
+        if campaign_file is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            resume = checkpoint.load(campaign_file)
+            if resume is not None:
+                first, self.seed, offset, best = resume["obs"], resume["seed"], resume["results"], resume.get("best", [])
+                self.evaluation_seed = resume.get("evaluation_seed", self.evaluation_seed)
+
+        finished = {}
+        next_obs = first
+        with ResultsWriter(results_file, offset=offset) as results, Manager() as manager, ProcessPoolExecutor(self.max_workers) as executor, \
+                tqdm(total=n_observations * self.n_generations, initial=first * self.n_generations, unit="gen") as progress:
+            if campaign_file is not None:
+                checkpoint.save(campaign_file, obs=first, seed=self.seed, evaluation_seed=self.evaluation_seed, results=results.checkpoint(), best=best)
+            queue = manager.Queue()
+            pending = dict((profiling.submit(executor, self.observe, obs, queue), obs) for obs in range(first, n_observations))
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                while not queue.empty():
+                    progress.update(queue.get())
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+                while next_obs in finished:
+                    rows, genome = finished.pop(next_obs)
+                    results.append(**rows)
+                    best.append(genome)
+                    next_obs += 1
+                    if campaign_file is not None:
+                        checkpoint.save(campaign_file, obs=next_obs, seed=self.seed, evaluation_seed=self.evaluation_seed, results=results.checkpoint(), best=best)
+                        if os.path.exists(self._checkpoint_file(f"obs_{next_obs - 1}")):
+                            os.remove(self._checkpoint_file(f"obs_{next_obs - 1}"))
+                progress.set_postfix(observations=f"{next_obs}/{n_observations}")
+        if campaign_file is not None:
+            os.remove(campaign_file)
+        return best
+
+    def evaluator(self, cache: FitnessCache) -> Evaluator:
+        """The evaluator of an observation: the simulations are cached in ```cache``` and, unless the campaign is steady-state, raced.
+        Every observation simulates with ```evaluation_seed```, so a genome on a grid is simulated on the same scenarios in every observation
+        and every campaign with that seed, and a ```cache``` backed by ```cache_file``` reuses its fitness across them.
+
+        Arguments:
+            cache (FitnessCache): The fitness cache.
+
+        Returns:
+            Evaluator: The evaluator.
+        """
+        cached = CachedEvaluator(PoolEvaluator(max_workers=0, seed=self.evaluation_seed), cache)
+        return cached if self.steady_state else RacingEvaluator(cached)
+
+    def observe(self, obs: int, queue=None) -> tuple:
+        """Run one observation. Runs inside the worker processes, resuming from the checkpoint of the observation if there is one.
+
+        Arguments:
+            obs (int): The observation.
+            queue (Queue): A queue that receives the number of completed generations, for the progress bar.
+
+        Returns:
+            tuple: The results rows of the observation and the genome of its best swarm.
+        """
+        evolution_seed = np.random.SeedSequence(self.seed, spawn_key=(obs,)).spawn(1)[0]
+        grid_files = [self.grid_file] if isinstance(self.grid_file, str) else self.grid_file
+        env = Environment.from_file(grid_files[obs % len(grid_files)])
+        cache = FitnessCache(path=self.cache_file)
+        evaluator = self.evaluator(cache)
+        evolution_type = SteadyStateEvolution if self.steady_state else Evolution
+        checkpoint_file = self._checkpoint_file(f"obs_{obs}")
+        resume = checkpoint.load(checkpoint_file) if checkpoint_file is not None else None
+        if resume is not None:
+            evo = evolution_type.from_state(env, resume["evolution"], evaluator)
+            rows = [dict((name, np.array(values, dtype=COLUMNS[name])) for name, values in resume["rows"].items())]
+            if queue is not None:
+                queue.put(evo.generation)
+        else:
+            # The observations already run in parallel, so a steady-state observation evaluates one swarm at a time
+            options = dict(in_flight=1) if self.steady_state else {}
+            evo = evolution_type(env, self.population_size, self.mutate_rate, evaluator, self.vision_range, self.max_speed, self.nboids, seed=evolution_seed, **options)
+            rows = []
+
+        for _ in range(evo.generation, self.n_generations):
+            fitness = evo.evolve(n_iters=self.n_iters, reps=self.reps)
+            rows.append(population_rows(obs, evo, fitness, evo if self.steady_state else evaluator))
+            if checkpoint_file is not None and evo.generation % self.checkpoint_every == 0:
+                columns = dict((name, np.concatenate([r[name] for r in rows]).tolist()) for name in COLUMNS)
+                checkpoint.save(checkpoint_file, evolution=evo.state(), rows=columns)
+            if queue is not None:
+                queue.put(1)
+
+        fitness = evo.calculate_fitness(n_iters=self.n_iters, reps=5)
+        rows.append(population_rows(obs, evo, fitness, evaluator))
+        cache.close()
+        genome = evo.state()["population"][int(np.argmax(fitness))]
+        return dict((name, np.concatenate([r[name] for r in rows])) for name in COLUMNS), genome
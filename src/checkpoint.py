@@ -0,0 +1,47 @@
+from typing import Dict, Optional
+import json
+import os
+import numpy as np
+
+
+def save(file_path: str, **state) -> None:
+    """Atomically write a checkpoint: the state is written to a temporary file that replaces ```file_path```,
+    so a checkpoint is never left half-written when the process dies.
+
+    Arguments:
+        file_path (str): The path to the checkpoint (.json).
+        state: The state to save, any JSON serializable values.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def load(file_path: str) -> Optional[Dict]:
+    """Read a checkpoint.
+
+    Arguments:
+        file_path (str): The path to the checkpoint (.json).
+
+    Returns:
+        Optional[Dict]: The saved state, or None if there is no checkpoint.
+    """
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def generator_state(rng: np.random.Generator) -> Dict:
+    """The state of a random generator, as JSON serializable values.
+    """
+    return rng.bit_generator.state
+
+
+def set_generator_state(rng: np.random.Generator, state: Dict) -> None:
+    """Restore the state of a random generator, as returned by ```generator_state```.
+    """
+    rng.bit_generator.state = state
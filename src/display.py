@@ -1,111 +1,106 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
 if TYPE_CHECKING:
     from .swarm import Swarm
     from .environment import Environment
-    
+
 import matplotlib.pyplot as plt
 from matplotlib import colors, animation
-from matplotlib.markers import MarkerStyle
+from matplotlib.artist import Artist
+from matplotlib.collections import PolyCollection
 import numpy as np
-import seaborn as sns
 from .state import State
+from . import render
 
 
 
 class Display:
+    # The boid marker: a triangle pointing along the x-axis, as the ">" marker of matplotlib
+    marker:np.ndarray[float] = 0.5*np.array([[1., 0.], [-1., -1.], [-1., 1.]])
 
-    def __init__(self, swarm:Swarm, steps:int, infinite:bool,savefile:str=None) -> None:
+    def __init__(self, swarm:Swarm, steps:int, infinite:bool,savefile:str=None,steps_per_frame:int=1) -> None:
         """Display class with different ways of displaying an environment.
+        The image of the grid and the boids are drawn once and updated in place every frame, with blitting.
 
         Args:
             env (Environment): environment to display
             steps (int): number of simulation steps
             infinite (bool): whether the simulation runs infinitely or not
+            savefile (str): if given, the animation is rendered headless to ```savefile```.gif instead of shown, see ```render.render```
+            steps_per_frame (int): number of simulation steps between two frames, default = 1
         """
         self.swarm = swarm
         self.steps = steps
         self.infinite = infinite
         self.savefile = savefile
+        self.steps_per_frame = steps_per_frame
 
-        self.cmap = colors.ListedColormap(['peru','firebrick','dodgerblue','forestgreen'])
+        self.cmap = colors.ListedColormap(render.GRID_COLORS)
         bounds=[-0.5, 0.5, 1.5, 2.5, 3.5]
         self.norm = colors.BoundaryNorm(bounds, self.cmap.N)
         self.interval = 100
-        self.boid_marker = ">"
-        self.boid_color = ["darkgray","deepskyblue"]
+        self.boid_color = render.BOID_COLORS
+        self.boid_size = 12  # points
 
     def display(self)-> None:
         """Show and animate the display
-        """        
-        fig, self.ax = plt.subplots(1, 1, figsize=(5, 5))
-        # Forest fire
-        plt.imshow(np.flip(self.swarm.env.grid.T, 0), cmap=self.cmap, norm=self.norm, origin="lower", extent=(0, self.swarm.env.grid.shape[0], self.swarm.env.grid.shape[1], 0))
-        
-        # Boids scatterplot
-        x = [boid.position[0] for boid in self.swarm.boids]
-        y = [boid.position[1] for boid in self.swarm.boids]
-        self.scatter = plt.scatter(x, y, marker=self.boid_marker, color=self.boid_color[0])
-
-        self.ax.invert_yaxis()
+        """
         if self.savefile:
-            self.ax.axis('off')
-            self.ax.get_xaxis().set_visible(False)
-            self.ax.get_yaxis().set_visible(False)
+            render.render(self.swarm, f'{self.savefile}.gif', self.steps, self.steps_per_frame, fps=60)
+            return
+
+        fig, self.ax = plt.subplots(1, 1, figsize=(5, 5))
+        width, height = self.swarm.env.grid.shape
+
+        # Forest fire: tile (x, y) of the grid covers [x, x+1] x [y, y+1]
+        self.image = self.ax.imshow(self.swarm.env.grid.T, cmap=self.cmap, norm=self.norm, origin="lower", extent=(0, width, 0, height), interpolation="nearest")
+        self.ax.set_xlim([0, width])
+        self.ax.set_ylim([0, height])
         plt.tight_layout()
-        
+
+        # Boids: one triangle per boid, in data coordinates, as large as a marker of ```boid_size``` points
+        points_per_tile = self.ax.get_window_extent().width / fig.dpi * 72 / width
+        self.scale = self.boid_size / points_per_tile
+        self.colors = colors.to_rgba_array(self.boid_color)
+        self.boids = PolyCollection(self.vertices(), facecolors=self.colors[self.swarm.carrying_water.astype(int)], edgecolors="face")
+        self.ax.add_collection(self.boids)
+
+        frames = -(-self.steps // self.steps_per_frame)
         if not self.infinite:
             # Animation
-            animator = animation.FuncAnimation(fig, self.animate, interval=self.interval, frames=self.steps, repeat=False, cache_frame_data=False)
-            if self.savefile:
-                animator.save(f'{self.savefile}.gif',fps=60,dpi=300)
-            else:
-                plt.show(block=False)
-                plt.pause(self.steps * self.interval * 0.001) # pause (s) = frames * interval (ms) * 0.001    
+            animator = animation.FuncAnimation(fig, self.animate, interval=self.interval, frames=frames, repeat=False, cache_frame_data=False, blit=True)
+            plt.show(block=False)
+            plt.pause(frames * self.interval * 0.001) # pause (s) = frames * interval (ms) * 0.001
             plt.close(fig)
         else:
             # Animation
-            animator = animation.FuncAnimation(fig, self.animate, interval=self.interval, cache_frame_data=False)
+            animator = animation.FuncAnimation(fig, self.animate, interval=self.interval, cache_frame_data=False, blit=True)
             plt.show()
-        
-    def animate(self, i:int)-> None:
-        """Animate the display
+
+    def vertices(self) -> np.ndarray[float]:
+        """The triangles of the boids, rotated along their velocity.
+
+        Returns:
+            np.ndarray[float]: The vertices of the triangles (N, 3, 2).
+        """
+        angle = np.arctan2(self.swarm.velocities[:, 1], self.swarm.velocities[:, 0])
+        cos, sin = np.cos(angle)[:, np.newaxis], np.sin(angle)[:, np.newaxis]
+        x, y = self.marker[:, 0] * self.scale, self.marker[:, 1] * self.scale
+        return np.stack([cos*x - sin*y, sin*x + cos*y], axis=-1) + self.swarm.positions[:, np.newaxis, :]
+
+    def animate(self, i:int)-> List[Artist]:
+        """Animate the display: advance the simulation by ```steps_per_frame``` steps and update the artists in place.
 
         Args:
             i: not accessed.
-        """        
-        # Update the boids
-        self.swarm.update()
-        
-        # Clear axes & set limits
-        self.ax.cla()
-        self.ax.set_xlim([0,self.swarm.env.grid.shape[0]])
-        self.ax.set_ylim([0,self.swarm.env.grid.shape[1]])
-        
-        # Redraw forest fire
-        plt.imshow(np.flip(self.swarm.env.grid.T, 0), cmap=self.cmap, norm=self.norm, origin="lower", extent=(0, self.swarm.env.grid.shape[0], self.swarm.env.grid.shape[1], 0))
-        
-        # Redraw boids scatterplot
-        x = [boid.position[0] for boid in self.swarm.boids]
-        y = [boid.position[1] for boid in self.swarm.boids]
-        self.scatter = plt.scatter(x, y, marker=self.boid_marker, color=self.boid_color[0])
-
-        offsets = []
-        markers = []
-        colors = []
-        
-        for boid in self.swarm.boids:
-            offsets.append([boid.position[0], boid.position[1]])
-            marker = MarkerStyle(">")
-            marker._transform = marker.get_transform().rotate_deg(np.angle(complex(*boid.velocity),True))
-            marker._transform = marker.get_transform().scale(2, 2)
-            if boid.carrying_water:
-                colors.append(self.boid_color[1])
-            else:
-                colors.append(self.boid_color[0])
-            markers.append(marker)
-            
-        self.scatter.set_color(colors)
-        self.scatter.set_offsets(offsets)
-        paths = [m.get_path().transformed(m.get_transform()) for m in markers]
-        self.scatter.set_paths(paths)
\ No newline at end of file
+
+        Returns:
+            List[Artist]: The artists that changed, for blitting.
+        """
+        for _ in range(self.steps_per_frame):
+            self.swarm.update()
+
+        self.image.set_data(self.swarm.env.grid.T)
+        self.boids.set_verts(self.vertices())
+        self.boids.set_facecolor(self.colors[self.swarm.carrying_water.astype(int)])
+        return [self.image, self.boids]
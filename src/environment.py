@@ -1,22 +1,231 @@
-from typing import Tuple, Union, Optional, overload
+from typing import TYPE_CHECKING, Dict, Tuple, Union, Optional, overload
+if TYPE_CHECKING:
+    from sklearn.neighbors import KDTree
+
+import weakref
 import numpy as np
-from sklearn.neighbors import KDTree
-from scipy.signal import convolve2d
+from scipy.ndimage import convolve
 
 from .state import State
+from . import gridio, seeding
+from .spatial import FireIndex, WaterField
+from .spread import FireFront
+from .profiling import NullProfiler
+
+
+def _read_only(*arrays: np.ndarray) -> None:
+    for array in arrays:
+        array.flags.writeable = False
+
+
+def _attach(name: str, shape: Tuple[int, int], n_fires: int) -> 'Map':
+    """Unpickle a shared map: attach to its shared memory, once per process and block.
+    """
+    if name not in Map._attached:
+        from multiprocessing import shared_memory
+        # Worker processes share the resource tracker of the process that created the block, which unlinks it
+        block = shared_memory.SharedMemory(name=name)
+        grid = np.ndarray(shape, dtype=np.int8, buffer=block.buf)
+        environment_map = Map(grid, n_fires, owned=True)
+        environment_map._block = block
+        Map._attached[name] = environment_map
+    return Map._attached[name]
+
+
+class Map:
+    """
+    Immutable, shared layers of an environment:
+        The grid every simulation starts from, its water lookup, fire index, fire front and spread kernel. All arrays are read-only,
+        so any number of environments can share a map; an environment only copies the grid and the fire state when it changes them (copy-on-write).
+        A map can be moved to shared memory with ```share```, it is then pickled by name and worker processes attach to it instead of receiving a copy.
+
+    """
+    grid:np.ndarray[np.int8]
+    n_tiles:int
+    n_fires:int
+    water_field:WaterField
+    fire_index:FireIndex
+    # The ignition pressure of a burning neighbour (dense spread), a tree catches fire with probability pressure * ```FireFront.scale```
+    kernel:np.ndarray[np.int8] = FireFront.kernel.astype(np.int8)
+    _attached:Dict[str, 'Map'] = {}
+
+    def __init__(self, grid: np.ndarray[np.int8], n_fires: Optional[int] = None, water_field: Optional[WaterField] = None, fire_index: Optional[FireIndex] = None,
+                 fire_front: Optional[FireFront] = None, owned: bool = False) -> None:
+        """Create the map of a grid.
+
+        Arguments:
+            grid (np.ndarray[np.int8]): The grid.
+            n_fires (int): The number of burning tiles in the grid, counted if not given.
+            water_field (WaterField): The nearest-water lookup of the grid, computed if not given.
+            fire_index (FireIndex): The index of the burning tiles of the grid, computed if not given.
+            fire_front (FireFront): The fire front of the grid, computed on first use if not given.
+            owned (bool): Whether the map may take over ```grid```, ```fire_index``` and ```fire_front``` instead of copying them; they are made read-only. default = False.
+        """
+        self.grid = grid if owned else np.array(grid, dtype=np.int8)
+        self.n_tiles = self.grid.size
+        self.n_fires = int(n_fires if n_fires is not None else np.count_nonzero(self.grid == State.FIRE.value))
+        self.water_field = water_field if water_field is not None else WaterField.of(self.grid)
+        if fire_index is None:
+            fire_index = FireIndex(self.grid)
+        elif not owned:
+            fire_index = fire_index.copy()
+        if fire_front is not None and not owned:
+            fire_front = fire_front.copy()
+        self.fire_index = fire_index
+        self._fire_front = fire_front
+        self._block = None
+        _read_only(self.grid, self.fire_index.mask, self.fire_index.blocks)
+        if self._fire_front is not None:
+            _read_only(self._fire_front.pressure, self._fire_front.frontier)
+
+    def fire_front(self) -> FireFront:
+        """The fire front of the grid, computed once on first use.
+        """
+        if self._fire_front is None:
+            self._fire_front = FireFront(self.grid)
+            _read_only(self._fire_front.pressure, self._fire_front.frontier)
+        return self._fire_front
+
+    def share(self) -> 'Map':
+        """Move the grid to shared memory, so the map is pickled by the name of the block. The block is removed when the map is closed or garbage collected.
+
+        Returns:
+            Map: The map itself.
+        """
+        if self._block is None:
+            from multiprocessing import shared_memory
+            block = shared_memory.SharedMemory(create=True, size=max(1, self.grid.nbytes))
+            grid = np.ndarray(self.grid.shape, dtype=np.int8, buffer=block.buf)
+            grid[...] = self.grid
+            _read_only(grid)
+            self.grid = grid
+            self._block = block
+            self._finalizer = weakref.finalize(self, Map._unlink, block)
+        return self
+
+    @staticmethod
+    def _unlink(block) -> None:
+        block.unlink()
+        try:
+            block.close()
+        except BufferError:
+            pass  # arrays still view the block, its memory is released with them
+
+    def close(self) -> None:
+        """Remove the shared memory block of a shared map, the map takes back a private copy of the grid.
+        Environments that were created from the shared map must not be used afterwards.
+        """
+        if self._block is not None and hasattr(self, "_finalizer"):
+            self.grid = np.array(self.grid)
+            _read_only(self.grid)
+            self._block = None
+            self._finalizer()
+
+    def __reduce__(self):
+        if self._block is not None:
+            return _attach, (self._block.name, self.grid.shape, self.n_fires)
+        return Map, (np.asarray(self.grid), self.n_fires)
+
 
 class Environment:
     n_tiles:int
     grid:np.ndarray[np.int8]
     n_fires:int
-    water_tree:KDTree
+    fire_index:FireIndex
+    water_field:WaterField
+    map:Map
+    profiler:NullProfiler = NullProfiler()
+    _rng:Optional[np.random.Generator] = None
         
-    def __init__(self,n_tiles:int,n_fires:int,grid:np.ndarray[np.int8]):
+    def __init__(self,n_tiles:int,n_fires:int,grid:np.ndarray[np.int8],water_field:Optional[WaterField]=None,fire_index:Optional[FireIndex]=None,spread:str="dense",fire_front:Optional[FireFront]=None,
+                 seed:seeding.Seed=None):
+        """Environment class representing a cellular automaton of forest, fire, water and barren tiles.
+        The static layers of the environment are shared through a ```Map```: ```copy``` and ```Environment.of``` are near-free,
+        the grid and the fire state of an environment are only copied when it changes them (see ```own```).
+
+        Arguments:
+            n_tiles (int): The number of tiles in the grid.
+            n_fires (int): The number of burning tiles in the grid.
+            grid (np.ndarray[np.int8]): The grid, the environment takes it over.
+            water_field (WaterField): The nearest-water lookup of the grid, computed if not given.
+            fire_index (FireIndex): The index of the burning tiles of the grid, computed if not given.
+            spread (str): How the fire spreads each step: "dense" convolves the whole grid, 
+                          "frontier" only draws for the tree cells next to a fire (faster on large maps with little fire). default = "dense".
+            fire_front (FireFront): The fire front of the grid when ```spread``` is "frontier", computed if not given.
+            seed (Seed): The seed of the fire spread, see ```rng```. default = drawn from ```np.random``` on first use.
+        """
         self.n_tiles=n_tiles
         self.grid=grid   
         self.n_fires=n_fires
-        self.fire_tree=self.get_tree(State.FIRE.value)
-        self.water_tree=self.get_tree(State.WATER.value)
+        self.fire_index=fire_index if fire_index is not None else FireIndex(grid)
+        self.spread=spread
+        self.fire_front=None
+        if spread == "frontier":
+            self.fire_front=fire_front if fire_front is not None else FireFront(grid)
+        self.water_field=water_field if water_field is not None else WaterField.of(grid)
+        self.map=None
+        self.owned=True
+        if seed is not None:
+            self.rng=seeding.generator(seed)
+
+    @classmethod
+    def of(cls, environment_map: Map, spread: str = "dense", seed: seeding.Seed = None) -> 'Environment':
+        """Create an environment in the initial state of a map, sharing all of its arrays until it changes.
+
+        Arguments:
+            environment_map (Map): The map.
+            spread (str): How the fire spreads, see ```Environment```.
+            seed (Seed): The seed of the fire spread, see ```rng```. default = drawn from ```np.random``` on first use.
+        """
+        env = cls.__new__(cls)
+        env.map = environment_map
+        env.n_tiles = environment_map.n_tiles
+        env.grid = environment_map.grid
+        env.n_fires = environment_map.n_fires
+        env.fire_index = environment_map.fire_index
+        env.spread = spread
+        env.fire_front = environment_map.fire_front() if spread == "frontier" else None
+        env.water_field = environment_map.water_field
+        env.owned = False
+        if seed is not None:
+            env.rng = seeding.generator(seed)
+        return env
+
+    @property
+    def rng(self) -> np.random.Generator:
+        """The random generator of the fire spread. A ```Swarm``` sets it from its own seed, so it is only seeded from ```np.random```
+        when the environment is updated on its own.
+        """
+        if self._rng is None:
+            self._rng = seeding.generator()
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng: np.random.Generator) -> None:
+        self._rng = rng
+
+    def own(self) -> None:
+        """Give the environment its own copy of the grid and the fire state, before they are changed.
+        """
+        if not self.owned:
+            self.grid = self.grid.copy()
+            self.fire_index = self.fire_index.copy()
+            if self.fire_front is not None:
+                self.fire_front = self.fire_front.copy()
+            self.owned = True
+
+    def snapshot(self) -> Map:
+        """The map of the current state of the environment. An environment that changed since its last snapshot hands its arrays over to a new map
+        and shares them from then on, so taking a snapshot does not copy anything.
+
+        Returns:
+            Map: The map.
+        """
+        if self.owned:
+            self.map = Map(self.grid, self.n_fires, self.water_field, self.fire_index, self.fire_front, owned=True)
+            self.grid, self.fire_index = self.map.grid, self.map.fire_index
+            self.owned = False
+        return self.map
     
     @classmethod
     def example(cls, size: Tuple[int, int], fire_size: Optional[Union[int, float]] = 1, water_size: Optional[Union[int, float]] = 1):
@@ -38,25 +247,16 @@ class Environment:
         return Environment(n_tiles,fire_size,grid)
     
     @classmethod
-    def from_file(cls, file_path:str):
+    def from_file(cls, file_path:str, spread:str="dense"):
         """Create an environment from a file
 
         Arguments:
-            file_path (str): the path to the .in file. 
+            file_path (str): the path to the .in (text) or .grid (binary, memory-mapped) file. 
+            spread (str): How the fire spreads, see ```Environment```.
 
         """      
-        with open(file_path,'r') as file:
-            nrows,ncols=[int(s) for s in file.readline().split()]
-            grid=np.empty((nrows,ncols),dtype=np.int8)
-            n_fires=0
-            for i in range(nrows):
-                line=file.readline()
-                for j in range(ncols):
-                    cell=int(line[j])
-                    grid[i,j]=cell
-                    if cell == State.FIRE.value:
-                        n_fires+=1
-            return Environment(nrows*ncols,n_fires,grid)    
+        grid,n_fires,water=gridio.load_grid(file_path)
+        return Environment(grid.size,n_fires,grid,water_field=WaterField.of(grid,water),spread=spread)
 
 
     @staticmethod
@@ -73,21 +273,15 @@ class Environment:
         Returns:
             np.ndarray: A representation of the cellular automaton. 
         """        
-        grid = np.ones(shape=size, dtype=np.int8) * 3  # forest tiles
+        grid = np.full(size, State.TREE.value, dtype=np.int8)  # forest tiles
 
-        coordinates = np.array([[x, y] for x in range(size[0]) for y in range(size[1])])
         n_burning_tiles = int(np.floor(n_tiles * fire_size)) if fire_size < 1 else fire_size
         n_water_tiles = int(np.floor(n_tiles * water_size)) if water_size < 1 else water_size
 
-        sampled_coordinates = coordinates[np.random.choice(coordinates.shape[0], size=n_burning_tiles+n_water_tiles, replace=False)]
-
-        water_coordinates = sampled_coordinates[n_burning_tiles:]
-        for c in water_coordinates:
-            grid[tuple(c)] = State.WATER.value
-
-        fire_coordinates = sampled_coordinates[:n_burning_tiles]
-        for c in fire_coordinates:
-            grid[tuple(c)] = State.FIRE.value
+        # Flat indices enumerate the tiles in the same order as the (x, y) coordinates, row by row
+        sampled_cells = np.random.choice(grid.size, size=n_burning_tiles+n_water_tiles, replace=False)
+        grid.flat[sampled_cells[n_burning_tiles:]] = State.WATER.value
+        grid.flat[sampled_cells[:n_burning_tiles]] = State.FIRE.value
 
         return grid   
     
@@ -95,27 +289,53 @@ class Environment:
         """Write the grid to a file.
 
         Arguments:
-            file_path: The path to the file.
+            file_path: The path to the file, written in the binary format if it ends with .grid and in the text format otherwise.
         """        
-        with open(file_path,'w') as file:
-            res = f"{self.grid.shape[0]} {self.grid.shape[1]}\n"
-            for i in range(self.grid.shape[0]):
-                for j in range(self.grid.shape[1]):
-                    res += str(self.grid[i, j])
-                res += '\n'
-            file.write(res)    
+        if gridio.is_binary(file_path):
+            gridio.write_binary(file_path, self.grid)
+        else:
+            gridio.write_text(file_path, self.grid)
 
     def update(self) -> None:
         """Update the environment.
         """        
-        fires=np.where(self.grid==State.FIRE.value,1,0)
-        kernel= np.array([[1,4,1],[4,0,4],[1,4,1]])*0.002
-        p=np.where(self.grid==State.TREE.value,convolve2d(fires,kernel,mode='same'),0)
-        mask=p>np.random.random(p.shape)
-        self.n_fires+=mask.sum()
-        self.grid= np.where(mask,State.FIRE.value,self.grid)
-        if self.n_fires > 0:
-            self.fire_tree=self.get_tree(State.FIRE.value)
+        self.own()
+        if self.fire_front is not None:
+            with self.profiler.phase("environment.spread"):
+                rows, cols = self.fire_front.spread(self.rng)
+                self.grid[rows, cols]=State.FIRE.value
+                self.n_fires+=len(rows)
+            with self.profiler.phase("environment.index"):
+                self.fire_index.ignite(rows, cols)
+                self.fire_front.ignite(rows, cols, self.grid)
+            self.profiler.count("fires_ignited", len(rows))
+            return
+        with self.profiler.phase("environment.spread"):
+            pressure=convolve((self.grid==State.FIRE.value).astype(np.int8),Map.kernel,mode='constant')
+            # Only trees next to a fire can catch fire, they are drawn for in the order of the grid
+            candidates=np.flatnonzero((self.grid==State.TREE.value)&(pressure>0))
+            p=pressure.flat[candidates]*FireFront.scale
+            rows,cols=np.unravel_index(candidates[p>self.rng.random(candidates.size)],pressure.shape)
+            self.n_fires+=len(rows)
+            self.grid[rows,cols]=State.FIRE.value
+        with self.profiler.phase("environment.index"):
+            self.fire_index.ignite(rows,cols)
+        self.profiler.count("fires_ignited", len(rows))
+
+    def extinguish(self, rows: np.ndarray[int], cols: np.ndarray[int]) -> None:
+        """Extinguish burning tiles, turning them barren.
+
+        Arguments:
+            rows (np.ndarray[int]): The rows of the burning tiles.
+            cols (np.ndarray[int]): The columns of the burning tiles.
+        """
+        self.own()
+        self.grid[rows, cols]=State.BARREN.value
+        self.n_fires-=len(rows)
+        self.profiler.count("fires_extinguished", len(rows))
+        self.fire_index.extinguish(rows, cols)
+        if self.fire_front is not None:
+            self.fire_front.extinguish(rows, cols, self.grid)
     
     def calculate_fitness(self) -> int:
         """Calculate the fitness of the simulated environment, which is based on the number of burning tiles. 
@@ -127,9 +347,10 @@ class Environment:
         return -self.n_fires
     
     def copy(self):
-        """Create a deep copy of the environment
+        """Create a copy of the environment, copy-on-write: both share the ```snapshot``` of the current state until one of them changes.
+        The copy gets its own random generator.
         """      
-        return Environment(self.n_tiles,self.n_fires,self.grid.copy())
+        return Environment.of(self.snapshot(), self.spread)
     
     def contains_fire(self) -> bool:
         """Verifies whether the environment contains fire
@@ -139,18 +360,14 @@ class Environment:
         """  
         return self.n_fires>0
     
-    def get_tree(self,value:int) -> KDTree:
+    def get_tree(self,value:int) -> "KDTree":
         """Get a KDTree from the centres of the coordinates of `value` in the grid.
 
         Returns:
             KDTree: a KDTree from the centres of the coordinates of `value` in the grid
         """  
-        coordinates = []
-        for i in range(self.grid.shape[0]):
-            for j in range(self.grid.shape[1]):
-                if self.grid[i, j] == value:
-                    coordinates.append([i+0.5, j+0.5])
-        return KDTree(coordinates)
+        from sklearn.neighbors import KDTree
+        return KDTree(np.argwhere(self.grid == value) + 0.5)
     
 
 
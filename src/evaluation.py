@@ -0,0 +1,403 @@
+from __future__ import annotations
+from typing import List, Optional
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import hashlib
+import numpy as np
+from . import profiling, rule
+from .batch import BatchSimulation
+from .cache import FitnessCache
+from .environment import Environment, Map
+from .swarm import Swarm
+
+
+def genome_weights(population: List[Swarm]) -> np.ndarray[float]:
+    """Collect the rule weights of a population.
+
+    Arguments:
+        population (List[Swarm]): The swarms.
+
+    Returns:
+        np.ndarray[float]: The rule weights of every swarm, in the order of ```rule.RULES```.
+    """
+    return np.array([[swarm.rules[r].weight for r in rule.RULES] for swarm in population])
+
+
+class Evaluator:
+    """
+    Evaluator interface:
+        Every Evaluator has a samples method that simulates every swarm in a population a number of times,
+        and an evaluate method that calculates the fitness of every swarm from those samples.
+        The submit method starts the simulations of a single swarm and returns a future, for evolutions that do not wait for a whole population.
+        Repetition ```r``` of every swarm is simulated with the seed ```rep_seed(r)```, so every sample can be replayed with ```Swarm.reset```.
+        The seeds do not depend on the generation: every generation is simulated on the same ```reps``` scenarios, so swarms are compared
+        on equal terms and the fitness of a genome can be cached, but the evolution can favour swarms that happen to do well on those scenarios.
+        A family of grids (```scenario.grid_files```) or more ```reps``` widens the scenarios the swarms are selected on.
+
+    """
+    seed: Optional[int] = None
+
+    def rep_seed(self, rep: int) -> np.random.SeedSequence:
+        """The seed of repetition ```rep```, the same for every swarm.
+        """
+        return np.random.SeedSequence(self.seed, spawn_key=(rep,))
+
+    def samples(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> np.ndarray[float]:
+        pass
+
+    def evaluate(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1) -> np.ndarray[float]:
+        """Calculate the fitness of every swarm in a population.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm, averaged over the reps.
+        """
+        return self.samples(population, environment, n_iters, reps).mean(axis=1)
+
+    def submit(self, swarm: Swarm, environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> Future:
+        """Start the simulations of one swarm. Evaluators without workers simulate the swarm right away and return a future that is done.
+
+        Arguments:
+            swarm (Swarm): The swarm to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+            first_rep (int): The index of the first repetition. default = 0.
+
+        Returns:
+            Future: A future of the fitness of the swarm in every repetition (reps,).
+        """
+        future = Future()
+        future.set_result(self.samples([swarm], environment, n_iters, reps, first_rep)[0])
+        return future
+
+
+class SerialEvaluator(Evaluator):
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """Simulate the swarms one after another, in the calling process.
+
+        Arguments:
+            seed (int): The base seed, see ```Evaluator```. default = drawn from ```np.random```.
+        """
+        self.seed = seed if seed is not None else int(np.random.randint(2**31))
+
+    def samples(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> np.ndarray[float]:
+        """Reset every swarm to a copy of ```environment``` with the seed of the repetition and simulate it.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+            first_rep (int): The index of the first repetition, so extra repetitions of a swarm get new seeds. default = 0.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm in every repetition (P, reps).
+        """
+        fitness = np.zeros((len(population), reps))
+        for r in range(reps):
+            for i, swarm in enumerate(population):
+                swarm.reset(environment.copy(), self.rep_seed(first_rep + r))
+                fitness[i, r] = swarm.simulate(n_iters=n_iters)
+        return fitness
+
+
+class BatchEvaluator(Evaluator):
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """Simulate the whole population in lockstep.
+
+        Arguments:
+            seed (int): The base seed, see ```Evaluator```. default = drawn from ```np.random```.
+        """
+        self.seed = seed if seed is not None else int(np.random.randint(2**31))
+
+    def samples(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> np.ndarray[float]:
+        """Simulate every (swarm, repetition) pair at once with a ```BatchSimulation```.
+        All swarms must have the same number of boids.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+            first_rep (int): The index of the first repetition, so extra repetitions of a swarm get new seeds. default = 0.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm in every repetition (P, reps).
+        """
+        weights = np.tile(genome_weights(population), (reps, 1))
+        vision_range = np.tile([swarm.vision_range for swarm in population], reps)
+        max_speed = np.tile([swarm.max_speed for swarm in population], reps)
+        seeds = [self.rep_seed(r) for r in range(first_rep, first_rep + reps) for _ in population]
+        simulation = BatchSimulation(environment, weights, vision_range, max_speed, population[0].nboids, seeds)
+        return simulation.simulate(n_iters).reshape(reps, len(population)).T
+
+
+def simulate_genome(environment_map: Map, weights: np.ndarray[float], vision_range: float, max_speed: float, nboids: int, n_iters: int, seeds: List[np.random.SeedSequence]) -> List[float]:
+    """Simulate one genome on a fresh environment of ```environment_map``` once per seed. Runs inside the worker processes of a ```PoolEvaluator```.
+
+    Arguments:
+        environment_map (Map): The map of the environment, shared with the worker processes.
+        weights (np.ndarray[float]): The rule weights, in the order of ```rule.RULES```.
+        vision_range (float): The vision range of the boids.
+        max_speed (float): The maximum speed of the boids.
+        nboids (int): The number of boids.
+        n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+        seeds (List[np.random.SeedSequence]): The seed of every repetition.
+
+    Returns:
+        List[float]: The fitness of the genome for every seed.
+    """
+    fitness = []
+    for seed in seeds:
+        rules = [r(weight=w) for r, w in zip(rule.RULES, weights)]
+        swarm = Swarm(Environment.of(environment_map), vision_range, max_speed, nboids, rules, seed=seed)
+        fitness.append(swarm.simulate(n_iters=n_iters))
+    return fitness
+
+
+class PoolEvaluator(Evaluator):
+    executor: Optional[ProcessPoolExecutor]
+
+    def __init__(self, max_workers: Optional[int] = None, seed: Optional[int] = None) -> None:
+        """Simulate the swarms in a pool of worker processes. Workers only receive the genomes and the name of the map of the environment,
+        which is moved to shared memory once, and only send back fitness values (and their profile, while profiling, see ```profiling.submit```).
+        The pool is started on first use and stays alive until ```close``` is called, so it can be shared by many generations and ```Evolution```s.
+
+        Arguments:
+            max_workers (int): The number of worker processes, 0 to simulate in the calling process. default = the number of processors.
+            seed (int): The base seed, see ```Evaluator```, so the results do not depend on the number of workers. default = drawn from ```np.random```.
+        """
+        self.max_workers = max_workers
+        self.seed = seed if seed is not None else int(np.random.randint(2**31))
+        self.executor = None
+        self.shared = {}
+
+    def samples(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> np.ndarray[float]:
+        """Simulate every swarm in a worker process.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+            first_rep (int): The index of the first repetition, so extra repetitions of a swarm get new seeds. default = 0.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm in every repetition (P, reps).
+        """
+        seeds = [self.rep_seed(r) for r in range(first_rep, first_rep + reps)]
+        environment_map = environment.snapshot()
+        tasks = [(environment_map, weights, swarm.vision_range, swarm.max_speed, swarm.nboids, n_iters, seeds)
+                 for swarm, weights in zip(population, genome_weights(population))]
+        if self.max_workers == 0:
+            return np.array([simulate_genome(*task) for task in tasks]).reshape(len(population), reps)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.max_workers)
+        # Keep the shared maps alive while workers may attach to them
+        self.shared[id(environment_map)] = environment_map.share()
+        futures = [profiling.submit(self.executor, simulate_genome, *task) for task in tasks]
+        return np.array([future.result() for future in futures]).reshape(len(population), reps)
+
+    def submit(self, swarm: Swarm, environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> Future:
+        """Simulate one swarm in a worker process, see ```Evaluator.submit```. Without workers the swarm is simulated right away.
+        """
+        if self.max_workers == 0:
+            return super().submit(swarm, environment, n_iters, reps, first_rep)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.max_workers)
+        environment_map = environment.snapshot()
+        self.shared[id(environment_map)] = environment_map.share()
+        seeds = [self.rep_seed(r) for r in range(first_rep, first_rep + reps)]
+        return profiling.submit(self.executor, simulate_genome, environment_map, genome_weights([swarm])[0], swarm.vision_range, swarm.max_speed, swarm.nboids, n_iters, seeds)
+
+    def close(self) -> None:
+        """Shut down the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for environment_map in self.shared.values():
+            environment_map.close()
+        self.shared = {}
+
+    def __enter__(self) -> PoolEvaluator:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class RacingEvaluator(Evaluator):
+    evaluator: Evaluator
+    reps: np.ndarray[int]
+    variance: np.ndarray[float]
+    simulations: int
+
+    def __init__(self, evaluator: Optional[Evaluator] = None, initial_reps: int = 2, n_selected: Optional[int] = None, confidence: float = 1.96, budget: Optional[int] = None) -> None:
+        """Adaptive replication: every swarm starts with a few repetitions, and only the swarms whose ranking is still uncertain are repeated further.
+        A swarm is uncertain while the confidence interval of its mean fitness overlaps the boundary between the ```n_selected``` best swarms
+        and the rest. Racing stops when no swarm is uncertain, when the uncertain swarms reached ```reps``` repetitions or when the budget runs out.
+        After every evaluation the repetitions (```reps```) and the fitness variance (```variance```) of every swarm are kept for reporting.
+        Repetition ```r``` is the same scenario for every swarm and every generation (see ```Evaluator```), so the confidence intervals
+        tell swarms apart on those scenarios; they do not bound the fitness of a swarm on scenarios it was not simulated on.
+
+        Arguments:
+            evaluator (Evaluator): The evaluator that simulates the swarms. default = SerialEvaluator().
+            initial_reps (int): The number of repetitions every swarm starts with. default = 2.
+            n_selected (int): The number of best swarms that should be told apart from the rest. default = a quarter of the population.
+            confidence (float): The half-width of the confidence intervals, in standard errors. default = 1.96.
+            budget (int): The maximum number of simulations per evaluation, but at least one per swarm. default = no limit but ```reps``` per swarm.
+        """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.initial_reps = initial_reps
+        self.n_selected = n_selected
+        self.confidence = confidence
+        self.budget = budget
+        self.reps = np.zeros(0, dtype=int)
+        self.variance = np.zeros(0)
+        self.simulations = 0
+
+    @property
+    def seed(self) -> int:
+        return self.evaluator.seed
+
+    def submit(self, swarm: Swarm, environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> Future:
+        """A single swarm is not raced: its ```reps``` repetitions are submitted to the wrapped evaluator, see ```Evaluator.submit```.
+        """
+        return self.evaluator.submit(swarm, environment, n_iters, reps, first_rep)
+
+    def evaluate(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1) -> np.ndarray[float]:
+        """Race the swarms of a population.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The maximum number of times a fire-extinguishing simulation of a swarm is repeated.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm, averaged over its reps.
+        """
+        n = len(population)
+        n_selected = min(self.n_selected if self.n_selected is not None else max(1, n // 4), n)
+        budget = self.budget if self.budget is not None else n * reps
+        # Every swarm is simulated at least once, even when that alone exceeds the budget
+        initial = max(1, min(self.initial_reps, reps, budget // n))
+        samples = [list(row) for row in self.evaluator.samples(population, environment, n_iters, initial)]
+        counts = np.full(n, initial)
+        simulations = n * initial
+        while True:
+            mean = np.array([np.mean(s) for s in samples])
+            error = np.array([np.std(s, ddof=1) / np.sqrt(len(s)) if len(s) > 1 else np.inf for s in samples])
+            lower, upper = mean - self.confidence * error, mean + self.confidence * error
+            ranking = np.argsort(-mean, kind='stable')
+            selected = np.zeros(n, dtype=bool)
+            selected[ranking[:n_selected]] = True
+            if selected.all():
+                break
+            uncertain = np.where(selected, lower <= upper[~selected].max(), upper >= lower[selected].min())
+            racing = np.flatnonzero(uncertain & (counts < reps))
+            racing = racing[np.argsort(counts[racing], kind='stable')][:max(0, budget - simulations)]
+            if racing.size == 0:
+                break
+            for first_rep in np.unique(counts[racing]):
+                group = racing[counts[racing] == first_rep]
+                for i, fitness in zip(group, self.evaluator.samples([population[i] for i in group], environment, n_iters, 1, first_rep=first_rep)):
+                    samples[i].extend(fitness)
+            counts[racing] += 1
+            simulations += racing.size
+        self.reps = counts
+        self.variance = np.array([np.var(s, ddof=1) if len(s) > 1 else np.nan for s in samples])
+        self.simulations = simulations
+        return mean
+
+
+class CachedEvaluator(Evaluator):
+    evaluator: Evaluator
+    cache: FitnessCache
+
+    def __init__(self, evaluator: Optional[Evaluator] = None, cache: Optional[FitnessCache] = None) -> None:
+        """Memoize the simulations of another evaluator. A simulation is identified by the genome (rule weights, vision range, max speed, number of boids),
+        the content of the environment, ```n_iters```, the seed of the evaluator and the repetition index, so children that are exact copies
+        of an earlier genome are not simulated again. Cached repetitions are exact, as every repetition is simulated with its own seed (see ```Evaluator```).
+
+        Arguments:
+            evaluator (Evaluator): The evaluator that simulates the swarms that are not cached. default = SerialEvaluator().
+            cache (FitnessCache): The cache, which can be shared by many evaluators. default = a new in-memory FitnessCache().
+        """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.cache = cache if cache is not None else FitnessCache()
+        self.submitted = []
+
+    @property
+    def seed(self) -> int:
+        return self.evaluator.seed
+
+    def keys(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> List[List[tuple]]:
+        """The cache keys of every (swarm, repetition).
+        """
+        grid = np.ascontiguousarray(environment.grid)
+        context = (hashlib.sha1(grid.tobytes() + str(grid.shape).encode()).hexdigest(), int(n_iters), self.seed)
+        return [[(*map(float, weights), float(swarm.vision_range), float(swarm.max_speed), int(swarm.nboids), *context, r) for r in range(first_rep, first_rep + reps)]
+                for swarm, weights in zip(population, genome_weights(population))]
+
+    def submit(self, swarm: Swarm, environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> Future:
+        """Look up the repetitions of one swarm in the cache and submit the swarm to the wrapped evaluator if any is missing, see ```Evaluator.submit```.
+        The fitness of submitted swarms is stored in the cache by a later call, after their simulations are done.
+        """
+        self.store_submitted()
+        keys = self.keys([swarm], environment, n_iters, reps, first_rep)[0]
+        fitness = np.array([self.cache.get(key) for key in keys], dtype=float)
+        if not np.isnan(fitness).any():
+            future = Future()
+            future.set_result(fitness)
+            return future
+        future = self.evaluator.submit(swarm, environment, n_iters, reps, first_rep)
+        self.submitted.append((keys, future))
+        return future
+
+    def store_submitted(self) -> None:
+        """Store the fitness of the submitted swarms whose simulations are done in the cache.
+        """
+        submitted, self.submitted = self.submitted, []
+        for keys, future in submitted:
+            if not future.done():
+                self.submitted.append((keys, future))
+            elif future.exception() is None:
+                self.cache.put_many(list(zip(keys, map(float, future.result()))))
+
+    def samples(self, population: List[Swarm], environment: Environment, n_iters: int, reps: int = 1, first_rep: int = 0) -> np.ndarray[float]:
+        """Look up every (swarm, repetition) in the cache and simulate the missing ones.
+
+        Arguments:
+            population (List[Swarm]): The swarms to evaluate.
+            environment (Environment): The environment every simulation starts from.
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation should be repeated.
+            first_rep (int): The index of the first repetition. default = 0.
+
+        Returns:
+            np.ndarray[float]: The fitness of every swarm in every repetition (P, reps).
+        """
+        self.store_submitted()
+        keys = self.keys(population, environment, n_iters, reps, first_rep)
+        fitness = np.array([[self.cache.get(key) for key in row] for row in keys], dtype=float)
+
+        # Simulate the missing repetitions, swarms that miss the same range of repetitions together
+        missing = np.isnan(fitness)
+        ranges = {}
+        for i in np.flatnonzero(missing.any(axis=1)):
+            reps_missing = np.flatnonzero(missing[i])
+            ranges.setdefault((reps_missing[0], reps_missing[-1] + 1), []).append(i)
+        for (start, stop), group in ranges.items():
+            fitness[group, start:stop] = self.evaluator.samples([population[i] for i in group], environment, n_iters, stop - start, first_rep=first_rep + start)
+            self.cache.put_many([(keys[i][r], fitness[i, r]) for i in group for r in range(start, stop)])
+        return fitness
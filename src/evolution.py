@@ -1,11 +1,14 @@
 from __future__ import annotations
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from .environment import Environment # you're welcome :D
 
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import os
 import numpy as np
-from .import rule
+from .import checkpoint, rule, seeding
 from .swarm import Swarm 
+from .evaluation import Evaluator, SerialEvaluator
 
 
 class Evolution:
@@ -13,20 +16,42 @@ class Evolution:
     population: List[Swarm]
     environment: Environment
     generation: int
+    evaluator: Evaluator
+    seed: np.random.SeedSequence
+    rng: np.random.Generator
 
-    def __init__(self, environment: Environment, population_size: int, mutate_rate:float):
+    def __init__(self, environment: Environment, population_size: int, mutate_rate:float, evaluator: Optional[Evaluator] = None,
+                 vision_range: float = 4, max_speed: float = 4, nboids: int = 20, seed: seeding.Seed = None):
+        """Genetic algorithm that optimizes the rule weights of a population of swarms.
+        The initial population, selection, crossover and mutation draw from ```rng```, seeded with ```seed```; the simulations are seeded
+        by the evaluator (see ```evaluation.Evaluator```), so every fitness sample can be replayed with ```replay```.
+
+        Arguments:
+            environment (Environment): The environment the swarms are evaluated in.
+            population_size (int): The number of swarms in the population.
+            mutate_rate (float): The probability that a rule of a child is mutated.
+            evaluator (Evaluator): How the fitness of the population is calculated, see ```evaluation```.
+                        default = SerialEvaluator().
+            vision_range (float): The vision range of the boids. default = 4.
+            max_speed (float): The maximum speed of the boids. default = 4.
+            nboids (int): The number of boids in every swarm. default = 20.
+            seed (Seed): The seed of the evolution. default = drawn from ```np.random```.
+        """
         self.population_size = population_size
         self.mutate_rate = mutate_rate
+        self.seed = seeding.sequence(seed)
+        self.rng = np.random.default_rng(self.seed)
+        self.environment = environment
         self.population = []
         for _ in range(population_size):
-            rules = [rule.Alignment(weight=np.random.uniform(-1,1)), 
-                     rule.Cohesion(weight=np.random.uniform(-1,1)), 
-                     rule.Separation(weight=np.random.uniform(-1,1)), 
-                     rule.GoToWater(weight=np.random.uniform(-1,1)), 
-                     rule.GoToFire(weight=np.random.uniform(-1,1))]
-            self.population.append(Swarm(environment.copy(),4,4,20,rules))
-        self.environment = environment
+            rules = [rule.Alignment(weight=self.rng.uniform(-1,1)), 
+                     rule.Cohesion(weight=self.rng.uniform(-1,1)), 
+                     rule.Separation(weight=self.rng.uniform(-1,1)), 
+                     rule.GoToWater(weight=self.rng.uniform(-1,1)), 
+                     rule.GoToFire(weight=self.rng.uniform(-1,1))]
+            self.population.append(self.new_swarm(vision_range,max_speed,nboids,rules))
         self.generation = 0
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
 
     def evolve(self, n_iters: int, reps: int = 1) -> float:
         """Evolve the population by crossing over the best-performing individuals. Individuals that are selected for crossover 
@@ -42,11 +67,11 @@ class Evolution:
         """     
         fitness = self.calculate_fitness(n_iters=n_iters,reps=reps)
         p = (fitness + 1 + abs(fitness.min()))**2
-        candidates = np.random.choice(
-            self.population, p=p/p.sum(), size=(self.population_size, 2), replace=True)
+        candidates = self.rng.choice(
+            len(self.population), p=p/p.sum(), size=(self.population_size, 2), replace=True)
         new_generation = []
         for p1, p2 in candidates:
-            child = self.crossover(p1, p2)
+            child = self.crossover(self.population[p1], self.population[p2])
             self.mutate(child)
             new_generation.append(child)
         self.population = new_generation
@@ -65,12 +90,69 @@ class Evolution:
         Returns:
             float: The fitness level of the population, averaged over the reps.
         """     
-        fitness = np.zeros(self.population_size)    
-        for _ in range(reps):
-            fitness += np.array([swarm.simulate(n_iters=n_iters) for swarm in self.population])
-            for s in self.population:
-                s.reset(self.environment.copy())
-        return  fitness/reps
+        return self.evaluator.evaluate(self.population, self.environment, n_iters=n_iters, reps=reps)
+
+    def new_swarm(self, vision_range: float, max_speed: float, nboids: int, rules: List[rule.Rule], neighbour_search=None) -> Swarm:
+        """Create a swarm on a copy of the environment, seeded from ```rng```.
+        """
+        return Swarm(self.environment.copy(), vision_range, max_speed, nboids, rules, neighbour_search, seed=int(self.rng.integers(2**63)))
+
+    def replay(self, swarm: Swarm, rep: int = 0) -> Swarm:
+        """A new swarm with the genome of ```swarm```, in the initial state of repetition ```rep``` of its evaluation:
+        simulating it for the same ```n_iters``` gives the same fitness as the evaluator (up to rounding for a ```BatchEvaluator```).
+
+        Arguments:
+            swarm (Swarm): A swarm of the population.
+            rep (int): The repetition. default = 0.
+
+        Returns:
+            Swarm: The swarm, seeded with ```evaluator.rep_seed(rep)```.
+        """
+        rules = [type(r)(weight=r.weight) for r in swarm.rules.values()]
+        return Swarm(self.environment.copy(), swarm.vision_range, swarm.max_speed, swarm.nboids, rules, swarm.neighbour_search, seed=self.evaluator.rep_seed(rep))
+
+    def state(self) -> Dict:
+        """The state of the evolution: the generation, the genomes of the population, the seed and the state of ```rng```, as JSON serializable values.
+
+        Returns:
+            Dict: The state, see ```from_state```.
+        """
+        return {
+            "generation": self.generation,
+            "population_size": self.population_size,
+            "mutate_rate": self.mutate_rate,
+            "population": [{"rules": [[type(r).__name__, float(r.weight)] for r in swarm.rules.values()], 
+                            "vision_range": swarm.vision_range, "max_speed": swarm.max_speed, "nboids": swarm.nboids} for swarm in self.population],
+            "seed": seeding.to_state(self.seed),
+            "random": checkpoint.generator_state(self.rng),
+        }
+
+    @classmethod
+    def from_state(cls, environment: Environment, state: Dict, evaluator: Optional[Evaluator] = None) -> Evolution:
+        """Restore an evolution from its ```state```. The swarms are rebuilt from their genomes, with new boids, and ```rng``` continues where it was saved.
+
+        Arguments:
+            environment (Environment): The environment the swarms are evaluated in.
+            state (Dict): The state returned by ```state```.
+            evaluator (Evaluator): How the fitness of the population is calculated. default = SerialEvaluator().
+
+        Returns:
+            Evolution: The evolution.
+        """
+        rule_types = dict((r.__name__, r) for r in rule.RULES)
+        evolution = cls.__new__(cls)
+        evolution.population_size = state["population_size"]
+        evolution.mutate_rate = state["mutate_rate"]
+        evolution.seed = seeding.sequence(seeding.from_state(state.get("seed")))
+        evolution.rng = np.random.default_rng(evolution.seed)
+        evolution.environment = environment
+        evolution.population = [evolution.new_swarm(genome["vision_range"], genome["max_speed"], genome["nboids"], 
+                                                    [rule_types[name](weight=weight) for name, weight in genome["rules"]]) for genome in state["population"]]
+        if "random" in state:
+            checkpoint.set_generator_state(evolution.rng, state["random"])
+        evolution.generation = state["generation"]
+        evolution.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        return evolution
 
     def crossover(self, parent1: Swarm, parent2: Swarm) -> Swarm:
         """Perform crossover by combining the rules from two parent individuals. 
@@ -83,9 +165,9 @@ class Evolution:
         Returns:
             Swarm: The child that results from the crossover. 
         """     
-        rule_types = parent1.rules.keys() | parent2.rules.keys()
-        new_rules = [rule.crossover(parent1.rules[rule], parent2.rules[rule]) for rule in rule_types]
-        return Swarm(self.environment.copy(), parent1.vision_range, parent2.vision_range, parent1.boids.size, new_rules)
+        rule_types = dict.fromkeys([*parent1.rules.keys(), *parent2.rules.keys()])
+        new_rules = [rule.crossover(parent1.rules[rule], parent2.rules[rule], self.rng) for rule in rule_types]
+        return self.new_swarm(parent1.vision_range, parent1.max_speed, parent1.nboids, new_rules, parent1.neighbour_search)
 
     def mutate(self, child: Swarm) -> None:
         """Mutate the individual by mutating one of its swarming rules.
@@ -98,5 +180,128 @@ class Evolution:
             Swarm: The mutated swarm. 
         """     
         for rule in child.rules.keys():
-            if np.random.random()<=self.mutate_rate: 
-                child.rules[rule].mutate()
+            if self.rng.random()<=self.mutate_rate: 
+                child.rules[rule].mutate(self.rng)
+
+
+class SteadyStateEvolution(Evolution):
+    in_flight: int
+    tournament_size: int
+    fitness: np.ndarray[float]
+    reps: np.ndarray[int]
+    variance: np.ndarray[float]
+    evaluations: int
+
+    def __init__(self, environment: Environment, population_size: int, mutate_rate:float, evaluator: Optional[Evaluator] = None,
+                 vision_range: float = 4, max_speed: float = 4, nboids: int = 20, seed: seeding.Seed = None, in_flight: Optional[int] = None, tournament_size: int = 2):
+        """Asynchronous steady-state variant of ```Evolution```: there is no barrier between generations. ```in_flight``` swarms are evaluated at all times
+        (with ```Evaluator.submit```); every evaluation that completes is fed to the population right away and a new child is submitted in its place.
+        Parents are chosen by tournament among the evaluated swarms, and a child replaces the worst swarm of the population if it is at least as fit.
+        Every ```population_size``` completed evaluations count as one generation, so ```evolve``` and the results keep their generational form.
+        With a pool of workers the result depends on the order in which the evaluations complete.
+
+        Arguments:
+            environment (Environment): The environment the swarms are evaluated in.
+            population_size (int): The number of swarms in the population.
+            mutate_rate (float): The probability that a rule of a child is mutated.
+            evaluator (Evaluator): How the fitness of a swarm is calculated, e.g. a ```PoolEvaluator```. default = SerialEvaluator().
+            vision_range (float): The vision range of the boids. default = 4.
+            max_speed (float): The maximum speed of the boids. default = 4.
+            nboids (int): The number of boids in every swarm. default = 20.
+            seed (Seed): The seed of the evolution. default = drawn from ```np.random```.
+            in_flight (int): The number of evaluations that run at the same time. default = the number of processors.
+            tournament_size (int): The number of evaluated swarms that compete to be a parent. default = 2.
+        """
+        super().__init__(environment, population_size, mutate_rate, evaluator, vision_range, max_speed, nboids, seed)
+        self.in_flight = in_flight if in_flight is not None else (os.cpu_count() or 1)
+        self.tournament_size = tournament_size
+        self.fitness = np.full(population_size, np.nan)
+        self.reps = np.zeros(population_size, dtype=int)
+        self.variance = np.full(population_size, np.nan)
+        self.evaluations = 0
+        self.submitted = 0
+        self.pending = {}
+
+    def evolve(self, n_iters: int, reps: int = 1) -> np.ndarray[float]:
+        """Run the evolution for one generation: until ```population_size``` more evaluations completed (and, the first time, every swarm of the
+        initial population is evaluated). Evaluations that are still running carry over to the next generation.
+
+        Arguments:
+            n_iters (int): The number of times a fire-extinguishing simulation should iterate to calculate the fitness.
+            reps (int): The number of times a fire-extinguishing simulation of every swarm is repeated. default = 1.
+
+        Returns:
+            np.ndarray[float]: The fitness of the swarms of the population.
+        """
+        target = self.evaluations + self.population_size
+        while self.evaluations < target or np.isnan(self.fitness).any():
+            self.fill(n_iters, reps)
+            done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+            # Completed evaluations are handled in the order they were submitted
+            for future in [f for f in self.pending if f in done]:
+                self.complete(future)
+                if self.evaluations >= target and not np.isnan(self.fitness).any():
+                    break
+        self.generation += 1
+        return self.fitness.copy()
+
+    def fill(self, n_iters: int, reps: int) -> None:
+        """Submit swarms until ```in_flight``` evaluations are running: first the swarms of the initial population, then children.
+        """
+        while len(self.pending) < self.in_flight:
+            if self.submitted < self.population_size:
+                index, swarm = self.submitted, self.population[self.submitted]
+            elif not np.isnan(self.fitness).all():
+                index = None
+                swarm = self.crossover(self.tournament(), self.tournament())
+                self.mutate(swarm)
+            else:
+                return
+            self.pending[self.evaluator.submit(swarm, self.environment, n_iters, reps)] = (index, swarm)
+            self.submitted += 1
+
+    def complete(self, future: Future) -> None:
+        """Feed a completed evaluation to the population: a swarm of the initial population gets its fitness,
+        a child replaces the worst evaluated swarm if it is at least as fit.
+        """
+        index, swarm = self.pending.pop(future)
+        samples = np.asarray(future.result(), dtype=float)
+        self.evaluations += 1
+        if index is None:
+            evaluated = np.flatnonzero(~np.isnan(self.fitness))
+            index = evaluated[np.argmin(self.fitness[evaluated])]
+            if samples.mean() < self.fitness[index]:
+                return
+            self.population[index] = swarm
+        self.fitness[index] = samples.mean()
+        self.reps[index] = samples.size
+        self.variance[index] = np.var(samples, ddof=1) if samples.size > 1 else np.nan
+
+    def tournament(self) -> Swarm:
+        """Select a parent: the fittest of ```tournament_size``` evaluated swarms, drawn at random.
+        """
+        evaluated = np.flatnonzero(~np.isnan(self.fitness))
+        contestants = self.rng.choice(evaluated, size=min(self.tournament_size, evaluated.size), replace=False)
+        return self.population[contestants[np.argmax(self.fitness[contestants])]]
+
+    def state(self) -> Dict:
+        """The state of the evolution after ```evolve```, see ```Evolution.state```, with the fitness of the population.
+        Evaluations that are still running are not part of the state, a restored evolution submits new children instead.
+        """
+        return dict(super().state(), in_flight=self.in_flight, tournament_size=self.tournament_size, evaluations=self.evaluations,
+                    fitness=self.fitness.tolist(), reps=self.reps.tolist(), variance=self.variance.tolist())
+
+    @classmethod
+    def from_state(cls, environment: Environment, state: Dict, evaluator: Optional[Evaluator] = None) -> SteadyStateEvolution:
+        """Restore an evolution from its ```state```, see ```Evolution.from_state```.
+        """
+        evolution = super().from_state(environment, state, evaluator)
+        evolution.in_flight = state["in_flight"]
+        evolution.tournament_size = state["tournament_size"]
+        evolution.evaluations = state["evaluations"]
+        evolution.fitness = np.array(state["fitness"], dtype=float)
+        evolution.reps = np.array(state["reps"], dtype=int)
+        evolution.variance = np.array(state["variance"], dtype=float)
+        evolution.submitted = evolution.population_size
+        evolution.pending = {}
+        return evolution
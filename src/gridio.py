@@ -0,0 +1,122 @@
+from typing import Tuple
+from collections import OrderedDict
+import os
+import struct
+import numpy as np
+
+from .state import State
+
+# Binary grid format (little-endian):
+#   header:  magic (8 bytes), nrows (uint32), ncols (uint32), n_fires (int64), n_water (int64)
+#   payload: the grid as int8 (nrows * ncols), padded to a multiple of 8 bytes,
+#            followed by the flat indices of the water tiles as int64 (n_water)
+MAGIC = b"NCGRID01"
+HEADER = struct.Struct("<8sIIqq")
+BINARY_SUFFIX = ".grid"
+
+# Parsed text grids of the CACHE_SIZE most recently loaded files
+CACHE_SIZE = 8
+_cache: 'OrderedDict[Tuple[str, int, int], Tuple[np.ndarray, int, np.ndarray]]' = OrderedDict()
+
+
+def is_binary(file_path: str) -> bool:
+    """Whether ```file_path``` refers to a grid in the binary format.
+    """
+    return os.path.splitext(file_path)[1] == BINARY_SUFFIX
+
+
+def load_grid(file_path: str) -> Tuple[np.ndarray[np.int8], int, np.ndarray[np.int64]]:
+    """Load a grid from a text (.in) or binary (.grid) file. Text files are parsed once per process, later loads of an unchanged file are served from a cache
+    of the ```CACHE_SIZE``` most recently loaded files.
+
+    Arguments:
+        file_path (str): The path to the file.
+
+    Returns:
+        Tuple[np.ndarray[np.int8], int, np.ndarray[np.int64]]: A private, writable grid, its number of burning tiles and the flat indices of its water tiles.
+            Binary grids are memory-mapped copy-on-write, so only the pages that are written to are copied, and their water index is read from the file.
+    """
+    if is_binary(file_path):
+        return read_binary(file_path)
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if key in _cache:
+        _cache.move_to_end(key)
+    else:
+        grid = read_text(file_path)
+        grid.flags.writeable = False
+        _cache[key] = (grid, int(np.count_nonzero(grid == State.FIRE.value)), np.flatnonzero(grid == State.WATER.value))
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    grid, n_fires, water = _cache[key]
+    return grid.copy(), n_fires, water
+
+
+def read_text(file_path: str) -> np.ndarray[np.int8]:
+    """Parse a grid in the text format: a "nrows ncols" header followed by one line of digits per row.
+
+    Arguments:
+        file_path (str): The path to the .in file.
+
+    Returns:
+        np.ndarray[np.int8]: The grid.
+    """
+    with open(file_path, 'rb') as file:
+        nrows, ncols = [int(s) for s in file.readline().split()]
+        lines = file.read().split(b'\n')[:nrows]
+    cells = np.frombuffer(b''.join(line[:ncols] for line in lines), dtype=np.uint8)
+    return (cells - ord('0')).astype(np.int8).reshape(nrows, ncols)
+
+
+def write_text(file_path: str, grid: np.ndarray[np.int8]) -> None:
+    """Write a grid in the text format.
+
+    Arguments:
+        file_path (str): The path to the .in file.
+        grid (np.ndarray[np.int8]): The grid.
+    """
+    digits = (np.asarray(grid, dtype=np.uint8) + ord('0'))
+    rows = np.concatenate([digits, np.full((grid.shape[0], 1), ord('\n'), dtype=np.uint8)], axis=1)
+    with open(file_path, 'wb') as file:
+        file.write(f"{grid.shape[0]} {grid.shape[1]}\n".encode())
+        file.write(rows.tobytes())
+
+
+def _payload_size(nrows: int, ncols: int) -> int:
+    return -(-nrows * ncols // 8) * 8
+
+
+def write_binary(file_path: str, grid: np.ndarray[np.int8]) -> None:
+    """Write a grid in the binary format, including its number of fires and the index of its water tiles.
+
+    Arguments:
+        file_path (str): The path to the .grid file.
+        grid (np.ndarray[np.int8]): The grid.
+    """
+    grid = np.ascontiguousarray(grid, dtype=np.int8)
+    water = np.flatnonzero(grid == State.WATER.value).astype('<i8')
+    n_fires = int(np.count_nonzero(grid == State.FIRE.value))
+    with open(file_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, grid.shape[0], grid.shape[1], n_fires, water.size))
+        file.write(grid.tobytes())
+        file.write(bytes(_payload_size(*grid.shape) - grid.size))
+        file.write(water.tobytes())
+
+
+def read_binary(file_path: str, mode: str = 'c') -> Tuple[np.ndarray[np.int8], int, np.ndarray[np.int64]]:
+    """Memory-map a grid in the binary format.
+
+    Arguments:
+        file_path (str): The path to the .grid file.
+        mode (str): The memory-map mode, 'c' (copy-on-write) or 'r' (read-only). default = 'c'.
+
+    Returns:
+        Tuple[np.ndarray[np.int8], int, np.ndarray[np.int64]]: The grid, its number of burning tiles and the flat indices of its water tiles.
+    """
+    with open(file_path, 'rb') as file:
+        magic, nrows, ncols, n_fires, n_water = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{file_path} is not a binary grid file")
+    grid = np.memmap(file_path, dtype=np.int8, mode=mode, offset=HEADER.size, shape=(nrows, ncols))
+    water = np.memmap(file_path, dtype='<i8', mode='r', offset=HEADER.size + _payload_size(nrows, ncols), shape=(n_water,)) if n_water > 0 else np.empty(0, dtype=np.int64)
+    return grid, n_fires, water
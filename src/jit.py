@@ -0,0 +1,301 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Tuple
+if TYPE_CHECKING:
+    from .swarm import Swarm
+
+import math
+import numpy as np
+
+from . import rule
+from .state import State
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+BARREN, FIRE, WATER, TREE = State.BARREN.value, State.FIRE.value, State.WATER.value, State.TREE.value
+
+# Rule ids used by the kernels, in the order of ```rule.RULES```
+ALIGNMENT, COHESION, SEPARATION, GO_TO_WATER, GO_TO_FIRE = range(5)
+RULE_IDS = dict((r, i) for i, r in enumerate(rule.RULES))
+
+
+def supports(swarm: Swarm) -> bool:
+    """Whether the compiled kernels can simulate ```swarm```: numba must be installed, the swarm may only use the rules of ```rule.RULES```
+    and its environment must use the dense fire spread.
+
+    Arguments:
+        swarm (Swarm): The swarm.
+
+    Returns:
+        bool: True if the swarm can be simulated with the kernels.
+    """
+    return NUMBA_AVAILABLE and all(type(r) in RULE_IDS for r in swarm.rules.values()) and swarm.env.fire_front is None
+
+
+def _arguments(swarm: Swarm) -> Tuple:
+    """The arrays and parameters of a swarm and its environment, as passed to the kernels. The kernels keep the fire index of the environment up to date.
+    """
+    env = swarm.env
+    rule_ids = np.array([RULE_IDS[type(r)] for r in swarm.rules.values()], dtype=np.int64)
+    weights = np.array([r.weight for r in swarm.rules.values()], dtype=np.float64)
+    return (swarm.positions, swarm.velocities, swarm.carrying_water, swarm.out_of_bounds_timer, env.grid, rule_ids, weights,
+            float(swarm.vision_range), float(swarm.max_speed), float(swarm.pickup_chance), env.water_field.indices, env.water_field.distances, env.water_field.has_water,
+            env.fire_index.mask, env.fire_index.blocks, env.fire_index.block_size)
+
+
+def update(swarm: Swarm) -> None:
+    """Update the swarm and its environment by one step with the compiled kernel. Gives the same result as ```Swarm.update```:
+    the kernel draws from the generators of the swarm (boid pickups) and of the environment (fire spread) in the same order.
+
+    Arguments:
+        swarm (Swarm): The swarm.
+    """
+    env = swarm.env
+    env.own()
+    n_fires = int(_step(*_arguments(swarm), int(env.n_fires), swarm.rng, env.rng))
+    env.fire_index.count += n_fires - env.n_fires
+    env.n_fires = n_fires
+
+
+def simulate(swarm: Swarm, n_iters: int) -> int:
+    """Run ```Swarm.simulate``` in the compiled kernel: the whole loop runs without returning to Python and exits as soon as the fire is out.
+    The generators of the swarm and of the environment are passed to the kernel, so they end up in the same state as after the reference loop.
+
+    Arguments:
+        swarm (Swarm): The swarm.
+        n_iters (int): The maximum number of steps.
+
+    Returns:
+        int: The fitness, as computed by ```Swarm.simulate```.
+    """
+    env = swarm.env
+    env.own()
+    used, n_fires = _simulate(*_arguments(swarm), int(env.n_fires), int(n_iters), swarm.rng, env.rng)
+    env.fire_index.count += int(n_fires) - env.n_fires
+    env.n_fires = int(n_fires)
+    if env.n_fires <= 0:
+        return (n_iters - (used - 1)) + env.calculate_fitness()
+    return env.calculate_fitness()
+
+
+@njit(cache=True)
+def _normalize(x: float, y: float) -> Tuple[float, float]:
+    norm = math.sqrt(x*x + y*y)
+    if norm > 0:
+        return x / norm, y / norm
+    return x, y
+
+
+@njit(cache=True)
+def _simulate(positions, velocities, carrying, timer, grid, rule_ids, weights, vision_range, max_speed, pickup_chance, water_cells, water_distances, has_water, fire_mask, fire_blocks, block_size, n_fires, n_iters, boid_rng, fire_rng):
+    for iter in range(n_iters):
+        n_fires = _step(positions, velocities, carrying, timer, grid, rule_ids, weights, vision_range, max_speed, pickup_chance, water_cells, water_distances, has_water, fire_mask, fire_blocks, block_size, n_fires, boid_rng, fire_rng)
+        if n_fires <= 0:
+            return iter + 1, n_fires
+    return n_iters, n_fires
+
+
+@njit(cache=True)
+def _step(positions, velocities, carrying, timer, grid, rule_ids, weights, vision_range, max_speed, pickup_chance, water_cells, water_distances, has_water, fire_mask, fire_blocks, block_size, n_fires, boid_rng, fire_rng):
+    n = positions.shape[0]
+    rows, cols = grid.shape
+    forces = np.zeros((n, 5, 2))
+
+    # Neighbours, sorted by distance
+    neighbours = np.empty(n, dtype=np.int64)
+    distances = np.empty(n)
+    for i in range(n):
+        count = 0
+        for j in range(n):
+            if j == i:
+                continue
+            dx = positions[j, 0] - positions[i, 0]
+            dy = positions[j, 1] - positions[i, 1]
+            d = math.sqrt(dx*dx + dy*dy)
+            if d <= vision_range:
+                k = count
+                while k > 0 and distances[k - 1] > d:
+                    distances[k] = distances[k - 1]
+                    neighbours[k] = neighbours[k - 1]
+                    k -= 1
+                distances[k] = d
+                neighbours[k] = j
+                count += 1
+
+        # Alignment, Cohesion & Separation
+        if count > 0:
+            vx = 0.0
+            vy = 0.0
+            px = 0.0
+            py = 0.0
+            for k in range(count):
+                vx += velocities[neighbours[k], 0]
+                vy += velocities[neighbours[k], 1]
+                px += positions[neighbours[k], 0]
+                py += positions[neighbours[k], 1]
+            forces[i, ALIGNMENT, 0] = vx / count
+            forces[i, ALIGNMENT, 1] = vy / count
+            forces[i, COHESION, 0], forces[i, COHESION, 1] = _normalize(px / count - positions[i, 0], py / count - positions[i, 1])
+            nearest = neighbours[0]
+            forces[i, SEPARATION, 0], forces[i, SEPARATION, 1] = _normalize(positions[i, 0] - positions[nearest, 0], positions[i, 1] - positions[nearest, 1])
+
+        # GoToWater
+        if not carrying[i] and has_water:
+            base_x = math.floor(positions[i, 0])
+            base_y = math.floor(positions[i, 1])
+            best = np.inf
+            tx = 0.0
+            ty = 0.0
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    cx = min(max(base_x + di, 0), rows - 1)
+                    cy = min(max(base_y + dj, 0), cols - 1)
+                    wx = water_cells[cx, cy, 0] + 0.5
+                    wy = water_cells[cx, cy, 1] + 0.5
+                    dx = wx - positions[i, 0]
+                    dy = wy - positions[i, 1]
+                    d = math.sqrt(dx*dx + dy*dy)
+                    if d < best:
+                        best = d
+                        tx = wx
+                        ty = wy
+            found = best <= vision_range
+
+            # As in ```WaterField.nearest```: search exactly unless no other water tile can be closer than the closest candidate
+            fraction_x = positions[i, 0] - base_x
+            fraction_y = positions[i, 1] - base_y
+            bound = min(min(1.5 + fraction_x, 2.5 - fraction_x), min(1.5 + fraction_y, 2.5 - fraction_y))
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    cx = min(max(base_x + di, 0), rows - 1)
+                    cy = min(max(base_y + dj, 0), cols - 1)
+                    dx = cx + 0.5 - positions[i, 0]
+                    dy = cy + 0.5 - positions[i, 1]
+                    bound = max(bound, water_distances[cx, cy] - math.sqrt(dx*dx + dy*dy))
+            if best > bound - 1e-9 and bound <= vision_range:
+                search = min(vision_range, best + 1e-6)
+                r = int(math.ceil(search))
+                best = np.inf
+                for cx in range(base_x - r, base_x + r + 2):
+                    for cy in range(base_y - r, base_y + r + 2):
+                        if cx < 0 or cx >= rows or cy < 0 or cy >= cols or water_distances[cx, cy] != 0:
+                            continue
+                        dx = cx + 0.5 - positions[i, 0]
+                        dy = cy + 0.5 - positions[i, 1]
+                        d = dx*dx + dy*dy
+                        if d <= search*search and d < best:
+                            best = d
+                            tx = cx + 0.5
+                            ty = cy + 0.5
+                found = best < np.inf
+            if found:
+                forces[i, GO_TO_WATER, 0], forces[i, GO_TO_WATER, 1] = _normalize(tx - positions[i, 0], ty - positions[i, 1])
+
+        # GoToFire
+        if carrying[i] and n_fires > 0:
+            r = int(math.ceil(vision_range))
+            base_x = math.floor(positions[i, 0])
+            base_y = math.floor(positions[i, 1])
+            best = np.inf
+            tx = 0.0
+            ty = 0.0
+            for cx in range(base_x - r, base_x + r + 2):
+                for cy in range(base_y - r, base_y + r + 2):
+                    if cx < 0 or cx >= rows or cy < 0 or cy >= cols or grid[cx, cy] != FIRE:
+                        continue
+                    dx = cx + 0.5 - positions[i, 0]
+                    dy = cy + 0.5 - positions[i, 1]
+                    d = dx*dx + dy*dy
+                    if d <= vision_range*vision_range and d < best:
+                        best = d
+                        tx = cx + 0.5
+                        ty = cy + 0.5
+            if best < np.inf:
+                forces[i, GO_TO_FIRE, 0], forces[i, GO_TO_FIRE, 1] = _normalize(tx - positions[i, 0], ty - positions[i, 1])
+
+    # Apply the forces, clamp the speed, move and handle the borders
+    active = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        fx = 0.0
+        fy = 0.0
+        for k in range(rule_ids.size):
+            fx += weights[k] * forces[i, rule_ids[k], 0]
+            fy += weights[k] * forces[i, rule_ids[k], 1]
+        velocities[i, 0] += fx
+        velocities[i, 1] += fy
+        speed = math.sqrt(velocities[i, 0]*velocities[i, 0] + velocities[i, 1]*velocities[i, 1])
+        if speed > max_speed:
+            velocities[i, 0] *= max_speed / speed
+            velocities[i, 1] *= max_speed / speed
+        positions[i, 0] += velocities[i, 0] * 0.1
+        positions[i, 1] += velocities[i, 1] * 0.1
+
+        horizontal = positions[i, 0] > rows or positions[i, 0] < 0
+        vertical = positions[i, 1] > cols or positions[i, 1] < 0
+        active[i] = not (horizontal or vertical)
+        if not active[i]:
+            if timer[i] > 5:
+                velocities[i, 0] = 1 if positions[i, 0] < rows / 2 else -1
+                velocities[i, 1] = 1 if positions[i, 1] < cols / 2 else -1
+            else:
+                if horizontal:
+                    velocities[i, 0] *= -1
+                else:
+                    velocities[i, 1] *= -1
+                timer[i] += 1
+            positions[i, 0] += velocities[i, 0] * 0.2
+            positions[i, 1] += velocities[i, 1] * 0.2
+        else:
+            timer[i] = 0
+
+    # Interact with the grid: states are read before any fire is extinguished, every boid draws for a pickup
+    states = np.empty(n, dtype=np.int8)
+    draws = np.empty(n)
+    for i in range(n):
+        draws[i] = boid_rng.random()
+        states[i] = grid[min(max(int(positions[i, 0]), 0), rows - 1), min(max(int(positions[i, 1]), 0), cols - 1)]
+    for i in range(n):
+        if not active[i]:
+            continue
+        cx = min(max(int(positions[i, 0]), 0), rows - 1)
+        cy = min(max(int(positions[i, 1]), 0), cols - 1)
+        if carrying[i] and states[i] == FIRE and grid[cx, cy] == FIRE:
+            grid[cx, cy] = BARREN
+            fire_mask[cx, cy] = False
+            fire_blocks[cx // block_size, cy // block_size] -= 1
+            n_fires -= 1
+            carrying[i] = False
+        if not carrying[i] and draws[i] < pickup_chance and states[i] == WATER:
+            carrying[i] = True
+
+    # Fire spread, only trees next to a fire draw
+    ignited = np.zeros(grid.shape, dtype=np.bool_)
+    for cx in range(rows):
+        for cy in range(cols):
+            if grid[cx, cy] != TREE:
+                continue
+            p = 0.0
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    x = cx + di
+                    y = cy + dj
+                    if x >= 0 and x < rows and y >= 0 and y < cols and grid[x, y] == FIRE:
+                        p += (4 if di == 0 or dj == 0 else 1) * 0.002
+            if p > 0 and p > fire_rng.random():
+                ignited[cx, cy] = True
+    for cx in range(rows):
+        for cy in range(cols):
+            if ignited[cx, cy]:
+                grid[cx, cy] = FIRE
+                fire_mask[cx, cy] = True
+                fire_blocks[cx // block_size, cy // block_size] += 1
+                n_fires += 1
+    return n_fires
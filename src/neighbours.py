@@ -0,0 +1,199 @@
+from __future__ import annotations
+import numpy as np
+
+
+class Neighbours:
+    """
+    Flattened (CSR) neighbour lists of a swarm:
+        The neighbours of boid ```i``` are ```indices[offsets[i]:offsets[i+1]]```, sorted by distance and without ```i``` itself.
+
+    """
+    offsets:np.ndarray[int]
+    indices:np.ndarray[int]
+    distances:np.ndarray[float]
+    rows:np.ndarray[int]
+
+    def __init__(self, offsets: np.ndarray[int], indices: np.ndarray[int], distances: np.ndarray[float]) -> None:
+        """Create the neighbour lists from their CSR representation.
+
+        Arguments:
+            offsets (np.ndarray[int]): The start of the neighbours of every boid in ```indices```, followed by the total number of neighbours.
+            indices (np.ndarray[int]): The indices of the neighbours of all boids.
+            distances (np.ndarray[float]): The distance from every boid to each of its neighbours.
+        """
+        self.offsets = offsets
+        self.indices = indices
+        self.distances = distances
+        self.rows = np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+
+    @classmethod
+    def from_query(cls, neighbours_idx: np.ndarray[np.ndarray], distances: np.ndarray[np.ndarray]) -> Neighbours:
+        """Flatten the ragged result of ```KDTree.query_radius``` and remove every boid from its own neighbours.
+
+        Arguments:
+            neighbours_idx (np.ndarray[np.ndarray]): The neighbour indices per boid.
+            distances (np.ndarray[np.ndarray]): The neighbour distances per boid.
+
+        Returns:
+            Neighbours: The neighbour lists.
+        """
+        n = len(neighbours_idx)
+        counts = np.fromiter(map(len, neighbours_idx), dtype=int, count=n)
+        rows = np.repeat(np.arange(n), counts)
+        indices = np.concatenate(neighbours_idx) if n > 0 else np.empty(0, dtype=int)
+        distances = np.concatenate(distances) if n > 0 else np.empty(0)
+        not_self = indices != rows
+        counts = np.bincount(rows[not_self], minlength=n)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(offsets, indices[not_self], distances[not_self])
+
+    def counts(self) -> np.ndarray[int]:
+        """The number of neighbours of every boid.
+
+        Returns:
+            np.ndarray[int]: The number of neighbours per boid.
+        """
+        return np.diff(self.offsets)
+
+    def sum(self, values: np.ndarray[float]) -> np.ndarray[float]:
+        """Sum ```values``` over the neighbours of every boid.
+
+        Arguments:
+            values (np.ndarray[float]): An array with one row per boid.
+
+        Returns:
+            np.ndarray[float]: The sum of the rows of the neighbours, zero for boids without neighbours.
+        """
+        n = self.offsets.size - 1
+        neighbour_values = values[self.indices]
+        return np.stack([np.bincount(self.rows, weights=neighbour_values[:, k], minlength=n) for k in range(values.shape[1])], axis=1).astype(float, copy=False)
+
+    def mean(self, values: np.ndarray[float]) -> np.ndarray[float]:
+        """Average ```values``` over the neighbours of every boid.
+
+        Arguments:
+            values (np.ndarray[float]): An array with one row per boid.
+
+        Returns:
+            np.ndarray[float]: The mean of the rows of the neighbours, zero for boids without neighbours.
+        """
+        counts = self.counts()[:, np.newaxis]
+        total = self.sum(values)
+        return np.divide(total, counts, where=counts > 0, out=total)
+
+    def nearest(self) -> np.ndarray[int]:
+        """The closest neighbour of every boid.
+
+        Returns:
+            np.ndarray[int]: The index of the closest neighbour per boid, -1 for boids without neighbours.
+        """
+        nearest = np.full(self.offsets.size - 1, -1)
+        has_neighbours = self.counts() > 0
+        nearest[has_neighbours] = self.indices[self.offsets[:-1][has_neighbours]]
+        return nearest
+
+
+class NeighbourSearch:
+    """
+    Neighbour search interface:
+        Every NeighbourSearch is built on the positions of a swarm and answers fixed-radius queries on them with ```Neighbours```
+
+    """
+
+    def build(self, positions: np.ndarray[float]) -> None:
+        pass
+
+    def query(self, positions: np.ndarray[float], radius: float) -> Neighbours:
+        pass
+
+
+class KDTreeSearch(NeighbourSearch):
+
+    def build(self, positions: np.ndarray[float]) -> None:
+        """Construct a KDTree for the boid positions.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions of the boids.
+        """
+        from sklearn.neighbors import KDTree
+        self.kdtree = KDTree(positions)
+
+    def query(self, positions: np.ndarray[float], radius: float) -> Neighbours:
+        """Find the neighbours within ```radius``` of every boid.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions the search was built on.
+            radius (float): The search radius.
+
+        Returns:
+            Neighbours: The neighbour lists of the boids, sorted by distance.
+        """
+        neighbours_idx, distances = self.kdtree.query_radius(positions, r=radius, return_distance=True, sort_results=True)
+        return Neighbours.from_query(neighbours_idx, distances)
+
+
+class SpatialHash(NeighbourSearch):
+    cell_size:float
+
+    def __init__(self, cell_size: float) -> None:
+        """Uniform grid (cell list) over the boids. With a cell size equal to the search radius only the 3x3 cells around a boid have to be searched,
+        so building and querying are linear in the number of boids.
+
+        Arguments:
+            cell_size (float): The size of the cells, normally the vision range of the swarm.
+        """
+        self.cell_size = cell_size
+
+    def build(self, positions: np.ndarray[float]) -> None:
+        """Sort the boids by cell.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions of the boids.
+        """
+        self.positions = positions
+        cells = np.floor(positions / self.cell_size).astype(np.int64)
+        self.origin = cells.min(axis=0, initial=0)
+        self.shape = cells.max(axis=0, initial=0) - self.origin + 1
+        keys = self._keys(cells - self.origin)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    def _keys(self, cells: np.ndarray[int]) -> np.ndarray[int]:
+        return cells[..., 0] * self.shape[1] + cells[..., 1]
+
+    def query(self, positions: np.ndarray[float], radius: float) -> Neighbours:
+        """Find the neighbours within ```radius``` of every boid, giving the same neighbour sets as ```KDTreeSearch```.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions the search was built on.
+            radius (float): The search radius.
+
+        Returns:
+            Neighbours: The neighbour lists of the boids, sorted by distance.
+        """
+        n = positions.shape[0]
+        if self.keys.size == 0:
+            return Neighbours(np.zeros(n + 1, dtype=int), np.empty(0, dtype=int), np.empty(0))
+        span = int(np.ceil(radius / self.cell_size))
+        window = np.array([[i, j] for i in range(-span, span + 1) for j in range(-span, span + 1)])
+        cells = np.floor(positions / self.cell_size).astype(np.int64)[:, np.newaxis, :] - self.origin + window
+        inside = np.all((cells >= 0) & (cells < self.shape), axis=-1)
+        keys = np.where(inside, self._keys(cells), -1).ravel()
+
+        # Look up the occupied cells of every boid's window
+        slot = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        counts = np.where(self.keys[slot] == keys, self.counts[slot], 0)
+        starts = self.starts[slot]
+
+        # Expand every (boid, cell) pair to the boids in that cell
+        total = counts.sum()
+        rows = np.repeat(np.repeat(np.arange(n), window.shape[0]), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = self.order[np.repeat(starts, counts) + within]
+        distances = np.linalg.norm(self.positions[candidates] - positions[rows], axis=1)
+        keep = (distances <= radius) & (candidates != rows)
+        rows, candidates, distances = rows[keep], candidates[keep], distances[keep]
+
+        order = np.lexsort((distances, rows))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))])
+        return Neighbours(offsets, candidates[order], distances[order])
@@ -0,0 +1,160 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Tuple
+from collections import defaultdict
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager, nullcontext
+import time
+
+
+class NullProfiler:
+    """
+    Profiler interface:
+        Every profiler has a phase method that times a block of code and a count method that adds to a counter.
+        The NullProfiler ignores both and is the default of ```Swarm``` and ```Environment```, so instrumentation is close to free when it is disabled.
+
+    """
+    enabled: bool = False
+    _null = nullcontext()
+
+    def phase(self, name: str):
+        return self._null
+
+    def count(self, name: str, value: float = 1) -> None:
+        pass
+
+
+class Profiler(NullProfiler):
+    """
+    Per-phase wall time and call counts, and counters:
+        Enable it for all swarms and environments with ```Swarm.profiler = Environment.profiler = Profiler()```, or per object.
+        A profiler accumulates until ```reset```, so one profiler aggregates a whole ```Evolution``` run; profilers of other processes can be ```merge```d,
+        the ```PoolEvaluator``` and the ```Campaign``` merge those of their worker processes with ```submit```.
+
+    """
+    enabled: bool = True
+    times: Dict[str, float]
+    calls: Dict[str, int]
+    counters: Dict[str, float]
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all phases and counters.
+        """
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of code: ```with profiler.phase("name"): ...```.
+
+        Arguments:
+            name (str): The name of the phase, phases of the same name are added up.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Add ```value``` to a counter.
+
+        Arguments:
+            name (str): The name of the counter.
+            value (float): The amount to add. default = 1.
+        """
+        self.counters[name] += value
+
+    def merge(self, other: Profiler) -> None:
+        """Add the phases and counters of another profiler, e.g. one of a worker process.
+
+        Arguments:
+            other (Profiler): The other profiler.
+        """
+        for name, value in other.times.items():
+            self.times[name] += value
+        for name, value in other.calls.items():
+            self.calls[name] += value
+        for name, value in other.counters.items():
+            self.counters[name] += value
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """The phases and counters as plain dictionaries.
+
+        Returns:
+            Dict[str, Dict[str, float]]: "times" and "calls" per phase, and "counters".
+        """
+        return {"times": dict(self.times), "calls": dict(self.calls), "counters": dict(self.counters)}
+
+    def report(self) -> str:
+        """A table of the phases, slowest first, with their share of the time of all phases, followed by the counters.
+        Counters are also given per swarm step, and the neighbours per boid, when the counters "steps" and "boids" are present.
+
+        Returns:
+            str: The report.
+        """
+        total = sum(self.times.values()) or 1.0
+        lines = [f"{'phase':<28} {'calls':>10} {'total (s)':>11} {'per call (ms)':>14} {'share':>7}"]
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            t, n = self.times[name], self.calls[name]
+            lines.append(f"{name:<28} {n:>10} {t:>11.3f} {1e3*t/max(n, 1):>14.4f} {t/total:>7.1%}")
+        steps = self.counters.get("steps", 0)
+        lines.append(f"\n{'counter':<28} {'total':>14} {'per step':>12}")
+        for name in sorted(self.counters):
+            value = self.counters[name]
+            lines.append(f"{name:<28} {value:>14.0f} {value/steps if steps else float('nan'):>12.3f}")
+        if self.counters.get("boids", 0) > 0:
+            lines.append(f"{'neighbours per boid':<28} {self.counters['neighbours']/self.counters['boids']:>14.3f}")
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.report()
+
+
+def profiled(function: Callable, *args) -> Tuple[Any, Profiler]:
+    """Run ```function(*args)``` with a new ```Profiler``` for all swarms and environments. Runs inside worker processes, see ```submit```.
+
+    Returns:
+        Tuple[Any, Profiler]: The result of the function and its profile.
+    """
+    from .environment import Environment
+    from .swarm import Swarm
+    previous = Swarm.profiler, Environment.profiler
+    Swarm.profiler = Environment.profiler = profiler = Profiler()
+    try:
+        return function(*args), profiler
+    finally:
+        Swarm.profiler, Environment.profiler = previous
+
+
+def submit(executor: Executor, function: Callable, *args) -> Future:
+    """Submit ```function(*args)``` to a pool of worker processes. While ```Swarm.profiler``` is enabled the task is ```profiled``` in the worker
+    and its profile is merged into ```Swarm.profiler``` when it is done, so a profile of the calling process covers its workers too.
+
+    Arguments:
+        executor (Executor): The pool.
+        function (Callable): The task, it must be picklable.
+
+    Returns:
+        Future: A future of the result of the function.
+    """
+    from .swarm import Swarm
+    profiler = Swarm.profiler
+    if not profiler.enabled:
+        return executor.submit(function, *args)
+    result = Future()
+
+    def done(future: Future) -> None:
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+            return
+        value, worker = future.result()
+        profiler.merge(worker)
+        result.set_result(value)
+
+    executor.submit(profiled, function, *args).add_done_callback(done)
+    return result
@@ -0,0 +1,266 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+if TYPE_CHECKING:
+    from .swarm import Swarm
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import subprocess
+import numpy as np
+
+# The colours of the states of the grid (by value of ```State```) and of the boids (not carrying, carrying water), as in ```Display```.
+GRID_COLORS = ['peru', 'firebrick', 'dodgerblue', 'forestgreen']
+BOID_COLORS = ['darkgray', 'deepskyblue']
+# The palette of the rendered frames: the RGB values of GRID_COLORS followed by BOID_COLORS
+PALETTE = np.array([[205, 133, 63], [178, 34, 34], [30, 144, 255], [34, 139, 34],
+                    [169, 169, 169], [0, 191, 255]], dtype=np.uint8)
+BOID_INDEX = len(GRID_COLORS)
+
+
+class Renderer:
+    # The boid marker: a triangle pointing along the x-axis, as ```Display.marker```
+    marker: np.ndarray[float] = 0.5*np.array([[1., 0.], [-1., -1.], [-1., 1.]])
+    # The number of candidate pixels that are tested at once
+    chunk_pixels: int = 1 << 20
+
+    def __init__(self, shape: Tuple[int, int], scale: Optional[int] = None, boid_size: Optional[float] = None) -> None:
+        """Headless renderer that rasterizes the grid and the boids straight into NumPy frames, without matplotlib.
+        The frames are oriented as in ```Display```: x to the right, y up, tile (x, y) covers [x, x+1] x [y, y+1].
+
+        Arguments:
+            shape (Tuple[int, int]): The shape of the grid.
+            scale (int): The number of pixels per tile. default = the largest scale for which the frame is at most 512 pixels wide (at least 1).
+            boid_size (float): The size of the boid triangles in pixels. default = 1/30 of the frame width, the size of the markers of ```Display```.
+        """
+        self.shape = tuple(shape)
+        self.scale = scale if scale is not None else max(1, 512 // max(self.shape))
+        self.width, self.height = self.shape[0] * self.scale, self.shape[1] * self.scale
+        self.boid_size = boid_size if boid_size is not None else max(3.0, self.width / 30)
+
+        # The pixel offsets that cover the bounding box of a triangle of any rotation
+        k = int(np.ceil(self.boid_size * np.sqrt(0.5))) + 1
+        dy, dx = np.mgrid[-k:k + 1, -k:k + 1]
+        self.offsets = (dx.ravel(), dy.ravel())
+
+    def indices(self, grid: np.ndarray[int], positions: np.ndarray[float], velocities: np.ndarray[float], carrying_water: np.ndarray[bool]) -> np.ndarray[np.uint8]:
+        """Rasterize a frame as indices into ```PALETTE```.
+
+        Arguments:
+            grid (np.ndarray[int]): The grid.
+            positions (np.ndarray[float]): The positions of the boids (N, 2).
+            velocities (np.ndarray[float]): The velocities of the boids (N, 2).
+            carrying_water (np.ndarray[bool]): Whether the boids carry water (N).
+
+        Returns:
+            np.ndarray[np.uint8]: The frame (height, width).
+        """
+        # Grid: row 0 of the frame is the top, the largest y
+        frame = np.ascontiguousarray(grid.T[::-1], dtype=np.uint8)
+        if self.scale > 1:
+            frame = frame.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        if len(positions) == 0:
+            return frame
+
+        # Boids: the triangles in pixel coordinates (column, row), rotated along the velocities
+        angle = np.arctan2(velocities[:, 1], velocities[:, 0])
+        cos, sin = np.cos(angle)[:, np.newaxis], np.sin(angle)[:, np.newaxis]
+        x, y = self.marker[:, 0] * self.boid_size, self.marker[:, 1] * self.boid_size
+        cols = positions[:, 0, np.newaxis] * self.scale + (cos*x - sin*y)
+        rows = (self.shape[1] - positions[:, 1, np.newaxis]) * self.scale - (sin*x + cos*y)
+
+        # The pixels around every boid whose centre lies inside its triangle (same sign of the three edge functions), in chunks of boids to bound the memory
+        c0 = np.floor(positions[:, 0] * self.scale).astype(int)
+        r0 = np.floor((self.shape[1] - positions[:, 1]) * self.scale).astype(int)
+        color = BOID_INDEX + carrying_water.astype(np.uint8)
+        chunk = max(1, self.chunk_pixels // len(self.offsets[0]))
+        for start in range(0, len(positions), chunk):
+            b = slice(start, start + chunk)
+            c, r = c0[b, np.newaxis] + self.offsets[0], r0[b, np.newaxis] + self.offsets[1]
+            px, py = c + 0.5, r + 0.5
+            edges = [(cols[b, (i + 1) % 3, np.newaxis] - cols[b, i, np.newaxis]) * (py - rows[b, i, np.newaxis])
+                     - (rows[b, (i + 1) % 3, np.newaxis] - rows[b, i, np.newaxis]) * (px - cols[b, i, np.newaxis]) for i in range(3)]
+            inside = ((edges[0] >= 0) & (edges[1] >= 0) & (edges[2] >= 0)) | ((edges[0] <= 0) & (edges[1] <= 0) & (edges[2] <= 0))
+            inside &= (c >= 0) & (c < self.width) & (r >= 0) & (r < self.height)
+            frame[r[inside], c[inside]] = np.broadcast_to(color[b, np.newaxis], inside.shape)[inside]
+        return frame
+
+    def frame(self, grid: np.ndarray[int], positions: np.ndarray[float], velocities: np.ndarray[float], carrying_water: np.ndarray[bool]) -> np.ndarray[np.uint8]:
+        """Rasterize an RGB frame, see ```indices```.
+
+        Returns:
+            np.ndarray[np.uint8]: The frame (height, width, 3).
+        """
+        return PALETTE[self.indices(grid, positions, velocities, carrying_water)]
+
+    def swarm(self, swarm: Swarm) -> np.ndarray[np.uint8]:
+        """Rasterize the current state of a swarm and its environment as indices into ```PALETTE```.
+        """
+        return self.indices(swarm.env.grid, swarm.positions, swarm.velocities, swarm.carrying_water)
+
+
+class FrameWriter:
+    """
+    FrameWriter interface:
+        Every writer streams frames to a file one at a time, with ```write```, and finishes the file with ```close```.
+        Frames are either indices into ```PALETTE``` (height, width) or RGB (height, width, 3).
+
+    """
+
+    def __init__(self, file_path: str, fps: float = 10) -> None:
+        self.file_path = file_path
+        self.fps = fps
+        self.n_frames = 0
+
+    def write(self, frame: np.ndarray[np.uint8]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> FrameWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class GifWriter(FrameWriter):
+    """
+    Streaming GIF writer:
+        Palette frames are LZW-encoded by Pillow and appended to the file as they come, with the fixed palette ```PALETTE```,
+        so no quantization is needed and the animation is never held in memory. RGB frames are quantized to the palette.
+
+    """
+
+    def __init__(self, file_path: str, fps: float = 10, loop: int = 0) -> None:
+        """Open a GIF file.
+
+        Arguments:
+            file_path (str): The path to the file.
+            fps (float): The frame rate, GIF stores the delay between frames in hundredths of a second. default = 10.
+            loop (int): The number of loops, 0 loops forever. default = 0.
+        """
+        from PIL import Image
+        super().__init__(file_path, fps)
+        self.loop = loop
+        self.file = open(file_path, "wb")
+        self.palette = Image.new("P", (1, 1))
+        self.palette.putpalette(PALETTE.ravel().tolist())
+
+    def write(self, frame: np.ndarray[np.uint8]) -> None:
+        from PIL import GifImagePlugin, Image
+        if frame.ndim == 3:
+            image = Image.fromarray(frame, "RGB").quantize(palette=self.palette, dither=Image.Dither.NONE)
+        else:
+            image = Image.fromarray(frame, "P")
+            image.putpalette(PALETTE.ravel().tolist())
+        if self.n_frames == 0:
+            header, _ = GifImagePlugin.getheader(image, info={"loop": self.loop})
+            self.file.write(b"".join(header))
+        self.file.write(b"".join(GifImagePlugin.getdata(image, duration=1000 / self.fps)))
+        self.n_frames += 1
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.write(b";")
+            self.file.close()
+
+
+class FFmpegWriter(FrameWriter):
+    """
+    Streaming video writer:
+        RGB frames are piped to an ffmpeg process, which encodes them to any format it supports, e.g. MP4 with H.264.
+
+    """
+
+    def __init__(self, file_path: str, fps: float = 10, codec: str = "libx264", ffmpeg: str = "ffmpeg") -> None:
+        """Open a video file. The ffmpeg process is started with the first frame, when the size of the frames is known.
+
+        Arguments:
+            file_path (str): The path to the file.
+            fps (float): The frame rate. default = 10.
+            codec (str): The video codec. default = "libx264".
+            ffmpeg (str): The ffmpeg executable. default = "ffmpeg".
+        """
+        super().__init__(file_path, fps)
+        self.codec = codec
+        self.ffmpeg = ffmpeg
+        self.process = None
+
+    def write(self, frame: np.ndarray[np.uint8]) -> None:
+        if frame.ndim == 2:
+            frame = PALETTE[frame]
+        if self.process is None:
+            height, width = frame.shape[:2]
+            command = [self.ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+                       "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", self.codec, "-pix_fmt", "yuv420p", self.file_path]
+            try:
+                self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            except FileNotFoundError:
+                raise RuntimeError(f"{self.ffmpeg} was not found, it is needed to write {self.file_path}; write a .gif instead") from None
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        self.n_frames += 1
+
+    def close(self) -> None:
+        if self.process is not None and self.process.stdin is not None and not self.process.stdin.closed:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError(f"{self.ffmpeg} failed to write {self.file_path}")
+
+
+def writer(file_path: str, fps: float = 10) -> FrameWriter:
+    """A writer for ```file_path```: a ```GifWriter``` for .gif files, an ```FFmpegWriter``` otherwise (.mp4, .webm, ...).
+    """
+    if os.path.splitext(file_path)[1].lower() == ".gif":
+        return GifWriter(file_path, fps)
+    return FFmpegWriter(file_path, fps)
+
+
+def render(swarm: Swarm, file_path: str, steps: int, steps_per_frame: int = 1, fps: float = 10, scale: Optional[int] = None,
+           boid_size: Optional[float] = None) -> int:
+    """Simulate a swarm and stream the frames to a GIF or video file: the initial state and a frame every ```steps_per_frame``` steps.
+
+    Arguments:
+        swarm (Swarm): The swarm, it is updated in place.
+        file_path (str): The file, see ```writer```.
+        steps (int): The number of simulation steps.
+        steps_per_frame (int): The number of simulation steps between two frames. default = 1.
+        fps (float): The frame rate. default = 10.
+        scale (int): The number of pixels per tile, see ```Renderer```.
+        boid_size (float): The size of the boids in pixels, see ```Renderer```.
+
+    Returns:
+        int: The number of frames.
+    """
+    renderer = Renderer(swarm.env.grid.shape, scale, boid_size)
+    with writer(file_path, fps) as out:
+        out.write(renderer.swarm(swarm))
+        for step in range(0, steps, steps_per_frame):
+            for _ in range(min(steps_per_frame, steps - step)):
+                swarm.update()
+            out.write(renderer.swarm(swarm))
+        return out.n_frames
+
+
+def _render(arguments: tuple) -> int:
+    return render(*arguments)
+
+
+def render_many(swarms: Sequence[Swarm], file_paths: Sequence[str], steps: int, steps_per_frame: int = 1, fps: float = 10, scale: Optional[int] = None,
+                boid_size: Optional[float] = None, max_workers: Optional[int] = None) -> List[int]:
+    """Render many swarms, e.g. the best swarm of every observation, each to its own file, in a pool of worker processes.
+
+    Arguments:
+        swarms (Sequence[Swarm]): The swarms.
+        file_paths (Sequence[str]): The file of every swarm.
+        max_workers (int): The number of worker processes, 0 to render in the calling process. default = the number of processors.
+        The other arguments are those of ```render```.
+
+    Returns:
+        List[int]: The number of frames of every file.
+    """
+    arguments = [(swarm, file_path, steps, steps_per_frame, fps, scale, boid_size) for swarm, file_path in zip(swarms, file_paths)]
+    if max_workers == 0:
+        return list(map(_render, arguments))
+    with ProcessPoolExecutor(max_workers) as executor:
+        return list(executor.map(_render, arguments))
@@ -0,0 +1,230 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict
+if TYPE_CHECKING:
+    from .swarm import Swarm
+
+from types import SimpleNamespace
+import json
+import os
+import numpy as np
+
+from .results import _replace
+
+# Replay log: a directory of raw little-endian binaries, one row per recorded step (step 0 is the initial state), and meta.json.
+#   positions.f32, velocities.f32   float32 (steps + 1, nboids, 2)
+#   carrying.bool                   bool    (steps + 1, nboids)
+#   changes.bin                     the grid changes of all steps: (cell, new state) as packed int32 flat index and int8 state
+#   ends.i64                        int64 (steps + 1): the end of the changes of every step in changes.bin, the changes of step s are ends[s-1]:ends[s]
+#   keyframes.i8                    int8 (n_keyframes, *shape): the full grid every ```keyframe_every``` steps, so any step is restored from the
+#                                   nearest keyframe and at most ```keyframe_every``` - 1 steps of changes
+META_FILE = "meta.json"
+CHANGE = np.dtype([("cell", "<i4"), ("state", "i1")])
+FILES = {"positions": ("positions.f32", "<f4"), "velocities": ("velocities.f32", "<f4"), "carrying": ("carrying.bool", "?"),
+         "changes": ("changes.bin", CHANGE), "ends": ("ends.i64", "<i8"), "keyframes": ("keyframes.i8", "i1")}
+
+
+class Recorder:
+    """
+    Recorder of a simulation:
+        ```capture``` appends the state of the boids and the grid changes since the previous capture to the log, so the memory use does not grow with the number of steps.
+        The log can be replayed with ```Replay```, e.g. by ```Display``` through a ```Player```, without simulating again.
+
+    """
+
+    def __init__(self, path: str, swarm: Swarm, keyframe_every: int = 100, **info) -> None:
+        """Start a log of ```swarm``` and capture its current state as step 0.
+
+        Arguments:
+            path (str): The log directory, it is created or overwritten.
+            swarm (Swarm): The swarm to record.
+            keyframe_every (int): The number of steps between full grid snapshots. default = 100.
+            info: Any extra JSON information that is stored in meta.json, e.g. the genome of the swarm.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.swarm = swarm
+        self.keyframe_every = keyframe_every
+        self.info = info
+        self.files = dict((name, open(os.path.join(path, file_name), "wb")) for name, (file_name, _) in FILES.items())
+        self.steps = -1
+        self.n_changes = 0
+        self.previous = np.array(swarm.env.grid, dtype=np.int8)
+        self.capture()
+
+    def capture(self) -> None:
+        """Append the current state of the swarm as the next step.
+        """
+        self.steps += 1
+        swarm, files = self.swarm, self.files
+        files["positions"].write(np.ascontiguousarray(swarm.positions, dtype="<f4").tobytes())
+        files["velocities"].write(np.ascontiguousarray(swarm.velocities, dtype="<f4").tobytes())
+        files["carrying"].write(np.ascontiguousarray(swarm.carrying_water, dtype="?").tobytes())
+
+        grid = swarm.env.grid
+        cells = np.flatnonzero(grid != self.previous)
+        if len(cells):
+            changes = np.empty(len(cells), dtype=CHANGE)
+            changes["cell"] = cells
+            changes["state"] = grid.ravel()[cells]
+            files["changes"].write(changes.tobytes())
+            self.previous.ravel()[cells] = changes["state"]
+            self.n_changes += len(cells)
+        files["ends"].write(np.array([self.n_changes], dtype="<i8").tobytes())
+        if self.steps % self.keyframe_every == 0:
+            files["keyframes"].write(self.previous.tobytes())
+
+    def close(self) -> None:
+        """Close the binaries and write meta.json, the log is complete from then on.
+        """
+        if not self.files:
+            return
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+        meta = {"version": 1, "steps": self.steps, "nboids": int(self.swarm.nboids), "shape": list(self.previous.shape),
+                "keyframe_every": self.keyframe_every, "n_changes": self.n_changes, "info": self.info}
+        _replace(os.path.join(self.path, META_FILE), lambda file: file.write(json.dumps(meta, indent=1).encode()))
+
+    def __enter__(self) -> Recorder:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def record(swarm: Swarm, path: str, steps: int, keyframe_every: int = 100, **info) -> Replay:
+    """Simulate ```steps``` steps of a swarm and record them.
+
+    Arguments:
+        swarm (Swarm): The swarm, it is updated in place.
+        path (str): The log directory.
+        steps (int): The number of steps.
+        keyframe_every (int): The number of steps between full grid snapshots. default = 100.
+        info: Any extra JSON information that is stored in meta.json.
+
+    Returns:
+        Replay: The recorded log.
+    """
+    with Recorder(path, swarm, keyframe_every, **info) as recorder:
+        for _ in range(steps):
+            swarm.update()
+            recorder.capture()
+    return Replay(path)
+
+
+class Replay:
+    """
+    Memory-mapped replay log:
+        The boid arrays are read straight from the binaries, e.g. ```replay.positions[:, 0]``` is the track of the first boid,
+        and the grid of any step is restored with ```grid```. Nothing is read into memory before it is used.
+
+    """
+    meta: Dict
+    positions: np.ndarray[np.float32]
+    velocities: np.ndarray[np.float32]
+    carrying_water: np.ndarray[bool]
+
+    def __init__(self, path: str) -> None:
+        """Open a log written by ```Recorder```.
+
+        Arguments:
+            path (str): The log directory.
+        """
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as file:
+            self.meta = json.load(file)
+        frames, nboids, shape = self.meta["steps"] + 1, self.meta["nboids"], tuple(self.meta["shape"])
+        self.shape = shape
+        self.keyframe_every = self.meta["keyframe_every"]
+        self.positions = self._map("positions", (frames, nboids, 2))
+        self.velocities = self._map("velocities", (frames, nboids, 2))
+        self.carrying_water = self._map("carrying", (frames, nboids))
+        self.changes = self._map("changes", (self.meta["n_changes"],))
+        self.ends = self._map("ends", (frames,))
+        self.keyframes = self._map("keyframes", ((frames - 1) // self.keyframe_every + 1, *shape))
+
+    def _map(self, name: str, shape: tuple) -> np.ndarray:
+        file_name, dtype = FILES[name]
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, file_name), dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self) -> int:
+        """The number of recorded steps, including the initial state.
+        """
+        return self.meta["steps"] + 1
+
+    def step_changes(self, step: int) -> np.ndarray:
+        """The grid changes of a step: a structured array of "cell" (flat index) and "state".
+        """
+        return self.changes[self.ends[step - 1] if step > 0 else 0:self.ends[step]]
+
+    def apply(self, grid: np.ndarray[np.int8], first: int, last: int) -> None:
+        """Apply the grid changes of steps ```first``` to ```last``` (inclusive) to ```grid``` in place.
+        """
+        if last < first:
+            return
+        changes = self.changes[self.ends[first - 1] if first > 0 else 0:self.ends[last]]
+        cells, states = changes["cell"], changes["state"]
+        if last > first:
+            # Only the last change of a cell that changed in several steps counts
+            cells, states = cells[::-1], states[::-1]
+            _, last_change = np.unique(cells, return_index=True)
+            cells, states = cells[last_change], states[last_change]
+        grid.ravel()[cells] = states
+
+    def grid(self, step: int) -> np.ndarray[np.int8]:
+        """The grid at a step, restored from the nearest keyframe.
+
+        Arguments:
+            step (int): The step, negative steps count from the end.
+
+        Returns:
+            np.ndarray[np.int8]: A new grid.
+        """
+        step = range(len(self))[step]
+        keyframe = step // self.keyframe_every
+        grid = np.array(self.keyframes[keyframe])
+        self.apply(grid, keyframe * self.keyframe_every + 1, step)
+        return grid
+
+    def player(self, start: int = 0) -> Player:
+        """A ```Player``` of the log.
+        """
+        return Player(self, start)
+
+
+class Player:
+    """
+    Swarm-like player of a replay log:
+        It has the attributes ```positions```, ```velocities```, ```carrying_water``` and ```env.grid``` of a ```Swarm```, and ```update``` advances one recorded step,
+        so it can be passed to ```Display``` and ```render.render``` instead of a swarm. After the last step ```update``` keeps the last state.
+
+    """
+
+    def __init__(self, replay: Replay, start: int = 0) -> None:
+        self.replay = replay
+        self.nboids = replay.meta["nboids"]
+        self.env = SimpleNamespace(grid=None)
+        self.seek(start)
+
+    def seek(self, step: int) -> None:
+        """Jump to any step.
+        """
+        self.step = range(len(self.replay))[step]
+        self.env.grid = self.replay.grid(self.step)
+        self._load()
+
+    def update(self) -> None:
+        """Advance one step, by applying its grid changes.
+        """
+        if self.step + 1 >= len(self.replay):
+            return
+        self.step += 1
+        self.replay.apply(self.env.grid, self.step, self.step)
+        self._load()
+
+    def _load(self) -> None:
+        self.positions = self.replay.positions[self.step]
+        self.velocities = self.replay.velocities[self.step]
+        self.carrying_water = self.replay.carrying_water[self.step]
@@ -0,0 +1,242 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+if TYPE_CHECKING:
+    import pandas as pd
+
+import json
+import os
+import zipfile
+import numpy as np
+
+# The columns of a results file and their types, in the order of the CSV layout
+COLUMNS: Dict[str, np.dtype] = {
+    "Obs": np.dtype(np.int32),
+    "Gen": np.dtype(np.int32),
+    "Alignment": np.dtype(np.float64),
+    "Cohesion": np.dtype(np.float64),
+    "Separation": np.dtype(np.float64),
+    "GoToFire": np.dtype(np.float64),
+    "GoToWater": np.dtype(np.float64),
+    "fitness": np.dtype(np.float64),
+    "reps": np.dtype(np.int32),
+    "variance": np.dtype(np.float64),
+}
+# The formats of the columns in the CSV layout
+CSV_FORMATS: Dict[str, str] = {
+    "Obs": "%3d", "Gen": "%3d", "Alignment": "%7.4f", "Cohesion": "%7.4f", "Separation": "%7.4f", "GoToFire": "%7.4f", "GoToWater": "%7.4f",
+    "fitness": "%6.2f", "reps": "%2d", "variance": "%7.2f",
+}
+META_FILE = "meta.json"
+TAIL_FILE = "tail.npz"
+
+
+def _replace(file_path: str, write) -> None:
+    """Write a file atomically: ```write``` writes to a temporary file that then replaces ```file_path```.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        write(file)
+    os.replace(tmp_path, file_path)
+
+
+def _save_columns(file, columns: Dict[str, np.ndarray]) -> None:
+    """Like ```np.savez_compressed```, but with fixed timestamps so the same columns always give the same bytes.
+    """
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, values in columns.items():
+            info = zipfile.ZipInfo(name + ".npy", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as member:
+                np.lib.format.write_array(member, np.asanyarray(values))
+
+
+class ResultsWriter:
+    """
+    Buffered columnar results sink:
+        Rows are buffered in typed arrays, one per column, and flushed in large chunks to a directory of compressed .npz files,
+        one array per column. ```meta.json``` lists the chunks with the range of their observations and generations,
+        so readers can skip chunks and load only the columns they need.
+
+    """
+    path: str
+    chunk_size: int
+    buffers: Dict[str, np.ndarray]
+    size: int
+    chunks: List[Dict]
+
+    def __init__(self, path: str, chunk_size: int = 1 << 16, offset: Optional[Dict] = None) -> None:
+        """Open a results directory, rows are appended after the rows it already holds.
+
+        Arguments:
+            path (str): The results directory, created if it does not exist.
+            chunk_size (int): The number of rows buffered before they are flushed to a chunk. default = 65536.
+            offset (Dict): An offset returned by ```checkpoint```. The rows written after the checkpoint are dropped
+                        and the rows that were buffered at the checkpoint are buffered again, default = keep all rows.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+        self.chunks = read_meta(path)
+        self.buffers = dict((name, np.empty(chunk_size, dtype=dtype)) for name, dtype in COLUMNS.items())
+        self.size = 0
+        if offset is not None:
+            self.chunks = self.chunks[:offset["chunks"]]
+            write_meta(path, self.chunks)
+            if offset["rows"] > 0:
+                with np.load(os.path.join(path, TAIL_FILE)) as tail:
+                    self.append(**dict((name, tail[name][:offset["rows"]]) for name in COLUMNS))
+
+    @property
+    def rows(self) -> int:
+        """The number of rows written, flushed or not.
+        """
+        return sum(chunk["rows"] for chunk in self.chunks) + self.size
+
+    def append(self, **columns) -> None:
+        """Append rows. Every column of ```COLUMNS``` must be given, as an array or as a scalar that is repeated for every row.
+
+        Arguments:
+            columns: The values of every column.
+        """
+        n = max(np.size(values) for values in columns.values())
+        start = 0
+        while start < n:
+            stop = min(n, start + self.chunk_size - self.size)
+            for name in COLUMNS:
+                self.buffers[name][self.size:self.size + stop - start] = np.broadcast_to(columns[name], (n,))[start:stop]
+            self.size += stop - start
+            start = stop
+            if self.size == self.chunk_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows to a new chunk.
+        """
+        if self.size == 0:
+            return
+        columns = dict((name, buffer[:self.size]) for name, buffer in self.buffers.items())
+        name = f"chunk_{len(self.chunks):06d}.npz"
+        _replace(os.path.join(self.path, name), lambda file: _save_columns(file, columns))
+        self.chunks.append({
+            "file": name, "rows": self.size,
+            "obs": [int(columns["Obs"].min()), int(columns["Obs"].max())],
+            "gen": [int(columns["Gen"].min()), int(columns["Gen"].max())],
+        })
+        write_meta(self.path, self.chunks)
+        self.size = 0
+
+    def checkpoint(self) -> Dict:
+        """Save the buffered rows without flushing them, so a writer can later be reopened at this point.
+        The chunks are the same as if the rows were written without interruption.
+
+        Returns:
+            Dict: The offset, the number of chunks and the number of buffered rows.
+        """
+        columns = dict((name, buffer[:self.size]) for name, buffer in self.buffers.items())
+        _replace(os.path.join(self.path, TAIL_FILE), lambda file: _save_columns(file, columns))
+        return {"chunks": len(self.chunks), "rows": self.size}
+
+    def close(self) -> None:
+        """Flush the remaining rows.
+        """
+        self.flush()
+
+    def __enter__(self) -> ResultsWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_meta(path: str) -> List[Dict]:
+    """Read the list of chunks of a results directory.
+
+    Arguments:
+        path (str): The results directory.
+
+    Returns:
+        List[Dict]: The chunks, with their file name, number of rows and the range of their observations ("obs") and generations ("gen").
+    """
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return []
+    with open(meta_path) as file:
+        return json.load(file)["chunks"]
+
+
+def write_meta(path: str, chunks: List[Dict]) -> None:
+    """Atomically replace the list of chunks of a results directory.
+    """
+    _replace(os.path.join(path, META_FILE), lambda file: file.write(json.dumps({"columns": list(COLUMNS), "chunks": chunks}, indent=1).encode()))
+
+
+def results_path(directory: str, name: str) -> str:
+    """The results of a named run in ```directory```: the results directory ```output_<name>```, or the .csv file of an older run.
+
+    Arguments:
+        directory (str): The directory with the results of every run.
+        name (str): The name of the run, e.g. the environment.
+
+    Returns:
+        str: The path to pass to ```read_results```.
+    """
+    path = os.path.join(directory, "output_" + name)
+    return path if os.path.isdir(path) else path + ".csv"
+
+
+def read_results(path: str, columns: Optional[Iterable[str]] = None, generations: Optional[Iterable[int]] = None, observations: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    """Read a results directory written by ```ResultsWriter```, or a results file in the CSV layout.
+    Chunks without any of the requested generations or observations are skipped and only the requested columns are loaded.
+
+    Arguments:
+        path (str): The results directory, or a .csv file.
+        columns (Iterable[str]): The columns to read, default = all columns.
+        generations (Iterable[int]): The generations to read, default = all generations.
+        observations (Iterable[int]): The observations to read, default = all observations.
+
+    Returns:
+        pd.DataFrame: The results.
+    """
+    import pandas as pd
+    columns = list(columns) if columns is not None else None
+    generations = np.asarray(list(generations)) if generations is not None else None
+    observations = np.asarray(list(observations)) if observations is not None else None
+    if not os.path.isdir(path):
+        df = pd.read_csv(path, skipinitialspace=True)
+        if generations is not None:
+            df = df[df.Gen.isin(generations)]
+        if observations is not None:
+            df = df[df.Obs.isin(observations)]
+        return df[columns] if columns is not None else df
+
+    columns = columns if columns is not None else list(COLUMNS)
+    parts = dict((name, []) for name in columns)
+    for chunk in read_meta(path):
+        if generations is not None and not np.any((generations >= chunk["gen"][0]) & (generations <= chunk["gen"][1])):
+            continue
+        if observations is not None and not np.any((observations >= chunk["obs"][0]) & (observations <= chunk["obs"][1])):
+            continue
+        with np.load(os.path.join(path, chunk["file"])) as data:
+            keep = np.ones(chunk["rows"], dtype=bool)
+            if generations is not None:
+                keep &= np.isin(data["Gen"], generations)
+            if observations is not None:
+                keep &= np.isin(data["Obs"], observations)
+            for name in columns:
+                parts[name].append(data[name][keep])
+    return pd.DataFrame(dict((name, np.concatenate(values) if values else np.empty(0, dtype=COLUMNS[name])) for name, values in parts.items()))
+
+
+def export_csv(path: str, csv_path: str) -> None:
+    """Export a results directory to the CSV layout, one chunk at a time.
+
+    Arguments:
+        path (str): The results directory.
+        csv_path (str): The path to the .csv file.
+    """
+    with open(csv_path, 'w') as file:
+        file.write(",".join(COLUMNS) + "\n")
+        for chunk in read_meta(path):
+            with np.load(os.path.join(path, chunk["file"])) as data:
+                table = np.rec.fromarrays([data[name] for name in COLUMNS], names=list(COLUMNS))
+            np.savetxt(file, table, fmt=list(CSV_FORMATS.values()), delimiter=", ")
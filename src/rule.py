@@ -3,10 +3,10 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .swarm import Swarm
     from .boid import Boid
+    from .neighbours import Neighbours
 
 import numpy as np
 from typing import Optional
-from sklearn.neighbors import KDTree
 
 from .state import State
 
@@ -22,16 +22,16 @@ class Rule:
     def __init__(self, weight: float = 1.0):
         self.weight = weight
 
-    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float],neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[float]:
+    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float],neighbours:Neighbours) -> np.ndarray[float]:
         pass
 
     @staticmethod
-    def crossover(rule: Rule, other: Rule) -> Rule:
-        weight = rule.weight if np.random.random() > 0.5 else other.weight
+    def crossover(rule: Rule, other: Rule, rng: np.random.Generator = np.random) -> Rule:
+        weight = rule.weight if rng.random() > 0.5 else other.weight
         return Rule(weight=weight)
 
-    def mutate(self) -> None:
-        self.weight = np.random.uniform(-1,1)
+    def mutate(self, rng: np.random.Generator = np.random) -> None:
+        self.weight = rng.uniform(-1,1)
 
     def __str__(self):
         return f"weight = {self.weight:.4}"    
@@ -42,36 +42,33 @@ class Alignment(Rule):
     def __init__(self, **params):
         super().__init__(**params)
     
-    def apply(self, swarm: Swarm,positions: np.ndarray[float], velocities: np.ndarray[float],neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[float]:
+    def apply(self, swarm: Swarm,positions: np.ndarray[float], velocities: np.ndarray[float],neighbours:Neighbours) -> np.ndarray[float]:
         """Apply the rule to the swarm.
 
         Arguments:
             swarm (Swarm): The swarm.
             velocities (np.ndarray[float]): The velocity vectors of the boids in the swarm. 
             positions: np.ndarray[float]: Not used. 
-            neighbours_idx (np.ndarray[np.ndarray]): The list of neighbour indices per boid. 
+            neighbours (Neighbours): The neighbour lists of the boids. 
 
         Returns:
             np.ndarray[np.ndarray]: The force vector that results from the appliation of the rule. 
         """     
-        force_vector = np.zeros(velocities.shape)
-        for i, n_idx in enumerate(neighbours_idx):
-            if n_idx.size > 0:
-                force_vector[i] = np.mean(velocities[n_idx,:],axis=0)
-        return force_vector
+        return neighbours.mean(velocities)
 
     @staticmethod
-    def crossover(rule: Alignment, other: Alignment) -> Alignment:
+    def crossover(rule: Alignment, other: Alignment, rng: np.random.Generator = np.random) -> Alignment:
         """Apply crossover between two rules.
 
         Arguments:
             rule (Rule): Rule 1.
             other (Rule): Rule 2.
+            rng (np.random.Generator): The random generator. default = np.random.
 
         Returns:
             Rule: the newly created rule. 
         """   
-        new_rule = super().crossover(rule, other)
+        new_rule = super().crossover(rule, other, rng)
         new_rule.__class__ = Alignment
     
         return new_rule
@@ -87,38 +84,37 @@ class Cohesion(Rule):
     def __init__(self, **params):
         super().__init__(**params)
     
-    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float],neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[float]:
+    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float],neighbours:Neighbours) -> np.ndarray[float]:
         """Apply the rule to the swarm.
 
         Arguments:
             swarm (Swarm): The swarm.
             velocities (np.ndarray[float]): The velocity vectors of the boids in the swarm. 
             positions: np.ndarray[float]: The positions of the boids.
-            neighbours_idx (np.ndarray[np.ndarray]): The list of neighbour indices per boid. 
+            neighbours (Neighbours): The neighbour lists of the boids. 
 
         Returns:
             np.ndarray[np.ndarray]: The force vector that results from the appliation of the rule. 
         """     
-        force_vector = np.zeros(velocities.shape)
-        for i, n_idx in enumerate(neighbours_idx):
-            if n_idx.size > 0:
-                force_vector[i] = np.mean(positions[n_idx,:],axis=0) - swarm.boids[i].position
+        has_neighbours = (neighbours.counts() > 0)[:, np.newaxis]
+        force_vector = np.where(has_neighbours, neighbours.mean(positions) - positions, 0)
         norm=np.linalg.norm(force_vector,axis=1)[:,np.newaxis]
         force_vector=np.divide(force_vector,norm,where=norm>0,out=force_vector)
         return force_vector
 
     @staticmethod
-    def crossover(rule: Cohesion, other: Cohesion) -> Cohesion:
+    def crossover(rule: Cohesion, other: Cohesion, rng: np.random.Generator = np.random) -> Cohesion:
         """Apply crossover between two rules.
 
         Arguments:
             rule (Rule): Rule 1.
             other (Rule): Rule 2.
+            rng (np.random.Generator): The random generator. default = np.random.
 
         Returns:
             Rule: the newly created rule. 
         """   
-        new_rule = super().crossover(rule,other)
+        new_rule = super().crossover(rule, other, rng)
         new_rule.__class__ = Cohesion
 
         return new_rule
@@ -132,39 +128,40 @@ class Separation(Rule):
     def __init__(self, **params):
         super().__init__(**params)
     
-    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[np.ndarray]:
+    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours:Neighbours) -> np.ndarray[np.ndarray]:
         """Apply the rule to the swarm.
 
         Arguments:
             swarm (Swarm): The swarm.
             velocities (np.ndarray[float]): The velocity vectors of the boids in the swarm. 
             positions: np.ndarray[float]: Not used. 
-            neighbours_idx (np.ndarray[np.ndarray]): The list of neighbour indices per boid. 
+            neighbours (Neighbours): The neighbour lists of the boids. 
 
         Returns:
             np.ndarray[np.ndarray]: The force vector that results from the appliation of the rule. 
         """     
         force_vector = np.zeros(velocities.shape)
-        for i, n_idx in enumerate(neighbours_idx):
-            if n_idx.size > 0:
-                force_vector[i] = swarm.boids[i].position - swarm.boids[n_idx[0]].position 
+        nearest = neighbours.nearest()
+        has_neighbours = nearest >= 0
+        force_vector[has_neighbours] = positions[has_neighbours] - positions[nearest[has_neighbours]]
         norm=np.linalg.norm(force_vector,axis=1)[:,np.newaxis]
         force_vector=np.divide(force_vector,norm,where=norm>0,out=force_vector) 
 
         return force_vector
 
     @staticmethod
-    def crossover(rule: Separation, other: Separation) -> Separation:
+    def crossover(rule: Separation, other: Separation, rng: np.random.Generator = np.random) -> Separation:
         """Apply crossover between two rules.
 
         Arguments:
             rule (Rule): Rule 1.
             other (Rule): Rule 2.
+            rng (np.random.Generator): The random generator. default = np.random.
 
         Returns:
             Rule: the newly created rule. 
         """   
-        new_rule = super().crossover(rule,other)
+        new_rule = super().crossover(rule, other, rng)
         new_rule.__class__ = Separation
 
         return new_rule
@@ -178,44 +175,40 @@ class GoToWater(Rule):
     def __init__(self, **params):
         super().__init__(**params)
     
-    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[float]:
+    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours:Neighbours) -> np.ndarray[float]:
         """Apply the rule to the swarm.
 
         Arguments:
             swarm (Swarm): The swarm.
             velocities (np.ndarray[float]): The velocity vectors of the boids in the swarm. 
             positions: np.ndarray[float]: The positions of the boids. 
-            neighbours_idx (np.ndarray[np.ndarray]): Not used. 
+            neighbours (Neighbours): Not used. 
 
         Returns:
             np.ndarray[np.ndarray]: The force vector that results from the appliation of the rule. 
         """     
         force_vector = np.zeros(velocities.shape)    
-        no_water_idx = np.nonzero([not b.carrying_water for b in swarm.boids])[0]
-        if no_water_idx.size == 0: 
-            return force_vector 
-        water_within_vision_idx, _ = swarm.env.water_tree.query_radius(positions[no_water_idx], r=swarm.vision_range, sort_results=True, return_distance=True)
-
-        for i,closest_waters in zip(no_water_idx,water_within_vision_idx):
-            if closest_waters.size>0:
-                force_vector[i]=swarm.env.water_tree.data[closest_waters[0]]-positions[i]
+        no_water_idx = np.flatnonzero(~swarm.carrying_water)
+        targets, found = swarm.env.water_field.nearest(positions[no_water_idx], swarm.vision_range)
+        force_vector[no_water_idx[found]] = targets[found] - positions[no_water_idx[found]]
        
         norm=np.linalg.norm(force_vector,axis=1)[:,np.newaxis]
         force_vector=np.divide(force_vector,norm,where=norm>0,out=force_vector)
         return force_vector
 
     @staticmethod
-    def crossover(rule: GoToWater, other: GoToWater) -> GoToWater:
+    def crossover(rule: GoToWater, other: GoToWater, rng: np.random.Generator = np.random) -> GoToWater:
         """Apply crossover between two rules.
 
         Arguments:
             rule (Rule): Rule 1.
             other (Rule): Rule 2.
+            rng (np.random.Generator): The random generator. default = np.random.
 
         Returns:
             Rule: the newly created rule. 
         """   
-        new_rule = super().crossover(rule,other)
+        new_rule = super().crossover(rule, other, rng)
         new_rule.__class__ = GoToWater
 
         return new_rule
@@ -228,47 +221,49 @@ class GoToFire(Rule):
     def __init__(self, **params):
         super().__init__(**params)
     
-    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours_idx:np.ndarray[np.ndarray]) -> np.ndarray[float]:
+    def apply(self, swarm: Swarm, positions: np.ndarray[float], velocities: np.ndarray[float], neighbours:Neighbours) -> np.ndarray[float]:
         """Apply the rule to the swarm.
 
         Arguments:
             swarm (Swarm): The swarm.
             velocities (np.ndarray[float]): The velocity vectors of the boids in the swarm. 
             positions: np.ndarray[float]: The positions of the boids. 
-            neighbours_idx (np.ndarray[np.ndarray]): Not used. 
+            neighbours (Neighbours): Not used. 
 
         Returns:
             np.ndarray[np.ndarray]: The force vector that results from the appliation of the rule. 
         """     
         force_vector = np.zeros(velocities.shape)        
-        water_idx = np.nonzero([b.carrying_water for b in swarm.boids])[0]
+        water_idx = np.flatnonzero(swarm.carrying_water)
         if swarm.env.n_fires == 0 or water_idx.size == 0: 
             return force_vector  
-        fire_within_vision_idx, _ = swarm.env.fire_tree.query_radius(positions[water_idx], r=swarm.vision_range, sort_results=True, return_distance=True)
-
-        for i,closest_fires in zip(water_idx,fire_within_vision_idx):
-            if closest_fires.size>0:
-                force_vector[i]=swarm.env.fire_tree.data[closest_fires[0]]-positions[i]
+        targets, found = swarm.env.fire_index.nearest(positions[water_idx], swarm.vision_range)
+        force_vector[water_idx[found]] = targets[found] - positions[water_idx[found]]
                
         norm=np.linalg.norm(force_vector,axis=1)[:,np.newaxis]
         force_vector=np.divide(force_vector,norm,where=norm>0,out=force_vector)
         return force_vector
 
     @staticmethod
-    def crossover(rule: GoToFire, other: GoToFire) -> GoToFire:
+    def crossover(rule: GoToFire, other: GoToFire, rng: np.random.Generator = np.random) -> GoToFire:
         """Apply crossover between two rules.
 
         Arguments:
             rule (Rule): Rule 1.
             other (Rule): Rule 2.
+            rng (np.random.Generator): The random generator. default = np.random.
 
         Returns:
             Rule: the newly created rule. 
         """   
-        new_rule = super().crossover(rule,other)
+        new_rule = super().crossover(rule, other, rng)
         new_rule.__class__ = GoToFire
 
         return new_rule
 
     def __str__(self):
         return f"GoToFire: {super().__str__()}"
+
+
+# The order of the rules in a genome
+RULES = [Alignment, Cohesion, Separation, GoToWater, GoToFire]
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import numpy as np
+
+from . import gridio
+from .environment import Environment
+from .state import State
+
+# Generated grids are cached as binary grid files, by generator, parameters, size and seed, in the user cache directory
+# (or in the directory set by NACO_GRID_CACHE), never in the source tree
+CACHE_DIR = os.environ.get("NACO_GRID_CACHE") or os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "nacoproject", "grids")
+# Bumped whenever the generator changes, so cached maps of an older generator are not reused
+VERSION = 1
+# The number of rows that are generated at once, which bounds the memory used for large maps
+BLOCK_ROWS = 1024
+
+
+def _noise(rng: np.random.Generator, shape: Tuple[int, int], feature_size: float) -> np.ndarray[np.float32]:
+    """Coarse random values in [0, 1), one per ```feature_size``` tiles, that ```_sample``` interpolates into smooth value noise.
+    """
+    cells = np.maximum(2, np.ceil(np.array(shape) / max(feature_size, 1.0)).astype(int) + 2)
+    return rng.random(tuple(cells), dtype=np.float32)
+
+
+def _sample(coarse: np.ndarray[np.float32], shape: Tuple[int, int], rows: np.ndarray[int], cols: np.ndarray[int]) -> np.ndarray[np.float32]:
+    """Bilinear interpolation of coarse noise at the tiles ```rows``` x ```cols``` of a grid of ```shape```.
+    """
+    weights = []
+    for index, n, m in ((rows, shape[0], coarse.shape[0]), (cols, shape[1], coarse.shape[1])):
+        u = (index + 0.5) * ((m - 1) / n)
+        low = np.minimum(u.astype(int), m - 2)
+        weights.append((low, (u - low).astype(np.float32)))
+    (r0, fr), (c0, fc) = weights
+    top = coarse[r0][:, c0] * (1 - fc) + coarse[r0][:, c0 + 1] * fc
+    bottom = coarse[r0 + 1][:, c0] * (1 - fc) + coarse[r0 + 1][:, c0 + 1] * fc
+    return top * (1 - fr)[:, np.newaxis] + bottom * fr[:, np.newaxis]
+
+
+class Scenario:
+    """
+    Procedural scenario generator:
+        A forest with a patchy tree density, lakes with irregular shores, meandering rivers and clustered ignitions, drawn from a seed.
+        Every layer is generated with whole-array operations (the forest in blocks of rows), so maps of 10000 x 10000 tiles take seconds.
+        Sizes are given relative to the size of the map, so the same scenario looks alike at any size.
+
+    """
+
+    def __init__(self, tree_density: float = 0.95, density_variation: float = 0.1, feature_size: float = 0.1, n_lakes: int = 0, lake_size: float = 0.08,
+                 n_rivers: int = 0, river_width: float = 0.05, n_ignitions: int = 3, ignition_spread: float = 0.03, fires_per_ignition: int = 4) -> None:
+        """Set up a scenario.
+
+        Arguments:
+            tree_density (float): The average fraction of tiles with a tree, the other tiles of the forest are barren. default = 0.95.
+            density_variation (float): How much the tree density varies between patches of the forest. default = 0.1.
+            feature_size (float): The size of forest patches and the roughness of shores, relative to the map. default = 0.1.
+            n_lakes (int): The number of lakes. default = 0.
+            lake_size (float): The radius of the lakes, relative to the map. default = 0.08.
+            n_rivers (int): The number of rivers, that cross the map from one side to another. default = 0.
+            river_width (float): The width of the rivers, relative to the map (at least one tile). default = 0.05.
+            n_ignitions (int): The number of places where the fire starts. default = 3.
+            ignition_spread (float): The spread of the fires around their ignition, relative to the map. default = 0.03.
+            fires_per_ignition (int): The number of burning tiles drawn around every ignition. default = 4.
+        """
+        self.tree_density = tree_density
+        self.density_variation = density_variation
+        self.feature_size = feature_size
+        self.n_lakes = n_lakes
+        self.lake_size = lake_size
+        self.n_rivers = n_rivers
+        self.river_width = river_width
+        self.n_ignitions = n_ignitions
+        self.ignition_spread = ignition_spread
+        self.fires_per_ignition = fires_per_ignition
+
+    def params(self) -> Dict[str, float]:
+        """The parameters of the scenario, which together with the size and the seed determine the map.
+        """
+        return dict(vars(self))
+
+    def generate(self, size: Union[int, Tuple[int, int]], seed: int) -> np.ndarray[np.int8]:
+        """Generate a map.
+
+        Arguments:
+            size (Union[int, Tuple[int, int]]): The shape of the grid, or its side for a square grid.
+            seed (int): The seed, the same scenario, size and seed always give the same map.
+
+        Returns:
+            np.ndarray[np.int8]: The grid.
+        """
+        shape = (size, size) if np.isscalar(size) else tuple(size)
+        scale = max(shape)
+        rng = np.random.default_rng(seed)
+        grid = self.forest(rng, shape)
+        self.lakes(rng, grid, scale)
+        self.rivers(rng, grid, scale)
+        self.ignitions(rng, grid, scale)
+        return grid
+
+    def forest(self, rng: np.random.Generator, shape: Tuple[int, int]) -> np.ndarray[np.int8]:
+        """Trees and barren tiles, with a tree density that varies smoothly around ```tree_density```.
+        """
+        grid = np.empty(shape, dtype=np.int8)
+        coarse = _noise(rng, shape, self.feature_size * max(shape))
+        cols = np.arange(shape[1])
+        for start in range(0, shape[0], BLOCK_ROWS):
+            rows = np.arange(start, min(start + BLOCK_ROWS, shape[0]))
+            density = self.tree_density + self.density_variation * (2 * _sample(coarse, shape, rows, cols) - 1)
+            trees = rng.random((rows.size, shape[1]), dtype=np.float32) < density
+            grid[rows[0]:rows[-1] + 1] = np.where(trees, State.TREE.value, State.BARREN.value)
+        return grid
+
+    def lakes(self, rng: np.random.Generator, grid: np.ndarray[np.int8], scale: int) -> None:
+        """Lakes: discs of water whose radius varies along the shore with the noise.
+        """
+        radius = max(self.lake_size * scale, 1.0)
+        window_shape = (int(np.ceil(4 * radius)) + 1,) * 2
+        for _ in range(self.n_lakes):
+            centre = rng.random(2) * grid.shape
+            coarse = _noise(rng, window_shape, radius / 2)
+            corner = np.floor(centre - 2 * radius).astype(int)
+            low = np.maximum(corner, 0)
+            high = np.minimum(corner + window_shape, grid.shape)
+            rows, cols = np.arange(low[0], high[0]), np.arange(low[1], high[1])
+            if rows.size == 0 or cols.size == 0:
+                continue
+            shore = radius * (0.6 + 0.8 * _sample(coarse, window_shape, rows - corner[0], cols - corner[1]))
+            distance = np.hypot(rows[:, np.newaxis] + 0.5 - centre[0], cols[np.newaxis, :] + 0.5 - centre[1])
+            window = grid[low[0]:high[0], low[1]:high[1]]
+            window[distance < shore] = State.WATER.value
+
+    def rivers(self, rng: np.random.Generator, grid: np.ndarray[np.int8], scale: int) -> None:
+        """Rivers: a meandering band from one side of the map to the opposite side. The heading of the river drifts as a smoothed random walk;
+        every line of tiles across the river is filled between the banks, in blocks of lines.
+        """
+        half_width = max(self.river_width * scale, 1.0) / 2
+        for _ in range(self.n_rivers):
+            axis = int(rng.integers(2))
+            length, breadth = grid.shape[axis], grid.shape[1 - axis]
+            # The heading stays within 70 degrees of the axis, so the river crosses every line across the axis once
+            heading = np.convolve(np.cumsum(rng.normal(0, 0.15, length)), np.ones(9) / 9, mode='same')
+            heading = np.clip(heading - heading.mean(), -1.2, 1.2)
+            centre = rng.random() * breadth + np.cumsum(np.tan(heading))
+            half = half_width / np.cos(heading)
+            lines = grid if axis == 0 else grid.T
+            for start in range(0, length, BLOCK_ROWS):
+                block = slice(start, min(start + BLOCK_ROWS, length))
+                low = int(np.clip(np.floor((centre[block] - half[block]).min()), 0, breadth))
+                high = int(np.clip(np.ceil((centre[block] + half[block]).max()) + 1, 0, breadth))
+                if high <= low:
+                    continue
+                across = np.arange(low, high) + 0.5
+                water = np.abs(across[np.newaxis, :] - centre[block, np.newaxis]) <= half[block, np.newaxis]
+                lines[block, low:high][water] = State.WATER.value
+
+    def ignitions(self, rng: np.random.Generator, grid: np.ndarray[np.int8], scale: int) -> None:
+        """Clustered ignitions: fires scattered normally around a few centres, only trees catch fire.
+        """
+        if self.n_ignitions == 0:
+            return
+        centres = rng.random((self.n_ignitions, 2)) * grid.shape
+        spread = max(self.ignition_spread * scale, 0.5)
+        fires = centres[:, np.newaxis, :] + rng.normal(0, spread, (self.n_ignitions, self.fires_per_ignition, 2))
+        cells = np.clip(np.floor(fires.reshape(-1, 2)).astype(int), 0, np.array(grid.shape) - 1)
+        trees = grid[cells[:, 0], cells[:, 1]] == State.TREE.value
+        grid[cells[trees, 0], cells[trees, 1]] = State.FIRE.value
+
+
+# Scenarios in the style of the hand-drawn grids in grid_files/
+SCENARIOS: Dict[str, Scenario] = {
+    "forest": Scenario(n_ignitions=8, fires_per_ignition=2),
+    "lake": Scenario(tree_density=0.97, n_lakes=1, lake_size=0.1, n_ignitions=5, ignition_spread=0.03, fires_per_ignition=4),
+    "river": Scenario(tree_density=0.97, n_rivers=1, river_width=0.08, n_ignitions=3, ignition_spread=0.04, fires_per_ignition=5),
+    "volcano": Scenario(tree_density=0.97, n_lakes=5, lake_size=0.04, n_ignitions=1, ignition_spread=0.06, fires_per_ignition=60),
+    "archipelago": Scenario(tree_density=0.9, density_variation=0.2, n_lakes=8, lake_size=0.08, n_rivers=2, river_width=0.03, n_ignitions=10),
+}
+
+
+def _scenario(scenario: Union[str, Scenario]) -> Tuple[str, Scenario]:
+    if isinstance(scenario, str):
+        return scenario, SCENARIOS[scenario]
+    return type(scenario).__name__.lower(), scenario
+
+
+def grid_file(scenario: Union[str, Scenario], size: Union[int, Tuple[int, int]], seed: int, cache_dir: Optional[str] = None) -> str:
+    """The binary grid file of a generated map, generated on first use and read from the cache afterwards.
+
+    Arguments:
+        scenario (Union[str, Scenario]): A scenario, or the name of one of ```SCENARIOS```.
+        size (Union[int, Tuple[int, int]]): The shape of the grid, or its side for a square grid.
+        seed (int): The seed.
+        cache_dir (str): The directory of the cached maps. default = ```CACHE_DIR```, ~/.cache/nacoproject/grids or $NACO_GRID_CACHE.
+
+    Returns:
+        str: The path to the .grid file.
+    """
+    name, scenario = _scenario(scenario)
+    cache_dir = cache_dir if cache_dir is not None else CACHE_DIR
+    shape = (size, size) if np.isscalar(size) else tuple(size)
+    key = json.dumps({"generator": type(scenario).__name__, "version": VERSION, "params": scenario.params(), "shape": shape, "seed": int(seed)}, sort_keys=True)
+    file_path = os.path.join(cache_dir, f"{name}_{shape[0]}x{shape[1]}_{seed}_{hashlib.sha1(key.encode()).hexdigest()[:10]}{gridio.BINARY_SUFFIX}")
+    if not os.path.exists(file_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        gridio.write_binary(tmp_path, scenario.generate(shape, seed))
+        os.replace(tmp_path, file_path)
+    return file_path
+
+
+def grid_files(scenario: Union[str, Scenario], size: Union[int, Tuple[int, int]], seeds: Iterable[int], cache_dir: Optional[str] = None) -> List[str]:
+    """The grid files of a family of maps of one scenario, one per seed, see ```grid_file```.
+    """
+    return [grid_file(scenario, size, seed, cache_dir) for seed in seeds]
+
+
+def environment(scenario: Union[str, Scenario], size: Union[int, Tuple[int, int]], seed: int, cache_dir: Optional[str] = None, spread: str = "dense") -> Environment:
+    """An environment of a generated map, see ```grid_file```.
+    """
+    return Environment.from_file(grid_file(scenario, size, seed, cache_dir), spread=spread)
@@ -0,0 +1,48 @@
+from typing import Dict, Optional, Union
+import numpy as np
+
+Seed = Union[None, int, np.random.SeedSequence]
+
+
+def sequence(seed: Seed = None) -> np.random.SeedSequence:
+    """The seed sequence of a seed. Without a seed the entropy is drawn from the global ```np.random``` state,
+    so ```np.random.seed``` still makes a whole run reproducible.
+
+    Arguments:
+        seed (Seed): An int, a SeedSequence (returned as is) or None.
+
+    Returns:
+        np.random.SeedSequence: The seed sequence.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if seed is None:
+        seed = [int(x) for x in np.random.randint(2**32, size=4, dtype=np.uint64)]
+    return np.random.SeedSequence(seed)
+
+
+def child(seed: np.random.SeedSequence, index: int) -> np.random.SeedSequence:
+    """The ```index```-th child stream of ```seed```. Unlike ```SeedSequence.spawn``` the child only depends on ```seed``` and ```index```,
+    so the same seed always gives the same streams.
+    """
+    return np.random.SeedSequence(seed.entropy, spawn_key=(*seed.spawn_key, index))
+
+
+def generator(seed: Seed = None) -> np.random.Generator:
+    """A random generator seeded with ```sequence(seed)```.
+    """
+    return np.random.default_rng(sequence(seed))
+
+
+def to_state(seed: np.random.SeedSequence) -> Dict:
+    """A seed sequence as JSON serializable values, see ```from_state```.
+    """
+    return {"entropy": seed.entropy, "spawn_key": list(seed.spawn_key)}
+
+
+def from_state(state: Optional[Dict]) -> Optional[np.random.SeedSequence]:
+    """Restore a seed sequence from ```to_state```.
+    """
+    if state is None:
+        return None
+    return np.random.SeedSequence(state["entropy"], spawn_key=tuple(state["spawn_key"]))
@@ -0,0 +1,231 @@
+from typing import Optional, Tuple, Union
+from collections import OrderedDict
+import hashlib
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+from .state import State
+
+
+def nearest_cells(mask: np.ndarray[bool], positions: np.ndarray[float], radius: Union[float, np.ndarray[float]]) -> Tuple[np.ndarray[float], np.ndarray[bool]]:
+    """Find, for a batch of boids, the closest cell centre of a set of cells within ```radius```.
+    Only the window of cells around every boid that can lie within ```radius``` is searched, so the cost does not depend on the size of the grid.
+
+    Arguments:
+        mask (np.ndarray[bool]): The cells to search, either one grid (H, W) shared by all simulations or one grid per simulation (P, H, W).
+        positions (np.ndarray[float]): The positions of the boids (P, N, 2).
+        radius (Union[float, np.ndarray[float]]): The search radius, shared or broadcastable to the boids (P, N).
+
+    Returns:
+        Tuple[np.ndarray[float], np.ndarray[bool]]: The centre of the closest cell (P, N, 2) and whether a cell was found within ```radius``` (P, N).
+    """
+    shape = mask.shape[-2:]
+    r = int(np.ceil(np.max(radius)))
+    radius = np.asarray(radius)[..., np.newaxis, np.newaxis]
+    window = np.arange(-r, r + 2)
+    base = np.floor(positions).astype(int)
+    rows = base[..., 0, np.newaxis, np.newaxis] + window[:, np.newaxis]
+    cols = base[..., 1, np.newaxis, np.newaxis] + window[np.newaxis, :]
+    inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+    rows_c = np.clip(rows, 0, shape[0] - 1)
+    cols_c = np.clip(cols, 0, shape[1] - 1)
+    if mask.ndim == 2:
+        hit = mask[rows_c, cols_c]
+    else:
+        sim = np.arange(positions.shape[0]).reshape(-1, 1, 1, 1)
+        hit = mask[sim, rows_c, cols_c]
+
+    distance = (rows + 0.5 - positions[..., 0, np.newaxis, np.newaxis])**2 + (cols + 0.5 - positions[..., 1, np.newaxis, np.newaxis])**2
+    distance = np.where(inside & hit & (distance <= radius**2), distance, np.inf).reshape(*positions.shape[:-1], window.size**2)
+    closest = np.argmin(distance, axis=-1)
+    found = np.isfinite(np.take_along_axis(distance, closest[..., np.newaxis], axis=-1)[..., 0])
+
+    targets = np.stack([base[..., 0] + window[closest // window.size], base[..., 1] + window[closest % window.size]], axis=-1) + 0.5
+    return targets, found
+
+
+class WaterField:
+    """
+    Per-cell lookup of the closest water tile:
+        For every cell of the grid the closest water tile (by distance between cell centres) is precomputed once per map.
+        The tiles are stored as int16 indices (int32 for grids of more than 32767 rows or columns) and the distances as float32,
+        together with the water tiles themselves for the exact search of ```nearest```, and the fields of the ```cache_size``` most recently used maps are kept.
+
+    """
+    water:np.ndarray[bool]
+    indices:np.ndarray[np.int16]
+    distances:np.ndarray[np.float32]
+    has_water:bool
+    cache_size:int = 8
+    _cache:'OrderedDict[bytes, WaterField]' = OrderedDict()
+
+    def __init__(self, water: np.ndarray[bool]) -> None:
+        """Compute the closest water tile of every cell with a Euclidean distance transform.
+
+        Arguments:
+            water (np.ndarray[bool]): The water tiles of the grid.
+        """
+        self.water = np.array(water, dtype=bool)
+        self.has_water = bool(water.any())
+        dtype = np.int16 if max(water.shape) <= np.iinfo(np.int16).max else np.int32
+        if self.has_water:
+            distances, indices = distance_transform_edt(~water, return_indices=True)
+            self.distances = distances.astype(np.float32)
+            self.indices = np.moveaxis(indices, 0, -1).astype(dtype)
+        else:
+            self.distances = np.full(water.shape, np.inf, dtype=np.float32)
+            self.indices = np.zeros((*water.shape, 2), dtype=dtype)
+        self.water.flags.writeable = False
+        self.indices.flags.writeable = False
+        self.distances.flags.writeable = False
+
+    @classmethod
+    def of(cls, grid: np.ndarray[np.int8], water: Optional[np.ndarray[np.int64]] = None) -> 'WaterField':
+        """Get the water field of a grid, the field is computed once for every distinct map and shared afterwards.
+        Maps are told apart by their water tiles, so with a known water index (e.g. of a binary grid file) the grid itself is not scanned.
+
+        Arguments:
+            grid (np.ndarray[np.int8]): The grid.
+            water (np.ndarray[np.int64]): The sorted flat indices of the water tiles of the grid. default = found in the grid.
+
+        Returns:
+            WaterField: The water field of the grid.
+        """
+        water = np.flatnonzero(grid == State.WATER.value) if water is None else np.asarray(water, dtype=np.int64)
+        key = hashlib.sha1(water.tobytes() + str(grid.shape).encode()).digest()
+        if key in cls._cache:
+            cls._cache.move_to_end(key)
+        else:
+            mask = np.zeros(grid.shape, dtype=bool)
+            mask.flat[water] = True
+            cls._cache[key] = cls(mask)
+            while len(cls._cache) > cls.cache_size:
+                cls._cache.popitem(last=False)
+        return cls._cache[key]
+
+    def nearest(self, positions: np.ndarray[float], radius: Union[float, np.ndarray[float]]) -> Tuple[np.ndarray[float], np.ndarray[bool]]:
+        """Look up the closest water tile of every boid. The closest water tiles of the cell below the boid and of its 8 neighbouring cells
+        are the candidates. The candidates include every water tile among those 9 cells, and any other water tile lies outside them
+        and at least as far from every cell centre as the distance transform says. So when the closest candidate is not further than
+        both bounds it is the closest water tile. Otherwise the boid falls back to an exact search of the water tiles within its radius,
+        so the result is always exact.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions of the boids (..., 2).
+            radius (Union[float, np.ndarray[float]]): The vision range, shared or broadcastable to the boids.
+
+        Returns:
+            Tuple[np.ndarray[float], np.ndarray[bool]]: The centre of the closest water tile and whether it lies within ```radius``` of the boid.
+        """
+        neighbourhood = np.array([[i, j] for i in (-1, 0, 1) for j in (-1, 0, 1)])
+        base = np.floor(positions).astype(int)
+        cells = np.clip(base[..., np.newaxis, :] + neighbourhood, 0, np.array(self.distances.shape) - 1)
+        candidates = self.indices[cells[..., 0], cells[..., 1]] + 0.5
+        distances = np.linalg.norm(candidates - positions[..., np.newaxis, :], axis=-1)
+        closest = np.argmin(distances, axis=-1)[..., np.newaxis]
+        targets = np.take_along_axis(candidates, closest[..., np.newaxis], axis=-2)[..., 0, :]
+        best = np.take_along_axis(distances, closest, axis=-1)[..., 0]
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), best.shape)
+        found = (best <= radius) & self.has_water
+
+        # The distance below which no other water tile can lie: past the 9 cells, past the distance transform of the cell of the boid and,
+        # where that is not enough, past the distance transform of every cell
+        fraction = positions - base
+        own = cells[..., 4, :]
+        bound = np.maximum(np.minimum(1.5 + fraction, 2.5 - fraction).min(axis=-1),
+                           self.distances[own[..., 0], own[..., 1]] - np.linalg.norm(own + 0.5 - positions, axis=-1))
+        uncertain = (best > bound - 1e-9) & (bound <= radius)
+        if uncertain.any():
+            c, p = cells[uncertain], positions[uncertain]
+            transform = (self.distances[c[..., 0], c[..., 1]] - np.linalg.norm(c + 0.5 - p[:, np.newaxis, :], axis=-1)).max(axis=-1)
+            bound[uncertain] = np.maximum(bound[uncertain], transform)
+            uncertain &= (best > bound - 1e-9) & (bound <= radius)
+        if self.has_water and uncertain.any():
+            exact, exact_found = nearest_cells(self.water, positions[uncertain][np.newaxis], np.minimum(radius, best + 1e-6)[uncertain][np.newaxis])
+            targets[uncertain], found[uncertain] = exact[0], exact_found[0]
+        return targets, found
+
+
+class FireIndex:
+    """
+    Index of the burning tiles of a grid:
+        The index is updated from the cells that change (ignitions and extinguished fires) instead of being rebuilt every step.
+        Besides the burning tiles themselves, the number of fires per block of ```block_size``` x ```block_size``` cells is kept,
+        so boids without any fire in their surroundings are skipped cheaply.
+
+    """
+    mask:np.ndarray[bool]
+    blocks:np.ndarray[int]
+    count:int
+    block_size:int = 8
+
+    def __init__(self, grid: np.ndarray[np.int8]) -> None:
+        """Index the burning tiles of ```grid```.
+
+        Arguments:
+            grid (np.ndarray[np.int8]): The grid.
+        """
+        self.mask = grid == State.FIRE.value
+        self.blocks = np.zeros((-(-grid.shape[0] // self.block_size), -(-grid.shape[1] // self.block_size)), dtype=int)
+        rows, cols = np.nonzero(self.mask)
+        np.add.at(self.blocks, (rows // self.block_size, cols // self.block_size), 1)
+        self.count = rows.size
+
+    def ignite(self, rows: np.ndarray[int], cols: np.ndarray[int]) -> None:
+        """Add burning tiles to the index.
+
+        Arguments:
+            rows (np.ndarray[int]): The rows of the tiles that caught fire.
+            cols (np.ndarray[int]): The columns of the tiles that caught fire.
+        """
+        self.mask[rows, cols] = True
+        np.add.at(self.blocks, (rows // self.block_size, cols // self.block_size), 1)
+        self.count += len(rows)
+
+    def extinguish(self, rows: np.ndarray[int], cols: np.ndarray[int]) -> None:
+        """Remove burning tiles from the index.
+
+        Arguments:
+            rows (np.ndarray[int]): The rows of the tiles that were extinguished.
+            cols (np.ndarray[int]): The columns of the tiles that were extinguished.
+        """
+        self.mask[rows, cols] = False
+        np.subtract.at(self.blocks, (rows // self.block_size, cols // self.block_size), 1)
+        self.count -= len(rows)
+
+    def nearest(self, positions: np.ndarray[float], radius: float) -> Tuple[np.ndarray[float], np.ndarray[bool]]:
+        """Find the closest burning tile within ```radius``` of every boid.
+
+        Arguments:
+            positions (np.ndarray[float]): The positions of the boids (N, 2).
+            radius (float): The search radius.
+
+        Returns:
+            Tuple[np.ndarray[float], np.ndarray[bool]]: The centre of the closest burning tile and whether one was found within ```radius```.
+        """
+        targets = np.zeros(positions.shape)
+        found = np.zeros(positions.shape[0], dtype=bool)
+        if self.count == 0:
+            return targets, found
+
+        # Only boids with a fire in one of the blocks covering their surroundings are searched
+        span = int(np.ceil(2 * radius / self.block_size)) + 1
+        low = np.floor((positions - radius) / self.block_size).astype(int)
+        rows = low[:, 0, np.newaxis, np.newaxis] + np.arange(span)[:, np.newaxis]
+        cols = low[:, 1, np.newaxis, np.newaxis] + np.arange(span)[np.newaxis, :]
+        inside = (rows >= 0) & (rows < self.blocks.shape[0]) & (cols >= 0) & (cols < self.blocks.shape[1])
+        blocks = self.blocks[np.clip(rows, 0, self.blocks.shape[0] - 1), np.clip(cols, 0, self.blocks.shape[1] - 1)]
+        fires_nearby = np.where(inside, blocks, 0).sum(axis=(1, 2))
+        candidates = np.flatnonzero(fires_nearby > 0)
+
+        targets[candidates], found[candidates] = nearest_cells(self.mask, positions[candidates], radius)
+        return targets, found
+
+    def copy(self) -> 'FireIndex':
+        """Create a deep copy of the index.
+        """
+        index = FireIndex.__new__(FireIndex)
+        index.mask = self.mask.copy()
+        index.blocks = self.blocks.copy()
+        index.count = self.count
+        return index
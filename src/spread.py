@@ -0,0 +1,99 @@
+from __future__ import annotations
+from typing import Tuple
+import numpy as np
+from scipy.ndimage import convolve
+
+from .state import State
+
+
+class FireFront:
+    """
+    Active frontier of a spreading fire:
+        Keeps the ignition pressure of every cell (the kernel weights of its burning neighbours) and the tree cells with a positive pressure.
+        Ignition probabilities and random draws are only computed for those frontier cells, the pressure is updated around changed cells.
+
+    """
+    kernel:np.ndarray[int] = np.array([[1,4,1],[4,0,4],[1,4,1]])
+    scale:float = 0.002
+    pressure:np.ndarray[np.int32]
+    frontier:np.ndarray[int]
+
+    def __init__(self, grid: np.ndarray[np.int8]) -> None:
+        """Compute the ignition pressure and the frontier of ```grid```.
+
+        Arguments:
+            grid (np.ndarray[np.int8]): The grid.
+        """
+        fires = (grid == State.FIRE.value).astype(np.int32)
+        self.pressure = convolve(fires, self.kernel.astype(np.int32), mode='constant')
+        self.frontier = np.flatnonzero((grid == State.TREE.value) & (self.pressure > 0))
+
+    def spread(self, rng: np.random.Generator) -> Tuple[np.ndarray[int], np.ndarray[int]]:
+        """Draw which frontier cells catch fire this step, with the same probabilities as a convolution of the whole grid with ```kernel * scale```.
+        The frontier is kept in the order of the grid, so the draws match those of the dense spread for the same generator.
+
+        Arguments:
+            rng (np.random.Generator): The random generator of the environment.
+
+        Returns:
+            Tuple[np.ndarray[int], np.ndarray[int]]: The rows and columns of the cells that catch fire.
+        """
+        p = self.pressure.flat[self.frontier] * self.scale
+        ignited = self.frontier[p > rng.random(self.frontier.size)]
+        return np.unravel_index(ignited, self.pressure.shape)
+
+    def ignite(self, rows: np.ndarray[int], cols: np.ndarray[int], grid: np.ndarray[np.int8]) -> None:
+        """Update the pressure and the frontier around cells that caught fire.
+
+        Arguments:
+            rows (np.ndarray[int]): The rows of the cells that caught fire.
+            cols (np.ndarray[int]): The columns of the cells that caught fire.
+            grid (np.ndarray[np.int8]): The grid, after the cells caught fire.
+        """
+        self._stamp(rows, cols, 1)
+        self._refresh(rows, cols, grid)
+
+    def extinguish(self, rows: np.ndarray[int], cols: np.ndarray[int], grid: np.ndarray[np.int8]) -> None:
+        """Update the pressure and the frontier around cells that were extinguished.
+
+        Arguments:
+            rows (np.ndarray[int]): The rows of the cells that were extinguished.
+            cols (np.ndarray[int]): The columns of the cells that were extinguished.
+            grid (np.ndarray[np.int8]): The grid, after the cells were extinguished.
+        """
+        self._stamp(rows, cols, -1)
+        self._refresh(rows, cols, grid)
+
+    def _neighbourhood(self, rows: np.ndarray[int], cols: np.ndarray[int]) -> Tuple[np.ndarray[int], np.ndarray[int], np.ndarray[int]]:
+        """The cells within the kernel around ```(rows, cols)``` that lie on the grid, with their kernel weight.
+        """
+        di, dj = np.nonzero(np.ones(self.kernel.shape, dtype=bool))
+        neighbour_rows = (np.asarray(rows)[:, np.newaxis] + di - 1).ravel()
+        neighbour_cols = (np.asarray(cols)[:, np.newaxis] + dj - 1).ravel()
+        weights = np.tile(self.kernel.ravel(), len(rows))
+        inside = (neighbour_rows >= 0) & (neighbour_rows < self.pressure.shape[0]) & (neighbour_cols >= 0) & (neighbour_cols < self.pressure.shape[1])
+        return neighbour_rows[inside], neighbour_cols[inside], weights[inside]
+
+    def _stamp(self, rows: np.ndarray[int], cols: np.ndarray[int], sign: int) -> None:
+        """Add (```sign``` = 1) or remove (```sign``` = -1) the pressure of burning cells on their neighbours.
+        """
+        neighbour_rows, neighbour_cols, weights = self._neighbourhood(rows, cols)
+        np.add.at(self.pressure, (neighbour_rows, neighbour_cols), sign * weights)
+
+    def _refresh(self, rows: np.ndarray[int], cols: np.ndarray[int], grid: np.ndarray[np.int8]) -> None:
+        """Recompute frontier membership of the cells around changed cells.
+        """
+        if len(rows) == 0:
+            return
+        neighbour_rows, neighbour_cols, _ = self._neighbourhood(rows, cols)
+        affected = np.unique(np.ravel_multi_index((neighbour_rows, neighbour_cols), self.pressure.shape))
+        active = affected[(grid.flat[affected] == State.TREE.value) & (self.pressure.flat[affected] > 0)]
+        self.frontier = np.union1d(np.setdiff1d(self.frontier, affected, assume_unique=True), active)
+
+    def copy(self) -> FireFront:
+        """Create a deep copy of the fire front.
+        """
+        front = FireFront.__new__(FireFront)
+        front.pressure = self.pressure.copy()
+        front.frontier = self.frontier.copy()
+        return front
@@ -6,58 +6,118 @@ if TYPE_CHECKING:
     from .evolution import Environment
 
 
-from typing import List,Dict
+from typing import List,Dict,Optional
 import numpy as np
-from sklearn.neighbors import KDTree
-import random
 
+from . import seeding
 from .boid import Boid
+from .neighbours import Neighbours, NeighbourSearch, KDTreeSearch
+from .state import State
+from .profiling import NullProfiler
+
+
+def _jit():
+    """The compiled kernels, imported on first use so numba is only loaded for the "jit" backend.
+    """
+    from . import jit
+    return jit
 
 
 class Swarm:
-    boids:List[Boid]
+    backend:str = "numpy"
+    profiler:NullProfiler = NullProfiler()
+    positions:np.ndarray[float]
+    velocities:np.ndarray[float]
+    carrying_water:np.ndarray[bool]
+    out_of_bounds_timer:np.ndarray[int]
     rules:Dict[object,Rule]
     vision_range:float
     max_speed:float
-    kdtree:KDTree
+    neighbour_search:NeighbourSearch
     env:Environment
+    seed:np.random.SeedSequence
+    rng:np.random.Generator
 
-    def __init__(self, env: Environment, vision_range: float, max_speed:float, nboids: int, rules: List[Rule]) -> None:
-        """ Swarm class representing a group of boids with shared behaviour
+    def __init__(self, env: Environment, vision_range: float, max_speed:float, nboids: int, rules: List[Rule], neighbour_search: Optional[NeighbourSearch] = None,
+                 seed: seeding.Seed = None) -> None:
+        """ Swarm class representing a group of boids with shared behaviour. 
+        The state of the boids is stored as contiguous arrays (one row per boid), such that the swarm can be updated as a whole.
 
         Args:
             env (Environment): the environment the swarm lives in
             vision_range (float): the vision range of the boids
             nboids (int): the number of boids within the swarm
             rules (List[Rule]): the list of rules that the boids follow
+            neighbour_search (NeighbourSearch): how the neighbours of the boids are found, e.g. ```KDTreeSearch()``` or ```SpatialHash(vision_range)```. 
+                                                default = KDTreeSearch()
+            seed (Seed): the seed of the simulation, see ```reset```. default = drawn from ```np.random```.
+
+        The simulation step can run on the NumPy code below (```backend = "numpy"```) or on the compiled kernels of ```jit``` (```backend = "jit"```),
+        which give the same results for the same seed. The backend can be switched at any time, for all swarms through ```Swarm.backend```.
+        Without numba, or for swarms the kernels do not support, the NumPy code is used.
+
+        The phases of a step are timed by ```profiler```, a ```NullProfiler``` that does nothing unless a ```profiling.Profiler``` is set,
+        for all swarms through ```Swarm.profiler```.
         """
-        self.boids = np.array([Boid(np.random.uniform(0, env.grid.shape[0]-1.01, 2), np.random.uniform(-1, 1, 2)*max_speed, env, 1) for _ in range(nboids)])
+        self.nboids = nboids
+        self.neighbour_search = neighbour_search if neighbour_search is not None else KDTreeSearch()
         self.rules = dict((type(r), r) for r in rules)
         self.vision_range = vision_range
         self.max_speed = max_speed
-        self.kdtree = self.construct_KDTree()
-        self.env = env
+        self.pickup_chance = 0.5
+        self.reset(env, seed)
 
-    def reset(self,env:Environment) -> None:
+    def reset(self,env:Environment,seed:seeding.Seed=None) -> None:
         """Reset the swarm and set a new environment. 
+        The simulation draws all of its random numbers from two generators of the seed: ```rng``` of the swarm (initial boids and water pickups)
+        and ```rng``` of the environment (fire spread), so a swarm reset with the same ```seed``` and environment replays the same simulation.
+
         Arguments:
             env (Environment): An environment.
+            seed (Seed): The seed of the simulation, kept as ```seed```. default = drawn from ```np.random```.
 
         """   
-        self.boids = np.array([Boid(np.random.uniform(0, env.grid.shape[0]-1.01, 2), np.random.uniform(-1, 1, 2)*self.max_speed, env, 1) for _ in self.boids])
-        self.kdtree = self.construct_KDTree()
+        self.seed = seeding.sequence(seed)
+        self.rng = np.random.default_rng(seeding.child(self.seed, 0))
+        env.rng = np.random.default_rng(seeding.child(self.seed, 1))
+        self.positions = self.rng.uniform(0, env.grid.shape[0]-1.01, (self.nboids, 2))
+        self.velocities = self.rng.uniform(-1, 1, (self.nboids, 2))*self.max_speed
+        self.carrying_water = np.zeros(self.nboids, dtype=bool)
+        self.out_of_bounds_timer = np.zeros(self.nboids, dtype=int)
         self.env=env
 
+    @property
+    def boids(self) -> np.ndarray[Boid]:
+        """The boids of the swarm, as views on the arrays of the swarm.
+
+        Returns:
+            np.ndarray[Boid]: one ```Boid``` per row of the swarm arrays.
+        """
+        boids = np.empty(self.nboids, dtype=object)
+        boids[:] = [Boid(self, i) for i in range(self.nboids)]
+        return boids
+
+    def find_neighbours(self, positions: np.ndarray[float]) -> Neighbours:
+        """Find the neighbours within the vision range of every boid.
 
-    def construct_KDTree(self) -> KDTree:
-        """Construct a KDTree for the boid positions.
+        Arguments:
+            positions (np.ndarray[float]): The positions of the boids.
 
         Returns:
-            KDTree: a KDTree for the boid positions.  
-        """   
-        return KDTree([boid.position for boid in self.boids])
-    
+            Neighbours: The neighbour lists of the boids, sorted by distance.
+        """
+        with self.profiler.phase("neighbours.build"):
+            self.neighbour_search.build(positions)
+        with self.profiler.phase("neighbours.query"):
+            neighbours = self.neighbour_search.query(positions, self.vision_range)
+        self.profiler.count("tree_rebuilds")
+        self.profiler.count("neighbours", neighbours.indices.size)
+        return neighbours
+
     def simulate(self, n_iters: int) -> int:
+        if self.backend == "jit" and _jit().supports(self):
+            with self.profiler.phase("jit.simulate"):
+                return _jit().simulate(self, n_iters)
         for iter in range(n_iters):
             self.update()
             if not self.env.contains_fire():
@@ -67,23 +127,91 @@ class Swarm:
     def update(self) -> None:
         """Update the boids in the swarm. 
         """   
-        velocities = np.array([boid.velocity for boid in self.boids])
-        positions = np.array([boid.position for boid in self.boids])
+        self.profiler.count("steps")
+        self.profiler.count("boids", self.nboids)
+        if self.backend == "jit" and _jit().supports(self):
+            with self.profiler.phase("jit.step"):
+                return _jit().update(self)
+        velocities = self.velocities
+        positions = self.positions
         force_vector = np.zeros(velocities.shape)
         
-        neighbours_idx,_=self.kdtree.query_radius(positions,r=self.vision_range,return_distance=True,sort_results=True)
-        for i, n_idx in enumerate(neighbours_idx):
-            neighbours_idx[i] = n_idx[n_idx!=i]        
+        neighbours = self.find_neighbours(positions)
 
         for rule in self.rules.values():
-            force_vector += rule.weight * rule.apply(self,positions, velocities,neighbours_idx)
+            with self.profiler.phase("rule." + type(rule).__name__):
+                force_vector += rule.weight * rule.apply(self,positions, velocities,neighbours)
 
-        for i, boid in enumerate(self.boids):
-            boid.velocity += force_vector[i]
-            if np.linalg.norm(boid.velocity) > self.max_speed:
-               boid.velocity *= self.max_speed / np.linalg.norm(boid.velocity)
-            boid.update()
+        with self.profiler.phase("integrate"):
+            self.velocities += force_vector
+            self.clamp_speed()
+            self.positions += self.velocities * 0.1
+
+            out_of_bounds = self.border_handling()
+            self.positions[out_of_bounds] += self.velocities[out_of_bounds] * 0.2
+        with self.profiler.phase("interact"):
+            self.interact(~out_of_bounds)
             
-        self.kdtree=self.construct_KDTree()
         self.env.update()    
-        
+
+    def clamp_speed(self) -> None:
+        """Scale down the velocity of every boid that is faster than ```max_speed```.
+        """
+        speed = np.linalg.norm(self.velocities, axis=1)
+        too_fast = speed > self.max_speed
+        self.velocities[too_fast] *= (self.max_speed / speed[too_fast])[:, np.newaxis]
+
+    def border_handling(self) -> np.ndarray[bool]:
+        """Bounce the boids back off the border, or pull them back in when they spend too long out of bounds.
+
+        Returns:
+            np.ndarray[bool]: True for every boid that is out of bounds.
+        """
+        shape = np.array(self.env.grid.shape)
+        out_of_bounds_axis = (self.positions > shape) | (self.positions < 0)
+        horizontal_out_of_bounds, vertical_out_of_bounds = out_of_bounds_axis.T
+        out_of_bounds = horizontal_out_of_bounds | vertical_out_of_bounds
+
+        # Pull the boid back into bounds if it spends too long out of bounds
+        pull = out_of_bounds & (self.out_of_bounds_timer > 5)
+        self.velocities[pull] = np.where(self.positions[pull] < shape/2, 1, -1)
+
+        # Left and right walls, otherwise upper and lower walls
+        bounce = out_of_bounds & ~pull
+        self.velocities[bounce & horizontal_out_of_bounds, 0] *= -1
+        self.velocities[bounce & ~horizontal_out_of_bounds, 1] *= -1
+
+        self.out_of_bounds_timer[bounce] += 1
+        self.out_of_bounds_timer[~out_of_bounds] = 0
+        return out_of_bounds
+
+    def interact(self, active: np.ndarray[bool]) -> None:
+        """Let the boids interact with the tile below them: drop water on fires and collect water from water tiles.
+
+        Arguments:
+            active (np.ndarray[bool]): the boids that are allowed to interact with the environment.
+        """
+        cells = self.cells()
+        states = self.env.grid[cells[:, 0], cells[:, 1]]
+
+        # Extinguish fire, only the first boid above a fire uses its water
+        dropping = np.flatnonzero(active & self.carrying_water & (states == State.FIRE.value))
+        if dropping.size > 0:
+            flat_cells = np.ravel_multi_index(tuple(cells[dropping].T), self.env.grid.shape)
+            _, first = np.unique(flat_cells, return_index=True)
+            dropping = dropping[first]
+            self.env.extinguish(cells[dropping, 0], cells[dropping, 1])
+            self.carrying_water[dropping] = False
+
+        # Collect water
+        pickup = self.rng.random(self.nboids) < self.pickup_chance
+        self.carrying_water |= active & pickup & (states == State.WATER.value)
+
+    def cells(self) -> np.ndarray[int]:
+        """Get the grid cell below every boid.
+
+        Returns:
+            np.ndarray[int]: the (row, column) index of the cell below every boid.
+        """
+        cells = self.positions.astype(int)
+        return np.clip(cells, 0, np.array(self.env.grid.shape) - 1)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from src import rule
+from src.evaluation import BatchEvaluator, SerialEvaluator
+from src.environment import Environment
+from src.state import State
+from src.swarm import Swarm
+
+
+def environment(fire: bool) -> Environment:
+    grid = np.full((12, 12), State.TREE.value, dtype=np.int8)
+    grid[8:10, 1:3] = State.WATER.value
+    if fire:
+        grid[1:3, 6:9] = State.FIRE.value
+    return Environment(grid.size, int((grid == State.FIRE.value).sum()), grid)
+
+
+def population(env: Environment):
+    rng = np.random.default_rng(0)
+    return [Swarm(env.copy(), 4, 4, 6, [r(weight=w) for r, w in zip(rule.RULES, rng.uniform(-1, 1, len(rule.RULES)))]) for _ in range(3)]
+
+
+def test_batch_matches_serial_without_fire():
+    env = environment(fire=False)
+    batch = BatchEvaluator(seed=5).samples(population(env), env, 30, 2)
+    serial = SerialEvaluator(seed=5).samples(population(env), env, 30, 2)
+    assert (batch == 30).all()
+    assert (batch == serial).all()
+
+
+def test_batch_matches_serial_with_fire():
+    env = environment(fire=True)
+    batch = BatchEvaluator(seed=5).samples(population(env), env, 30, 2)
+    serial = SerialEvaluator(seed=5).samples(population(env), env, 30, 2)
+    assert np.allclose(batch, serial)
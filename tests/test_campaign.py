@@ -0,0 +1,42 @@
+import os
+
+from src import rule
+from src.cache import FitnessCache
+from src.campaign import Campaign
+from src.environment import Environment
+from src.swarm import Swarm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRID_FILE = os.path.join(ROOT, "grid_files", "test_grid.in")
+
+
+def swarm(env):
+    rules = [rule.Alignment(weight=0.3), rule.Cohesion(weight=-0.2), rule.Separation(weight=0.5), rule.GoToWater(weight=0.8), rule.GoToFire(weight=0.9)]
+    return Swarm(env.copy(), 4, 4, 5, rules)
+
+
+def test_fitness_cache_is_shared_across_observations(tmp_path):
+    cache_file = str(tmp_path / "fitness.sqlite")
+    campaign = Campaign(GRID_FILE, n_iters=20, reps=2, seed=1, cache_file=cache_file)
+    env = Environment.from_file(GRID_FILE)
+
+    # Observations run in separate processes, each with its own connection to the cache file
+    first = FitnessCache(path=cache_file)
+    expected = campaign.evaluator(first).evaluate([swarm(env)], env, campaign.n_iters, campaign.reps)
+    first.close()
+
+    second = FitnessCache(path=cache_file)
+    fitness = campaign.evaluator(second).evaluate([swarm(env)], env, campaign.n_iters, campaign.reps)
+    second.close()
+    assert second.misses == 0 and second.hits > 0
+    assert (fitness == expected).all()
+
+
+def test_other_campaigns_reuse_the_cache(tmp_path):
+    cache_file = str(tmp_path / "fitness.sqlite")
+    env = Environment.from_file(GRID_FILE)
+    for seed in (1, 2):
+        cache = FitnessCache(path=cache_file)
+        Campaign(GRID_FILE, n_iters=20, reps=2, seed=seed).evaluator(cache).evaluate([swarm(env)], env, 20, 2)
+        cache.close()
+    assert cache.misses == 0
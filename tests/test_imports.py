@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Heavy libraries the simulation core must import without, they are loaded on first use (see README, Benchmarks).
+# scipy.ndimage is allowed: the fire spread and the water lookup of every environment use it.
+HEAVY_MODULES = ["matplotlib", "seaborn", "sklearn", "pandas", "numba"]
+# The core imports in about 0.25 s, numpy and scipy.ndimage take most of it; loading the plotting stack alone takes over a second.
+# The bound is generous so slow machines pass, the exact import times are tracked by the benchmarks.
+IMPORT_TIME_LIMIT = 1.5
+
+
+@pytest.mark.parametrize("module", ["src", "src.campaign"])
+def test_core_imports_without_heavy_modules(module):
+    code = f"import sys, json; import {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, check=True).stdout
+    assert json.loads(output) == []
+
+
+@pytest.mark.parametrize("module", ["src", "src.campaign"])
+def test_core_import_time(module):
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    # The first run warms the file system and bytecode caches, the fastest of the others is the least disturbed by other processes
+    times = [float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, check=True).stdout) for _ in range(4)]
+    assert min(times[1:]) < IMPORT_TIME_LIMIT
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+from src import rule
+from src.environment import Environment
+from src.evaluation import PoolEvaluator, SerialEvaluator
+from src.profiling import NullProfiler, Profiler
+from src.swarm import Swarm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRID_FILE = os.path.join(ROOT, "grid_files", "test_grid.in")
+
+
+def profile(evaluator, population, env):
+    Swarm.profiler = Environment.profiler = profiler = Profiler()
+    try:
+        fitness = evaluator.samples(population, env, 20, 2)
+        future = evaluator.submit(population[0], env, 20, 2)
+        fitness = np.vstack([fitness, future.result()])
+    finally:
+        Swarm.profiler = Environment.profiler = NullProfiler()
+    return fitness, profiler
+
+
+def test_pool_workers_are_profiled():
+    env = Environment.from_file(GRID_FILE)
+    rng = np.random.default_rng(0)
+    population = [Swarm(env.copy(), 4, 4, 5, [r(weight=w) for r, w in zip(rule.RULES, rng.uniform(-1, 1, len(rule.RULES)))]) for _ in range(4)]
+    serial_fitness, serial = profile(SerialEvaluator(seed=3), population, env)
+    with PoolEvaluator(max_workers=2, seed=3) as evaluator:
+        pool_fitness, pool = profile(evaluator, population, env)
+    assert (pool_fitness == serial_fitness).all()
+    assert pool.counters["steps"] == serial.counters["steps"] > 0
+    assert pool.calls["integrate"] == serial.calls["integrate"]
@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.spatial import WaterField
+
+
+def test_nearest_water_is_exact():
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        size = int(rng.integers(5, 40))
+        water = rng.random((size, size)) < rng.choice([0.002, 0.01, 0.03, 0.1, 0.3])
+        positions = rng.uniform(-0.5, size + 0.5, (3, 300, 2))
+        radius = rng.uniform(0.5, 6, (3, 1))
+        targets, found = WaterField(water).nearest(positions, radius)
+
+        tiles = np.argwhere(water) + 0.5
+        if len(tiles) == 0:
+            assert not found.any()
+            continue
+        closest = np.linalg.norm(positions[..., np.newaxis, :] - tiles, axis=-1).min(axis=-1)
+        assert (found == (closest <= radius)).all()
+        assert np.allclose(np.linalg.norm(targets - positions, axis=-1)[found], closest[found])